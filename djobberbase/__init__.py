@@ -1 +1,3 @@
-VERSION = (0, 2, 0)
+VERSION = (0, 2, 0)
+
+default_app_config = 'djobberbase.apps.BaseConfig'
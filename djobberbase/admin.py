@@ -1,90 +1,136 @@
-# -*- coding: utf-8 -*-
-
-from django.contrib import admin
-from django.utils.translation import ugettext_lazy as _
-from django.conf import settings
-
-from treebeard.admin import TreeAdmin
-from treebeard.forms import movenodeform_factory
-
-from djobberbase.models import Category, Type, Job, Place, JobStat, JobSearch, Company
-
-def activate_jobs(modeladmin, request, queryset):
-    queryset.update(status=Job.ACTIVE)
-activate_jobs.short_description = _('Activate selected jobs.')
-
-
-def deactivate_jobs(modeladmin, request, queryset):
-    queryset.update(status=Job.INACTIVE)
-deactivate_jobs.short_description = _('Deactivate selected jobs.')
-
-
-def mark_spotlight(modeladmin, request, queryset):
-    queryset.update(spotlight=True)
-mark_spotlight.short_description = _('Mark selected jobs as spotlight.')
-
-
-class JobAdmin(admin.ModelAdmin):
-    fieldsets = [
-        (_('Job Details'), {'fields': ['jobtype', 'category', 'title', \
-                                    'place', 'description']}),
-        (_('Company Info'), {'fields': ['company', 'url', ]}),
-        (_('Admin Info'),  {'fields': ['spotlight']}),
-    ]
-    list_display = ('title', 'company', 'created_on', 'get_status_with_icon', 'spotlight')
-    actions = [activate_jobs, deactivate_jobs, mark_spotlight]
-
-    def get_status_with_icon(self, obj):
-        image = 'icon-yes.gif'
-
-        admin_media = settings.STATIC_URL
-        icon = '<img src="%(admin_media)sadmin/img/%(image)s" alt="%(status)s" /> %(status)s'
-
-
-        return icon % {'admin_media': admin_media,
-                       'image': image,
-                       'status': ''}
-    get_status_with_icon.allow_tags = True
-    get_status_with_icon.admin_order_field = 'status'
-    get_status_with_icon.short_description = 'Status'
-
-
-class CategoryAdmin(TreeAdmin):
-    list_per_page = 25
-    list_display = ('name', 'description', 'depth', 'category_order', 'full_name')
-    form = movenodeform_factory(Category)
-    search_fields = ('name', 'description')
-
-
-class TypeAdmin(admin.ModelAdmin):
-    list_display = ('name', )
-    search_fields = ('name', )
-
-class CompanyAdmin(admin.ModelAdmin):
-    list_display = ('logo', 'admin', )
-    search_fields = ('admin__email', )
-
-class PlaceAdmin(TreeAdmin):
-    form = movenodeform_factory(Place)
-    list_per_page = 25
-    list_display = ('name', 'place_type', 'depth', 'reversed_full_name')
-    list_filter = ('place_type', )
-    search_fields = ('name', )
-
-
-
-class JobStatAdmin(admin.ModelAdmin):
-    readonly_fields = ['description', 'job', 'created_on', 'ip', 'stat_type']
-
-
-class JobSearchAdmin(admin.ModelAdmin):
-    readonly_fields = ['keywords', 'created_on']
-
-admin.site.register(Category, CategoryAdmin)
-admin.site.register(Type, TypeAdmin)
-admin.site.register(Place, PlaceAdmin)
-admin.site.register(Company, CompanyAdmin)
-admin.site.register(Job, JobAdmin)
-"""
-admin.site.register(JobStat, JobStatAdmin)
-admin.site.register(JobSearch, JobSearchAdmin)"""
+# -*- coding: utf-8 -*-
+
+from django.contrib import admin
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from django.utils.translation import ugettext_lazy as _
+from django.conf import settings
+
+from treebeard.admin import TreeAdmin
+from treebeard.forms import movenodeform_factory
+
+from djobberbase.fingerprints import near_duplicates
+from djobberbase.models import Category, Type, Job, Place, JobStat, JobSearch, Company
+from djobberbase.stats import stats_buffer
+
+def activate_jobs(modeladmin, request, queryset):
+    queryset.change(is_active=True)
+activate_jobs.short_description = _('Activate selected jobs.')
+
+
+def deactivate_jobs(modeladmin, request, queryset):
+    queryset.change(is_active=False)
+deactivate_jobs.short_description = _('Deactivate selected jobs.')
+
+
+def mark_spotlight(modeladmin, request, queryset):
+    queryset.change(spotlight=True)
+mark_spotlight.short_description = _('Mark selected jobs as spotlight.')
+
+
+class NearDuplicateFilter(admin.SimpleListFilter):
+    title = _('near duplicate')
+    parameter_name = 'near_duplicate'
+
+    def lookups(self, request, model_admin):
+        return (('1', _('Yes')), ('0', _('No')))
+
+    def queryset(self, request, queryset):
+        if self.value() in ('0', '1'):
+            return queryset.filter(duplicate_of__isnull=self.value() == '0')
+        return queryset
+
+
+def job_admin_link(job):
+    return format_html('<a href="{}">{}</a>', reverse('admin:djobberbase_job_change', args=[job.pk]), job.title)
+
+
+class JobAdmin(admin.ModelAdmin):
+    fieldsets = [
+        (_('Job Details'), {'fields': ['jobtype', 'category', 'title', \
+                                    'place', 'description']}),
+        (_('Company Info'), {'fields': ['company', 'url', ]}),
+        (_('Admin Info'),  {'fields': ['spotlight', 'near_duplicate_links']}),
+    ]
+    readonly_fields = ('near_duplicate_links',)
+    list_display = ('title', 'company', 'created_on', 'get_status_with_icon', 'spotlight', 'unique_visitors',
+                    'duplicate_of_link')
+    list_filter = (NearDuplicateFilter,)
+    actions = [activate_jobs, deactivate_jobs, mark_spotlight]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('duplicate_of').prefetch_related('visitor_sketches')
+
+    def duplicate_of_link(self, obj):
+        return job_admin_link(obj.duplicate_of) if obj.duplicate_of else ''
+    duplicate_of_link.short_description = _('Near duplicate of')
+    duplicate_of_link.admin_order_field = 'duplicate_of'
+
+    def near_duplicate_links(self, obj):
+        ''' The older jobs of the same company or place the job nearly
+            duplicates, and the newer ones that nearly duplicate it.
+        '''
+        if not obj.pk:
+            return ''
+        jobs = near_duplicates(obj) + list(obj.near_duplicates.order_by('-pk'))
+        return format_html_join(', ', '{}', ((job_admin_link(job),) for job in jobs)) or _('None')
+    near_duplicate_links.short_description = _('Near duplicates')
+
+    def unique_visitors(self, obj):
+        return stats_buffer.unique_visitors(obj.pk, obj.visitor_sketches.all())
+    unique_visitors.short_description = _('Unique visitors')
+
+    def get_status_with_icon(self, obj):
+        image = 'icon-yes.gif'
+
+        admin_media = settings.STATIC_URL
+        icon = '<img src="%(admin_media)sadmin/img/%(image)s" alt="%(status)s" /> %(status)s'
+
+
+        return icon % {'admin_media': admin_media,
+                       'image': image,
+                       'status': ''}
+    get_status_with_icon.allow_tags = True
+    get_status_with_icon.admin_order_field = 'status'
+    get_status_with_icon.short_description = 'Status'
+
+
+class CategoryAdmin(TreeAdmin):
+    list_per_page = 25
+    list_display = ('name', 'description', 'depth', 'category_order', 'full_name')
+    form = movenodeform_factory(Category)
+    search_fields = ('name', 'description')
+
+
+class TypeAdmin(admin.ModelAdmin):
+    list_display = ('name', )
+    search_fields = ('name', )
+
+class CompanyAdmin(admin.ModelAdmin):
+    list_display = ('logo', 'admin', )
+    search_fields = ('admin__email', )
+
+class PlaceAdmin(TreeAdmin):
+    form = movenodeform_factory(Place)
+    list_per_page = 25
+    list_display = ('name', 'place_type', 'depth', 'reversed_full_name')
+    list_filter = ('place_type', )
+    search_fields = ('name', )
+
+
+
+class JobStatAdmin(admin.ModelAdmin):
+    readonly_fields = ['description', 'job', 'created_on', 'ip', 'stat_type']
+
+
+class JobSearchAdmin(admin.ModelAdmin):
+    readonly_fields = ['keywords', 'created_on']
+
+admin.site.register(Category, CategoryAdmin)
+admin.site.register(Type, TypeAdmin)
+admin.site.register(Place, PlaceAdmin)
+admin.site.register(Company, CompanyAdmin)
+admin.site.register(Job, JobAdmin)
+"""
+admin.site.register(JobStat, JobStatAdmin)
+admin.site.register(JobSearch, JobSearchAdmin)"""
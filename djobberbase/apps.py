@@ -1,5 +1,8 @@
-from django.apps import AppConfig
-
-
-class BaseConfig(AppConfig):
-    name = 'djobberbase'
+from django.apps import AppConfig
+
+
+class BaseConfig(AppConfig):
+    name = 'djobberbase'
+
+    def ready(self):
+        from djobberbase import signals
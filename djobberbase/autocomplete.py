@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from time import time
+
+from django.core.cache import caches
+from django.db.models import Count
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.models import Category, Job, JobSearch, Place, Type
+from djobberbase.trees import trees
+
+PLACE = 'place'
+CATEGORY = 'category'
+JOBTYPE = 'jobtype'
+KEYWORD = 'keyword'
+KINDS = (PLACE, CATEGORY, JOBTYPE, KEYWORD)
+
+VERSION_KEY = 'djobberbase:autocomplete:version'
+KEYWORDS_KEY = 'djobberbase:autocomplete:keywords'
+
+
+def normalize(text):
+    ''' Lowercases a text and strips its accents so that "zur" matches "Zürich".
+
+        >>> normalize('  Zürich,  Switzerland ')
+        'zurich, switzerland'
+    '''
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+class PrefixIndex:
+    ''' A sorted array of (key, kind, ident) rows answering prefix lookups with
+        a binary search. Every item is indexed under its full normalized
+        label and under every word of it, so "fran" finds "San Francisco".
+
+        Prefixes of up to short_prefix characters match too many rows to be
+        ranked on every lookup, so their best top_size items are precomputed
+        and kept up to date. The number of items is bounded: when max_items is
+        exceeded the items with the lowest weight are dropped.
+    '''
+    short_prefix = 2
+    top_size = 25
+
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self.rows = []
+        self.items = {}
+        self.top = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def keys(self, label):
+        words = normalize(label).replace(',', ' ').split()
+        return set(' '.join(words[start:]) for start in range(len(words)))
+
+    def short_prefixes(self, keys):
+        return set(key[:length] for key in keys for length in range(1, min(len(key), self.short_prefix) + 1))
+
+    def rank(self, item):
+        label, value, weight, keys = self.items[item]
+        return -weight, label, item
+
+    def add(self, kind, ident, label, value=None, weight=0):
+        item = (kind, ident)
+        previous = self.items.get(item)
+        if previous is not None:
+            self.remove_rows(item, previous[3])
+            if weight < previous[2]:
+                self.forget_top(item, previous[3])
+            else:
+                # A heavier item only climbs, the other top items stay valid
+                for prefix in self.short_prefixes(previous[3]):
+                    if prefix in self.top:
+                        self.top[prefix] = [entry for entry in self.top[prefix] if entry[2] != item]
+        keys = self.keys(label)
+        self.items[item] = (label, value or label, weight, keys)
+        for key in keys:
+            insort(self.rows, (key, kind, ident))
+        for prefix in self.short_prefixes(keys):
+            if prefix in self.top:
+                insort(self.top[prefix], self.rank(item))
+                del self.top[prefix][self.top_size:]
+        if len(self.items) > self.max_items:
+            self.shrink()
+
+    def load(self, entries, replace_kind=None):
+        ''' Adds many (kind, ident, label, value, weight) entries at once,
+            sorting the rows a single time. With replace_kind, all the
+            existing items of that kind are dropped first.
+        '''
+        if replace_kind is not None:
+            self.items = dict((item, data) for item, data in self.items.items() if item[0] != replace_kind)
+            self.rows = [row for row in self.rows if row[1] != replace_kind]
+        for kind, ident, label, value, weight in entries:
+            if (kind, ident) in self.items:
+                self.remove_rows((kind, ident), self.items[(kind, ident)][3])
+            keys = self.keys(label)
+            self.items[(kind, ident)] = (label, value or label, weight, keys)
+            self.rows.extend((key, kind, ident) for key in keys)
+        self.rows.sort()
+        if len(self.items) > self.max_items:
+            self.shrink()
+        self.compute_top()
+
+    def discard(self, kind, ident):
+        item = self.items.pop((kind, ident), None)
+        if item is not None:
+            self.remove_rows((kind, ident), item[3])
+            self.forget_top((kind, ident), item[3])
+
+    def remove_rows(self, item, keys):
+        for key in keys:
+            del self.rows[bisect_left(self.rows, (key,) + item)]
+
+    def forget_top(self, item, keys):
+        for prefix in self.short_prefixes(keys):
+            if any(entry[2] == item for entry in self.top.get(prefix, ())):
+                del self.top[prefix]
+
+    def shrink(self):
+        ''' Drops the lightest tenth of the items in a single pass. '''
+        keep = self.max_items - self.max_items // 10
+        dropped = set(heapq.nsmallest(len(self.items) - keep, self.items, key=lambda item: self.items[item][2]))
+        for item in dropped:
+            del self.items[item]
+        self.rows = [row for row in self.rows if row[1:] not in dropped]
+        self.top = {}
+
+    def compute_top(self):
+        ''' Ranks the items of every short prefix in one pass over the rows. '''
+        groups = {}
+        for key, kind, ident in self.rows:
+            for prefix in self.short_prefixes((key,)):
+                groups.setdefault(prefix, set()).add((kind, ident))
+        self.top = dict((prefix, heapq.nsmallest(self.top_size, map(self.rank, items)))
+                        for prefix, items in groups.items())
+
+    def matches(self, prefix):
+        matches = set()
+        position = bisect_left(self.rows, (prefix,))
+        while position < len(self.rows) and self.rows[position][0].startswith(prefix):
+            matches.add(self.rows[position][1:])
+            position += 1
+        return matches
+
+    def lookup(self, prefix, kinds=KINDS, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        best = None
+        if len(prefix) <= self.short_prefix:
+            if prefix not in self.top:
+                self.top[prefix] = heapq.nsmallest(self.top_size, map(self.rank, self.matches(prefix)))
+            best = [entry[2] for entry in self.top[prefix] if entry[2][0] in kinds][:limit]
+            if len(best) < limit and len(self.top[prefix]) == self.top_size:
+                # Not enough items of the requested kinds among the top ones
+                best = None
+        if best is None:
+            matches = (item for item in self.matches(prefix) if item[0] in kinds)
+            best = [entry[2] for entry in heapq.nsmallest(limit, map(self.rank, matches))]
+        return [{'kind': item[0], 'value': self.items[item][1], 'label': self.items[item][0]} for item in best]
+
+
+class Autocomplete:
+    ''' Keeps a PrefixIndex of places, categories, job types and popular search
+        keywords in every process. Saving or deleting one of those models
+        updates the local index in place and bumps a version in the
+        DJOBBERBASE_SEARCH_CACHE cache, other processes rebuild their index on
+        their next lookup. Popular keywords are counted by
+        refresh_keywords(), run by the prune_searches command, and shared
+        through the same cache. Every process reloads them from there every
+        DJOBBERBASE_AUTOCOMPLETE_REFRESH seconds, lookups never count them.
+    '''
+
+    def __init__(self):
+        self.cache = caches[djobberbase_settings.DJOBBERBASE_SEARCH_CACHE]
+        self.lock = threading.RLock()
+        self.prefix_index = None
+        self.version = None
+        self.built_on = 0
+
+    def places(self):
+        ''' Yields (pk, name, full name) for every place of the tree snapshot. '''
+        tree = trees.get(Place)
+        for position, pk in enumerate(tree.pks):
+            yield pk, tree.names[position], Place.name_separator.join(tree.names_of(pk))
+
+    def build(self):
+        prefix_index = PrefixIndex(djobberbase_settings.DJOBBERBASE_AUTOCOMPLETE_MAX_ENTRIES)
+        place_jobs = dict(Job.active.values_list('place').annotate(Count('pk')).order_by())
+        prefix_index.load((PLACE, pk, full_name, name, place_jobs.get(pk, 0))
+                          for pk, name, full_name in self.places())
+        category_jobs = dict(Job.active.values_list('category').annotate(Count('pk')).order_by())
+        prefix_index.load((CATEGORY, pk, name, name, category_jobs.get(pk, 0))
+                          for pk, name in Category.objects.values_list('pk', 'name'))
+        jobtype_jobs = dict(Job.active.values_list('jobtype').annotate(Count('pk')).order_by())
+        prefix_index.load((JOBTYPE, pk, name, name, jobtype_jobs.get(pk, 0))
+                          for pk, name in Type.objects.values_list('pk', 'name'))
+        self.load_keywords(prefix_index)
+        return prefix_index
+
+    def refresh_keywords(self):
+        ''' Counts the saved searches and shares the keywords searched at
+            least DJOBBERBASE_AUTOCOMPLETE_MIN_SEARCHES times, so that only
+            keywords many visitors typed are suggested. Returns their number.
+        '''
+        popular = (JobSearch.objects.values_list('keywords').annotate(searches=Count('pk'))
+                   .order_by('-searches')[:djobberbase_settings.DJOBBERBASE_AUTOCOMPLETE_KEYWORDS])
+        weights = {}
+        for keywords, searches in popular:
+            ident = normalize(keywords)
+            label, weight = weights.get(ident, (keywords.strip(), 0))
+            weights[ident] = (label, weight + searches)
+        keywords = [(ident, label, weight) for ident, (label, weight) in weights.items()
+                    if weight >= djobberbase_settings.DJOBBERBASE_AUTOCOMPLETE_MIN_SEARCHES]
+        self.cache.set(KEYWORDS_KEY, keywords, None)
+        with self.lock:
+            if self.prefix_index is not None:
+                self.load_keywords(self.prefix_index)
+                self.built_on = time()
+        return len(keywords)
+
+    def load_keywords(self, prefix_index):
+        prefix_index.load(((KEYWORD, ident, label, label, weight)
+                           for ident, label, weight in self.cache.get(KEYWORDS_KEY) or ()), replace_kind=KEYWORD)
+
+    def get_index(self):
+        with self.lock:
+            version = self.cache.get(VERSION_KEY) or 0
+            if self.prefix_index is None or version != self.version:
+                self.prefix_index = self.build()
+                self.version = version
+                self.built_on = time()
+            elif time() - self.built_on > djobberbase_settings.DJOBBERBASE_AUTOCOMPLETE_REFRESH:
+                self.load_keywords(self.prefix_index)
+                self.built_on = time()
+            return self.prefix_index
+
+    def lookup(self, prefix, kinds=KINDS, limit=10):
+        prefix_index = self.get_index()
+        with self.lock:
+            return prefix_index.lookup(prefix, kinds=kinds, limit=limit)
+
+    def bump(self):
+        ''' Tells the other processes that their index is stale. The local one
+            stays valid as long as no other process changed anything since it
+            was loaded.
+        '''
+        self.cache.add(VERSION_KEY, 0, None)
+        version = self.cache.incr(VERSION_KEY)
+        with self.lock:
+            if self.prefix_index is not None and self.version == version - 1:
+                self.version = version
+            else:
+                self.prefix_index = None
+
+    def changed(self, instance):
+        with self.lock:
+            if self.prefix_index is not None:
+                if isinstance(instance, Place) and instance.numchild:
+                    # The full names of all its descendants change as well
+                    self.prefix_index = None
+                elif isinstance(instance, Place):
+                    weight = self.prefix_index.items.get((PLACE, instance.pk), (None, None, 0))[2]
+                    self.prefix_index.add(PLACE, instance.pk, instance.full_name, value=instance.name, weight=weight)
+                else:
+                    kind = CATEGORY if isinstance(instance, Category) else JOBTYPE
+                    weight = self.prefix_index.items.get((kind, instance.pk), (None, None, 0))[2]
+                    self.prefix_index.add(kind, instance.pk, instance.name, weight=weight)
+            self.bump()
+
+    def deleted(self, instance):
+        self.invalidate()
+
+    def invalidate(self):
+        ''' Makes every process, this one included, rebuild its index. '''
+        with self.lock:
+            self.prefix_index = None
+            self.bump()
+
+
+autocomplete = Autocomplete()
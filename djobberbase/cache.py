@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+from time import time
+
+from django.core.cache import caches
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.search.base import RankedJobList
+
+ALL = 'all'
+CATEGORY = 'category'
+PLACE = 'place'
+COMPANY = 'company'
+RELATED = 'related'
+
+KEY_PREFIX = 'djobberbase:results'
+HITS_KEY = KEY_PREFIX + ':hits'
+MISSES_KEY = KEY_PREFIX + ':misses'
+
+
+def job_dependencies(*jobs):
+    ''' Returns the cache scopes of the given jobs: the global one and the
+        ones of their category, place and company, both as loaded from the
+        database and as they are now.
+    '''
+    dependencies = {(ALL, None)}
+    for job in jobs:
+        for values in (getattr(job, '_loaded_values', {}), job.__dict__):
+            for scope, attname in ((CATEGORY, 'category_id'), (PLACE, 'place_id'), (COMPANY, 'company_id')):
+                if values.get(attname) is not None:
+                    dependencies.add((scope, values[attname]))
+    return dependencies
+
+
+class CachedJobList(RankedJobList):
+    ''' A RankedJobList whose slices, usually the pages of a view, are cached
+        under the same versioned key as its ids.
+    '''
+
+    def __init__(self, ids, cache, key, timeout):
+        super().__init__(ids)
+        self.cache = cache
+        self.key = key
+        self.timeout = timeout
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            return super().__getitem__(key)
+        start, stop, step = key.indices(len(self.ids))
+        slice_key = '{}:{}:{}'.format(self.key, start, stop)
+        jobs = self.cache.get(slice_key)
+        if jobs is None:
+            jobs = self.load(self.ids[start:stop])
+            self.cache.set(slice_key, jobs, self.timeout)
+        return jobs
+
+
+class ResultCache:
+    ''' Caches the ordered job ids of the job lists and searches, and the
+        pages of those lists, in the DJOBBERBASE_RESULT_CACHE cache.
+
+        Every cached list depends on a few scopes: all jobs, a category, a
+        place or a company. Each scope has a version counter which is part of
+        the cache keys, so bumping it makes all the lists depending on it
+        unreachable. The counters live in the cache as well, which makes the
+        invalidation work across processes with any shared cache backend.
+    '''
+
+    def __init__(self):
+        self._cache = None
+
+    @property
+    def enabled(self):
+        return bool(djobberbase_settings.DJOBBERBASE_RESULT_CACHE)
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = caches[djobberbase_settings.DJOBBERBASE_RESULT_CACHE]
+        return self._cache
+
+    def version_key(self, scope, ident=None):
+        return '{}:version:{}:{}'.format(KEY_PREFIX, scope, ident)
+
+    def versions(self, dependencies):
+        keys = [self.version_key(*dependency) for dependency in dependencies]
+        versions = self.cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # A time based start keeps evicted counters from going back
+                # to a version that is still cached
+                self.cache.add(key, int(time() * 1000000), None)
+                versions[key] = self.cache.get(key)
+        return [versions[key] for key in keys]
+
+    def make_key(self, name, args, dependencies):
+        dependencies = sorted(set(dependencies) | {(RELATED, None)}, key=str)
+        signature = repr((name, args, dependencies, self.versions(dependencies)))
+        return '{}:{}'.format(KEY_PREFIX, hashlib.md5(signature.encode('utf-8')).hexdigest())
+
+    def job_list(self, name, args, dependencies, get_jobs, limit=None):
+        ''' Returns the jobs that get_jobs() would return, as a CachedJobList.
+            name and args identify the list, dependencies are the scopes whose
+            changes affect it.
+        '''
+        if not self.enabled:
+            jobs = get_jobs()
+            return jobs[:limit] if limit else jobs
+        key = self.make_key(name, args, dependencies)
+        timeout = djobberbase_settings.DJOBBERBASE_RESULT_CACHE_TIMEOUT
+        ids = self.cache.get(key)
+        self.count(ids is not None)
+        if ids is None:
+            jobs = get_jobs()
+            if isinstance(jobs, RankedJobList):
+                ids = jobs.ids[:limit]
+            else:
+                ids = list(jobs.values_list('pk', flat=True)[:limit])
+            self.cache.set(key, ids, timeout)
+        return CachedJobList(ids, self.cache, key, timeout)
+
+    def job_count(self, name, args, dependencies, get_count):
+        ''' Returns the number of jobs of a list, caching the result of
+            get_count() like job_list() caches the ids.
+        '''
+        if not self.enabled:
+            return get_count()
+        key = self.make_key(name + ':count', args, dependencies)
+        count = self.cache.get(key)
+        self.count(count is not None)
+        if count is None:
+            count = get_count()
+            self.cache.set(key, count, djobberbase_settings.DJOBBERBASE_RESULT_CACHE_TIMEOUT)
+        return count
+
+    def invalidate(self, dependencies):
+        for dependency in dependencies:
+            key = self.version_key(*dependency)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, int(time() * 1000000), None)
+        if djobberbase_settings.DJOBBERBASE_FEED_ROOT:
+            # The static feeds are cached job lists as well
+            from djobberbase.feeds import remove_static_feeds
+            remove_static_feeds(dependencies)
+
+    def count(self, hit):
+        key = HITS_KEY if hit else MISSES_KEY
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            pass
+
+    def stats(self):
+        ''' Returns the number of hits and misses since the counters were
+            last reset.
+        '''
+        counters = self.cache.get_many([HITS_KEY, MISSES_KEY])
+        hits, misses = counters.get(HITS_KEY, 0), counters.get(MISSES_KEY, 0)
+        return {'hits': hits, 'misses': misses, 'ratio': hits / (hits + misses) if hits + misses else 0.0}
+
+    def reset_stats(self):
+        self.cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+result_cache = ResultCache()
@@ -1 +1 @@
- 
+ 
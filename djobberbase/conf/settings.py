@@ -1,69 +1,142 @@
-# -*- coding: utf-8 -*-
-
-from django.conf import settings
-from django.utils.translation import ugettext_lazy as _
-
-# General settings
-DJOBBERBASE_SITE_NAME = getattr(settings, 'DJOBBERBASE_SITE_NAME', 'Djobberbase')
-DJOBBERBASE_HTML_TITLE = getattr(settings, 'DJOBBERBASE_HTML_TITLE', 'Djobberbase :: A jobberBase clone written using the Django framework')
-DJOBBERBASE_SITE_DESCRIPTION = getattr(settings, 'DJOBBERBASE_SITE_DESCRIPTION', 'Djobberbase jobs.')
-DJOBBERBASE_MINUTES_BETWEEN = getattr(settings, 'DJOBBERBASE_MINUTES_BETWEEN', 10)
-DJOBBERBASE_DEFAULT_PLACE_HIERARCHY = getattr(settings, 'DJOBBERBASE_DEFAULT_PLACE_HIERARCHY', 4)
-DJOBBERBASE_MAX_UPLOAD_SIZE = getattr(settings, 'DJOBBERBASE_MAX_UPLOAD_SIZE', 3145728)
-DJOBBERBASE_FILE_UPLOADS = getattr(settings, 'DJOBBERBASE_FILE_UPLOADS', './uploads/')
-DJOBBERBASE_JOBS_PER_PAGE = getattr(settings, 'DJOBBERBASE_JOBS_PER_PAGE', 50)
-DJOBBERBASE_JOBS_PER_SEARCH = getattr(settings, 'DJOBBERBASE_JOBS_PER_SEARCH', 25)
-DJOBBERBASE_MAX_VISITS_PER_HOUR = getattr(settings, 'DJOBBERBASE_MAX_VISITS_PER_HOUR', 1)
-DJOBBERBASE_CAPTCHA_POST = getattr(settings, 'DJOBBERBASE_CAPTCHA_POST', None)
-DJOBBERBASE_CAPTCHA_APPLICATION = getattr(settings, 'DJOBBERBASE_CAPTCHA_APPLICATION', None)
-DJOBBERBASE_CV_EXTENSIONS = getattr(settings, 'DJOBBERBASE_CV_EXTENSIONS', ('pdf', 'rtf', 'doc', 'docx', 'odt'))
-
-DJOBBERBASE_POST_URL = getattr(settings, 'DJOBBERBASE_POST_URL', 'post')
-DJOBBERBASE_VERIFY_URL = getattr(settings, 'DJOBBERBASE_VERIFY_URL', 'verify')
-DJOBBERBASE_CONFIRM_URL = getattr(settings, 'DJOBBERBASE_CONFIRM_URL', 'confirm')
-DJOBBERBASE_JOB_URL = getattr(settings, 'DJOBBERBASE_JOB_URL', 'job')
-DJOBBERBASE_AT_URL = getattr(settings, 'DJOBBERBASE_AT_URL', 'at')
-DJOBBERBASE_JOBS_URL = getattr(settings, 'DJOBBERBASE_JOBS_URL', 'jobs')
-DJOBBERBASE_CITIES_URL = getattr(settings, 'DJOBBERBASE_CITIES_URL', 'cities')
-DJOBBERBASE_COMPANIES_URL = getattr(settings, 'DJOBBERBASE_COMPANIES_URL', 'companies')
-DJOBBERBASE_JOBS_IN_URL = getattr(settings, 'DJOBBERBASE_JOBS_IN_URL', 'jobs-in')
-DJOBBERBASE_JOBS_IN_OTHER_CITIES = getattr(settings, 'DJOBBERBASE_JOBS_IN_OTHER_CITIES', 'jobs-in-other-cities')
-DJOBBERBASE_JOBS_AT_URL = getattr(settings, 'DJOBBERBASE_JOBS_AT_URL', 'jobs-at')
-DJOBBERBASE_ACTIVATE_URL = getattr(settings, 'DJOBBERBASE_ACTIVATE_URL', 'activate')
-DJOBBERBASE_DEACTIVATE_URL = getattr(settings, 'DJOBBERBASE_DEACTIVATE_URL', 'deactivate')
-DJOBBERBASE_SEARCH_URL = getattr(settings, 'DJOBBERBASE_SEARCH_URL', 'search')
-DJOBBERBASE_UNAVAILABLE_URL = getattr(settings, 'DJOBBERBASE_UNAVAILABLE_URL', 'job-unavailable')
-
-# Mailing settings
-DJOBBERBASE_ASYNC_NOTIFICATIONS = getattr(settings, 'DJOBBERBASE_ASYNC_NOTIFICATIONS', False)
-DJOBBERBASE_ENABLE_NEW_POST_MODERATION = getattr(settings, 'DJOBBERBASE_ENABLE_NEW_POST_MODERATION', True)
-
-DJOBBERBASE_ADMIN_EMAIL = getattr(settings, 'DJOBBERBASE_ADMIN_EMAIL', '')
-DJOBBERBASE_ADMIN_NOTIFICATIONS = getattr(settings, 'DJOBBERBASE_ADMIN_NOTIFICATIONS', False)
-DJOBBERBASE_POSTER_NOTIFICATIONS = getattr(settings, 'DJOBBERBASE_POSTER_NOTIFICATIONS', False)
-DJOBBERBASE_APPLICATION_NOTIFICATIONS = getattr(settings, 'DJOBBERBASE_APPLICATION_NOTIFICATIONS', False)
-
-DJOBBERBASE_NEW_POST_ADMIN_SUBJECT = getattr(settings, 
-                                    'DJOBBERBASE_NEW_POST_ADMIN_SUBJECT', 
-                                    _('[ %(site_name)s  ] New job: %(job_title)s'))
-
-DJOBBERBASE_EDIT_POST_ADMIN_SUBJECT = getattr(settings, 
-                                    'DJOBBERBASE_EDIT_POST_ADMIN_SUBJECT', 
-                                    _('[ %(site_name)s  ] Edited job: %(job_title)s'))
-
-DJOBBERBASE_MAIL_PENDING_SUBJECT = getattr(settings, 
-                                    'DJOBBERBASE_MAIL_PENDING_SUBJECT', 
-                                    _('Your ad on %(site_name)s'))
-
-DJOBBERBASE_MAIL_PUBLISH_SUBJECT = getattr(settings, 
-                                    'DJOBBERBASE_MAIL_PUBLISH_SUBJECT', 
-                                    _('Your ad on %(site_name)s was published'))
- 
-DJOBBERBASE_MAIL_APPLY_ONLINE_SUBJECT = getattr(settings, 
-                                    'DJOBBERBASE_MAIL_APPLY_ONLINE_SUBJECT', 
-                                    _('[ %(site_name)s ] I wish to apply for %(job_title)s'))
-
-
-# Markup settings
-DJOBBERBASE_MARKUP_LANGUAGE = getattr(settings, 'DJOBBERBASE_MARKUP_LANGUAGE', None) #options: 'textile', 'markdown'
-
+# -*- coding: utf-8 -*-
+
+from django.conf import settings
+from django.utils.translation import ugettext_lazy as _
+
+# General settings
+DJOBBERBASE_SITE_NAME = getattr(settings, 'DJOBBERBASE_SITE_NAME', 'Djobberbase')
+DJOBBERBASE_HTML_TITLE = getattr(settings, 'DJOBBERBASE_HTML_TITLE', 'Djobberbase :: A jobberBase clone written using the Django framework')
+DJOBBERBASE_SITE_DESCRIPTION = getattr(settings, 'DJOBBERBASE_SITE_DESCRIPTION', 'Djobberbase jobs.')
+DJOBBERBASE_MINUTES_BETWEEN = getattr(settings, 'DJOBBERBASE_MINUTES_BETWEEN', 10)
+DJOBBERBASE_DEFAULT_PLACE_HIERARCHY = getattr(settings, 'DJOBBERBASE_DEFAULT_PLACE_HIERARCHY', 4)
+DJOBBERBASE_MAX_UPLOAD_SIZE = getattr(settings, 'DJOBBERBASE_MAX_UPLOAD_SIZE', 3145728)
+DJOBBERBASE_FILE_UPLOADS = getattr(settings, 'DJOBBERBASE_FILE_UPLOADS', './uploads/')
+DJOBBERBASE_CV_MEMORY_SIZE = getattr(settings, 'DJOBBERBASE_CV_MEMORY_SIZE', 262144) #bytes of a CV kept in memory and in the outbox, larger ones go to DJOBBERBASE_FILE_UPLOADS
+DJOBBERBASE_JOBS_PER_PAGE = getattr(settings, 'DJOBBERBASE_JOBS_PER_PAGE', 50)
+DJOBBERBASE_JOBS_PER_SEARCH = getattr(settings, 'DJOBBERBASE_JOBS_PER_SEARCH', 25)
+DJOBBERBASE_MAX_VISITS_PER_HOUR = getattr(settings, 'DJOBBERBASE_MAX_VISITS_PER_HOUR', 1)
+DJOBBERBASE_CAPTCHA_POST = getattr(settings, 'DJOBBERBASE_CAPTCHA_POST', None)
+DJOBBERBASE_CAPTCHA_APPLICATION = getattr(settings, 'DJOBBERBASE_CAPTCHA_APPLICATION', None)
+DJOBBERBASE_CV_EXTENSIONS = getattr(settings, 'DJOBBERBASE_CV_EXTENSIONS', ('pdf', 'rtf', 'doc', 'docx', 'odt'))
+
+DJOBBERBASE_POST_URL = getattr(settings, 'DJOBBERBASE_POST_URL', 'post')
+DJOBBERBASE_VERIFY_URL = getattr(settings, 'DJOBBERBASE_VERIFY_URL', 'verify')
+DJOBBERBASE_CONFIRM_URL = getattr(settings, 'DJOBBERBASE_CONFIRM_URL', 'confirm')
+DJOBBERBASE_JOB_URL = getattr(settings, 'DJOBBERBASE_JOB_URL', 'job')
+DJOBBERBASE_AT_URL = getattr(settings, 'DJOBBERBASE_AT_URL', 'at')
+DJOBBERBASE_JOBS_URL = getattr(settings, 'DJOBBERBASE_JOBS_URL', 'jobs')
+DJOBBERBASE_CITIES_URL = getattr(settings, 'DJOBBERBASE_CITIES_URL', 'cities')
+DJOBBERBASE_COMPANIES_URL = getattr(settings, 'DJOBBERBASE_COMPANIES_URL', 'companies')
+DJOBBERBASE_JOBS_IN_URL = getattr(settings, 'DJOBBERBASE_JOBS_IN_URL', 'jobs-in')
+DJOBBERBASE_JOBS_IN_OTHER_CITIES = getattr(settings, 'DJOBBERBASE_JOBS_IN_OTHER_CITIES', 'jobs-in-other-cities')
+DJOBBERBASE_JOBS_AT_URL = getattr(settings, 'DJOBBERBASE_JOBS_AT_URL', 'jobs-at')
+DJOBBERBASE_ACTIVATE_URL = getattr(settings, 'DJOBBERBASE_ACTIVATE_URL', 'activate')
+DJOBBERBASE_DEACTIVATE_URL = getattr(settings, 'DJOBBERBASE_DEACTIVATE_URL', 'deactivate')
+DJOBBERBASE_SEARCH_URL = getattr(settings, 'DJOBBERBASE_SEARCH_URL', 'search')
+DJOBBERBASE_UNAVAILABLE_URL = getattr(settings, 'DJOBBERBASE_UNAVAILABLE_URL', 'job-unavailable')
+DJOBBERBASE_EXPORT_URL = getattr(settings, 'DJOBBERBASE_EXPORT_URL', 'export')
+DJOBBERBASE_EXPORT_OVERLAP = getattr(settings, 'DJOBBERBASE_EXPORT_OVERLAP', 60) #seconds incremental exports overlap by
+
+# Mailing settings
+DJOBBERBASE_ASYNC_NOTIFICATIONS = getattr(settings, 'DJOBBERBASE_ASYNC_NOTIFICATIONS', False) #send the outbox with Celery
+DJOBBERBASE_OUTBOX_BATCH_SIZE = getattr(settings, 'DJOBBERBASE_OUTBOX_BATCH_SIZE', 100)
+DJOBBERBASE_OUTBOX_MAX_ATTEMPTS = getattr(settings, 'DJOBBERBASE_OUTBOX_MAX_ATTEMPTS', 5)
+DJOBBERBASE_OUTBOX_RETRY_DELAY = getattr(settings, 'DJOBBERBASE_OUTBOX_RETRY_DELAY', 60) #seconds, doubled after each attempt
+DJOBBERBASE_OUTBOX_LEASE = getattr(settings, 'DJOBBERBASE_OUTBOX_LEASE', 300) #seconds a worker keeps its claimed messages
+DJOBBERBASE_ENABLE_NEW_POST_MODERATION = getattr(settings, 'DJOBBERBASE_ENABLE_NEW_POST_MODERATION', True)
+
+DJOBBERBASE_ADMIN_EMAIL = getattr(settings, 'DJOBBERBASE_ADMIN_EMAIL', '')
+DJOBBERBASE_ADMIN_NOTIFICATIONS = getattr(settings, 'DJOBBERBASE_ADMIN_NOTIFICATIONS', False)
+DJOBBERBASE_ADMIN_DIGEST = getattr(settings, 'DJOBBERBASE_ADMIN_DIGEST', False) #one summary per send_moderation_digest run instead of an email per job
+DJOBBERBASE_ADMIN_DIGEST_RECIPIENTS = getattr(settings, 'DJOBBERBASE_ADMIN_DIGEST_RECIPIENTS', None) #defaults to DJOBBERBASE_ADMIN_EMAIL
+DJOBBERBASE_ADMIN_DIGEST_MAX_JOBS = getattr(settings, 'DJOBBERBASE_ADMIN_DIGEST_MAX_JOBS', 200) #jobs listed in a digest, the others are counted
+DJOBBERBASE_POSTER_NOTIFICATIONS = getattr(settings, 'DJOBBERBASE_POSTER_NOTIFICATIONS', False)
+DJOBBERBASE_APPLICATION_NOTIFICATIONS = getattr(settings, 'DJOBBERBASE_APPLICATION_NOTIFICATIONS', False)
+
+DJOBBERBASE_NEW_POST_ADMIN_SUBJECT = getattr(settings, 
+                                    'DJOBBERBASE_NEW_POST_ADMIN_SUBJECT', 
+                                    _('[ %(site_name)s  ] New job: %(job_title)s'))
+
+DJOBBERBASE_EDIT_POST_ADMIN_SUBJECT = getattr(settings, 
+                                    'DJOBBERBASE_EDIT_POST_ADMIN_SUBJECT', 
+                                    _('[ %(site_name)s  ] Edited job: %(job_title)s'))
+
+DJOBBERBASE_ADMIN_DIGEST_SUBJECT = getattr(settings,
+                                    'DJOBBERBASE_ADMIN_DIGEST_SUBJECT',
+                                    _('[ %(site_name)s  ] %(jobs)s jobs posted or edited, %(pending)s to activate'))
+
+DJOBBERBASE_MAIL_PENDING_SUBJECT = getattr(settings, 
+                                    'DJOBBERBASE_MAIL_PENDING_SUBJECT', 
+                                    _('Your ad on %(site_name)s'))
+
+DJOBBERBASE_MAIL_PUBLISH_SUBJECT = getattr(settings, 
+                                    'DJOBBERBASE_MAIL_PUBLISH_SUBJECT', 
+                                    _('Your ad on %(site_name)s was published'))
+ 
+DJOBBERBASE_MAIL_APPLY_ONLINE_SUBJECT = getattr(settings, 
+                                    'DJOBBERBASE_MAIL_APPLY_ONLINE_SUBJECT', 
+                                    _('[ %(site_name)s ] I wish to apply for %(job_title)s'))
+
+
+# Markup settings
+DJOBBERBASE_MARKUP_LANGUAGE = getattr(settings, 'DJOBBERBASE_MARKUP_LANGUAGE', None) #options: 'textile', 'markdown'
+
+
+
+# Search settings
+DJOBBERBASE_SEARCH_BACKEND = getattr(settings, 'DJOBBERBASE_SEARCH_BACKEND', 'djobberbase.search.database.DatabaseBackend')
+DJOBBERBASE_SEARCH_CACHE = getattr(settings, 'DJOBBERBASE_SEARCH_CACHE', 'default')
+DJOBBERBASE_SEARCH_INDEX_CHUNK_SIZE = getattr(settings, 'DJOBBERBASE_SEARCH_INDEX_CHUNK_SIZE', 2000)
+DJOBBERBASE_SEARCH_CONFIG = getattr(settings, 'DJOBBERBASE_SEARCH_CONFIG', 'simple') #PostgreSQL text search configuration
+
+# Autocomplete settings
+DJOBBERBASE_AUTOCOMPLETE_URL = getattr(settings, 'DJOBBERBASE_AUTOCOMPLETE_URL', 'autocomplete')
+DJOBBERBASE_AUTOCOMPLETE_MAX_ENTRIES = getattr(settings, 'DJOBBERBASE_AUTOCOMPLETE_MAX_ENTRIES', 200000)
+DJOBBERBASE_AUTOCOMPLETE_KEYWORDS = getattr(settings, 'DJOBBERBASE_AUTOCOMPLETE_KEYWORDS', 1000)
+DJOBBERBASE_AUTOCOMPLETE_REFRESH = getattr(settings, 'DJOBBERBASE_AUTOCOMPLETE_REFRESH', 300)
+DJOBBERBASE_AUTOCOMPLETE_MIN_SEARCHES = getattr(settings, 'DJOBBERBASE_AUTOCOMPLETE_MIN_SEARCHES', 5) #times keywords are searched before they are suggested
+DJOBBERBASE_SAVE_SEARCHES = getattr(settings, 'DJOBBERBASE_SAVE_SEARCHES', False)
+DJOBBERBASE_SEARCHES_KEEP_DAYS = getattr(settings, 'DJOBBERBASE_SEARCHES_KEEP_DAYS', 30)
+
+# Result cache settings
+DJOBBERBASE_RESULT_CACHE = getattr(settings, 'DJOBBERBASE_RESULT_CACHE', 'default') #None disables it
+DJOBBERBASE_RESULT_CACHE_TIMEOUT = getattr(settings, 'DJOBBERBASE_RESULT_CACHE_TIMEOUT', 600)
+DJOBBERBASE_FEED_ROOT = getattr(settings, 'DJOBBERBASE_FEED_ROOT', None) #directory the feeds are also written to, for the web server to serve them
+
+# Pagination settings
+DJOBBERBASE_KEYSET_PAGINATION = getattr(settings, 'DJOBBERBASE_KEYSET_PAGINATION', False)
+DJOBBERBASE_EXACT_COUNT_LIMIT = getattr(settings, 'DJOBBERBASE_EXACT_COUNT_LIMIT', 10000) #Larger lists get an estimated count on PostgreSQL
+
+# Tree settings
+DJOBBERBASE_TREE_CACHE = getattr(settings, 'DJOBBERBASE_TREE_CACHE', 'default')
+DJOBBERBASE_TREE_CHECK_INTERVAL = getattr(settings, 'DJOBBERBASE_TREE_CHECK_INTERVAL', 5) #seconds
+
+# Job stats settings
+DJOBBERBASE_STATS_BUFFER = getattr(settings, 'DJOBBERBASE_STATS_BUFFER', 'memory') #'memory', a cache shared by all the processes or None
+DJOBBERBASE_STATS_BUFFER_SIZE = getattr(settings, 'DJOBBERBASE_STATS_BUFFER_SIZE', 500)
+DJOBBERBASE_STATS_FLUSH_INTERVAL = getattr(settings, 'DJOBBERBASE_STATS_FLUSH_INTERVAL', 10) #seconds
+DJOBBERBASE_VISITORS_PRECISION = getattr(settings, 'DJOBBERBASE_VISITORS_PRECISION', 11) #unique visitor sketches of 2 ** 11 bytes, about 2% error
+DJOBBERBASE_STATS_KEEP_DAYS = getattr(settings, 'DJOBBERBASE_STATS_KEEP_DAYS', 30) #raw stats older than this are compacted into daily rollups
+
+# Leaderboard settings
+DJOBBERBASE_TRENDING_HALF_LIFE = getattr(settings, 'DJOBBERBASE_TRENDING_HALF_LIFE', 24) #hours
+DJOBBERBASE_TRENDING_WEIGHTS = getattr(settings, 'DJOBBERBASE_TRENDING_WEIGHTS', {'H': 1, 'A': 10}) #per stat type
+
+# Rate limit settings, in actions per client and period in seconds
+DJOBBERBASE_RATE_LIMIT_CACHE = getattr(settings, 'DJOBBERBASE_RATE_LIMIT_CACHE', 'default')
+DJOBBERBASE_RATE_LIMITS = dict({
+    'apply': (1, DJOBBERBASE_MINUTES_BETWEEN * 60),
+    'export': (10, 3600),
+    'post': (10, 3600),
+    'search': (60, 60),
+    'visit': (DJOBBERBASE_MAX_VISITS_PER_HOUR, 3600), #visits of a job counted in its stats
+}, **getattr(settings, 'DJOBBERBASE_RATE_LIMITS', {}))
+
+# Sitemap settings
+DJOBBERBASE_SITEMAP_ROOT = getattr(settings, 'DJOBBERBASE_SITEMAP_ROOT', './sitemaps/') #directory the write_sitemaps command writes to
+DJOBBERBASE_SITEMAP_URL = getattr(settings, 'DJOBBERBASE_SITEMAP_URL', '/sitemaps/') #where the web server serves DJOBBERBASE_SITEMAP_ROOT
+DJOBBERBASE_SITEMAP_SHARD_SIZE = getattr(settings, 'DJOBBERBASE_SITEMAP_SHARD_SIZE', 50000) #URLs per file at most, 50000 is the protocol limit
+
+# Duplicate detection settings
+DJOBBERBASE_DUPLICATE_DISTANCE = getattr(settings, 'DJOBBERBASE_DUPLICATE_DISTANCE', 3) #bits two description SimHashes may differ in, 3 at most
+DJOBBERBASE_REJECT_NEAR_DUPLICATES = getattr(settings, 'DJOBBERBASE_REJECT_NEAR_DUPLICATES', True) #Job.clean rejects near-duplicates of active jobs of the same company and place
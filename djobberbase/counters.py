@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F
+
+from djobberbase.models import Category, Job, Place
+
+COUNTED_MODELS = ((Category, 'category_id'), (Place, 'place_id'))
+
+
+def job_state(values):
+    ''' Returns the (category id, place id) a job counts for given its field
+        values, or None when it is not active and counts for nothing.
+    '''
+    if not values or not values.get('is_active'):
+        return None
+    return values.get('category_id'), values.get('place_id')
+
+
+def path_prefixes(model, path):
+    return [path[:end] for end in range(model.steplen, len(path) + 1, model.steplen)]
+
+
+def update_job_counts(changes):
+    ''' Applies the (old state, new state) changes of some jobs, as returned by
+        job_state(), to the job counters of their categories and places. The
+        direct counter of a node and the total counters of the node and all its
+        ancestors are incremented or decremented in place.
+    '''
+    deltas = {Category: Counter(), Place: Counter()}
+    for old, new in changes:
+        if old == new:
+            continue
+        for state, delta in ((old, -1), (new, 1)):
+            if state is not None:
+                deltas[Category][state[0]] += delta
+                deltas[Place][state[1]] += delta
+    for model, node_deltas in deltas.items():
+        node_deltas = dict((pk, delta) for pk, delta in node_deltas.items() if delta)
+        if node_deltas:
+            apply_deltas(model, node_deltas)
+
+
+def apply_deltas(model, node_deltas):
+    ''' Updates the counters with one query per distinct delta, a single job
+        moving from a node to another costs four updates.
+    '''
+    paths = dict(model.objects.filter(pk__in=node_deltas).values_list('pk', 'path'))
+    direct = defaultdict(list)
+    totals = Counter()
+    for pk, delta in node_deltas.items():
+        direct[delta].append(pk)
+        for prefix in path_prefixes(model, paths.get(pk, '')):
+            totals[prefix] += delta
+    for delta, pks in direct.items():
+        model.objects.filter(pk__in=pks).update(job_count=F('job_count') + delta)
+    by_delta = defaultdict(list)
+    for prefix, delta in totals.items():
+        if delta:
+            by_delta[delta].append(prefix)
+    for delta, prefixes in by_delta.items():
+        model.objects.filter(path__in=prefixes).update(total_job_count=F('total_job_count') + delta)
+
+
+def move_node(node, old_path):
+    ''' Moves the total of a node that was moved from old_path from its old
+        ancestors to its new ones.
+    '''
+    model = type(node)
+    node.refresh_from_db(fields=['path', 'total_job_count'])
+    old_ancestors = set(path_prefixes(model, old_path)[:-1])
+    new_ancestors = set(path_prefixes(model, node.path)[:-1])
+    if node.total_job_count:
+        model.objects.filter(path__in=old_ancestors - new_ancestors).update(
+            total_job_count=F('total_job_count') - node.total_job_count)
+        model.objects.filter(path__in=new_ancestors - old_ancestors).update(
+            total_job_count=F('total_job_count') + node.total_job_count)
+
+
+def count_jobs(model, field):
+    ''' Returns {pk: (job count, total job count)} for every node of a tree,
+        computed from a single GROUP BY over the active jobs whose counts are
+        then added up along the path prefixes.
+    '''
+    direct = dict(Job.active.values_list(field).annotate(Count('pk')).order_by())
+    nodes = list(model.objects.values_list('pk', 'path'))
+    totals = Counter()
+    for pk, path in nodes:
+        for prefix in path_prefixes(model, path):
+            totals[prefix] += direct.get(pk, 0)
+    return dict((pk, (direct.get(pk, 0), totals[path])) for pk, path in nodes)
+
+
+def recount(fix=True):
+    ''' Compares every counter with the actual number of active jobs and
+        returns the list of (model, pk, stored counts, actual counts) that did
+        not match, correcting them unless fix is False.
+    '''
+    mismatches = []
+    for model, field in COUNTED_MODELS:
+        counts = count_jobs(model, field)
+        for pk, job_count, total_job_count in model.objects.values_list('pk', 'job_count', 'total_job_count'):
+            if counts[pk] != (job_count, total_job_count):
+                mismatches.append((model, pk, (job_count, total_job_count), counts[pk]))
+                if fix:
+                    model.objects.filter(pk=pk).update(job_count=counts[pk][0], total_job_count=counts[pk][1])
+    return mismatches
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+from datetime import timedelta
+from xml.sax.saxutils import escape
+
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.helpers import database_datetime
+from djobberbase.models import Category, Job, Place, Type
+from djobberbase.trees import trees
+
+JSONL = 'jsonl'
+CSV = 'csv'
+XML = 'xml'
+CONTENT_TYPES = {
+    JSONL: 'application/x-ndjson; charset=utf-8',
+    CSV: 'text/csv; charset=utf-8',
+    XML: 'application/xml; charset=utf-8',
+}
+CHUNK_SIZE = 2000
+
+FIELDS = ('id', 'title', 'url', 'description', 'category', 'jobtype', 'place', 'company', 'salary_range_min',
+          'salary_range_max', 'external_url', 'created_on', 'modified_on', 'valid_until', 'is_active')
+COLUMNS = ('pk', 'slug', 'title', 'description', 'category_id', 'jobtype_id', 'place_id', 'company__admin__username',
+           'salary_range_min', 'salary_range_max', 'url', 'created_on', 'modified_on', 'valid_until', 'is_active')
+
+
+class NameResolver:
+    ''' Resolves the names of the categories, job types and places of the
+        exported jobs from the tree snapshots and one query for the types,
+        each name being built once per export.
+    '''
+
+    def __init__(self):
+        self.types = dict(Type.objects.values_list('pk', 'name'))
+        self.trees = {Category: trees.get(Category), Place: trees.get(Place)}
+        self.names = {}
+
+    def full_name(self, model, pk):
+        key = (model, pk)
+        if key not in self.names:
+            tree = self.trees[model]
+            self.names[key] = model.name_separator.join(tree.names_of(pk)) if pk in tree else ''
+        return self.names[key]
+
+
+def job_rows(since=None, until=None, chunk_size=CHUNK_SIZE):
+    ''' Yields the exported jobs as dicts, streaming them in keyset chunks of
+        chunk_size. Without since these are the active jobs. With since they
+        are the jobs modified after it, including the deactivated ones so that
+        they can be removed.
+    '''
+    jobs = Job.objects.all() if since else Job.active.all()
+    if since:
+        jobs = jobs.filter(modified_on__gt=since)
+    if until:
+        jobs = jobs.filter(modified_on__lte=until)
+    jobs = jobs.order_by('pk').values_list(*COLUMNS)
+    resolver = NameResolver()
+    last = 0
+    while True:
+        count = 0
+        for (pk, slug, title, description, category_id, jobtype_id, place_id, company, salary_range_min,
+                salary_range_max, url, created_on, modified_on, valid_until, is_active) in \
+                jobs.filter(pk__gt=last)[:chunk_size].iterator():
+            count += 1
+            last = pk
+            yield {
+                'id': pk,
+                'title': title,
+                'url': reverse('djobberbase:job_detail', kwargs={'company': company, 'title_slug': slug, 'pk': pk}),
+                'description': description,
+                'category': resolver.full_name(Category, category_id),
+                'jobtype': resolver.types.get(jobtype_id, ''),
+                'place': resolver.full_name(Place, place_id),
+                'company': company,
+                'salary_range_min': salary_range_min,
+                'salary_range_max': salary_range_max,
+                'external_url': url or '',
+                'created_on': created_on.isoformat() if created_on else None,
+                'modified_on': modified_on.isoformat() if modified_on else None,
+                'valid_until': valid_until.isoformat() if valid_until else None,
+                'is_active': is_active,
+            }
+        if count < chunk_size:
+            break
+
+
+class Echo:
+    ''' A file whose writes return what was written, for csv.writer. '''
+
+    def write(self, value):
+        return value
+
+
+def serialize(rows, export_format):
+    ''' Yields the rows as lines of JSON, CSV with a header or XML. '''
+    if export_format == JSONL:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+    elif export_format == CSV:
+        writer = csv.writer(Echo())
+        yield writer.writerow(FIELDS)
+        for row in rows:
+            yield writer.writerow([row[field] for field in FIELDS])
+    elif export_format == XML:
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n<jobs>\n'
+        for row in rows:
+            yield '<job>{}</job>\n'.format(''.join(
+                '<{0}>{1}</{0}>'.format(field, escape(str(row[field]))) for field in FIELDS if row[field] is not None))
+        yield '</jobs>\n'
+    else:
+        raise ValueError('Unknown export format {}.'.format(export_format))
+
+
+def parse_since(value):
+    ''' Parses the ISO 8601 since date of an incremental export, raises
+        ValueError when it is not a valid date.
+    '''
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError(value)
+    return database_datetime(since)
+
+
+def export_jobs(export_format, since=None, chunk_size=CHUNK_SIZE):
+    ''' Returns the since of the next incremental export and the serialized
+        jobs. Jobs are stamped before their transaction commits, so a job
+        modified just before the export may only become visible after it.
+        The next export starts DJOBBERBASE_EXPORT_OVERLAP seconds earlier to
+        get them, consumers dedupe the jobs exported twice by id.
+    '''
+    until = timezone.now()
+    next_since = until - timedelta(seconds=djobberbase_settings.DJOBBERBASE_EXPORT_OVERLAP)
+    if since:
+        next_since = max(next_since, since)
+    return next_since, serialize(job_rows(since, until, chunk_size), export_format)
@@ -1,43 +1,129 @@
-# -*- coding: utf-8 -*-
-
-from django.contrib.syndication.views import Feed
-from django.utils.feedgenerator import Rss201rev2Feed
-from django.shortcuts import get_object_or_404
-from django.core.urlresolvers import reverse
-from django.utils.translation import ugettext_lazy as _
-from djobberbase.models import Category, Job
-from djobberbase.conf.settings import DJOBBERBASE_SITE_NAME
-
-
-class LatestJobsFeed(Feed):
-
-    def get_object(self, request, var_name):
-        if var_name == 'all':
-            return None
-        else:
-            return get_object_or_404(Category, var_name=var_name)
-
-    def title(self, obj=None):
-        t = _(' %(site_name)s RSS Job feed') % {'site_name' : DJOBBERBASE_SITE_NAME}
-        if obj:
-            t += _(': %(category)s jobs') % {'site_name' : obj}
-        return t
-
-    def link(self, obj=None):
-        if not obj:
-            return reverse('djobberbase_job_list_all')
-        else:
-            return obj.get_absolute_url()
-
-    def description(self, obj=None):
-        if not obj:
-            return _('Latest jobs')
-        else:
-            return _('Latest jobs for %(category)s ') % {'category' : obj}
-
-    def items(self, obj=None):
-        jobs = Job.active.all()
-        if obj:
-            jobs = jobs.filter(category=obj)
-        jobs = jobs.order_by('created_on')[:30]
-        return jobs
+# -*- coding: utf-8 -*-
+
+import os
+from time import time
+
+from django.contrib.syndication.views import Feed
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import ugettext_lazy as _
+from djobberbase.cache import ALL, CATEGORY, RELATED, result_cache
+from djobberbase.models import Category, Job
+from djobberbase.conf import settings as djobberbase_settings
+
+ALL_JOBS = 'all'
+
+
+class LatestJobsFeed(Feed):
+    ''' The latest jobs, of a category or of all of them. The rendered feeds
+        are kept in the DJOBBERBASE_RESULT_CACHE cache under the version of
+        their category, so they are rendered again only after one of its
+        jobs changed, and fetches of an unchanged feed get a 304 through its
+        ETag and Last-Modified headers. With DJOBBERBASE_FEED_ROOT the feeds
+        are also written there as static files.
+    '''
+
+    def __call__(self, request, var_name):
+        if not result_cache.enabled:
+            response = super().__call__(request, var_name=var_name)
+            write_static_feed(var_name, response.content)
+            return response
+        dependencies = [(ALL, None)] if var_name == ALL_JOBS else [(CATEGORY, self.category_id(var_name))]
+        key = result_cache.make_key('feed', var_name, dependencies)
+        cached = result_cache.cache.get(key)
+        result_cache.count(cached is not None)
+        if cached is None:
+            response = super().__call__(request, var_name=var_name)
+            cached = (response.content, response['Content-Type'], int(time()))
+            result_cache.cache.set(key, cached, djobberbase_settings.DJOBBERBASE_RESULT_CACHE_TIMEOUT)
+            write_static_feed(var_name, response.content)
+        content, content_type, last_modified = cached
+        # The key changes with the version of the category
+        etag = key.rsplit(':', 1)[-1]
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified,
+                                            response=HttpResponse(content, content_type=content_type))
+        response['ETag'] = quote_etag(etag)
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def category_id(self, var_name):
+        key = result_cache.make_key('feed:category', var_name, [])
+        pk = result_cache.cache.get(key)
+        if pk is None:
+            pk = self.get_object(None, var_name).pk
+            result_cache.cache.set(key, pk, djobberbase_settings.DJOBBERBASE_RESULT_CACHE_TIMEOUT)
+        return pk
+
+    def get_object(self, request, var_name):
+        if var_name == ALL_JOBS:
+            return None
+        category = Category.objects.filter(slug=var_name).first()
+        if category is None:
+            raise Http404
+        return category
+
+    def title(self, obj=None):
+        t = _(' %(site_name)s RSS Job feed') % {'site_name' : djobberbase_settings.DJOBBERBASE_SITE_NAME}
+        if obj:
+            t += _(': %(category)s jobs') % {'category' : obj}
+        return t
+
+    def link(self, obj=None):
+        if not obj:
+            return reverse('djobberbase:job_list_all')
+        else:
+            return obj.get_absolute_url()
+
+    def description(self, obj=None):
+        if not obj:
+            return _('Latest jobs')
+        else:
+            return _('Latest jobs for %(category)s ') % {'category' : obj}
+
+    def items(self, obj=None):
+        jobs = Job.active.all()
+        if obj:
+            jobs = jobs.filter(category=obj)
+        jobs = jobs.select_related('company__admin').order_by('-created_on', '-id')[:30]
+        return jobs
+
+
+def static_feed_path(var_name):
+    return os.path.join(djobberbase_settings.DJOBBERBASE_FEED_ROOT, '{}.xml'.format(var_name))
+
+
+def write_static_feed(var_name, content):
+    ''' Writes a rendered feed to DJOBBERBASE_FEED_ROOT, replacing the previous
+        file at once so that the web server never serves half of it.
+    '''
+    if not djobberbase_settings.DJOBBERBASE_FEED_ROOT:
+        return
+    path = static_feed_path(var_name)
+    temporary = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temporary, 'wb') as f:
+        f.write(content)
+    os.replace(temporary, path)
+
+
+def remove_static_feeds(dependencies):
+    ''' Removes the static feeds depending on the given cache scopes, the
+        next requests for them go to LatestJobsFeed which writes them again.
+    '''
+    root = djobberbase_settings.DJOBBERBASE_FEED_ROOT
+    if not root or not os.path.isdir(root):
+        return
+    scopes = set(scope for scope, ident in dependencies)
+    if RELATED in scopes:
+        # The feeds show the names of the categories and companies
+        var_names = [name[:-len('.xml')] for name in os.listdir(root) if name.endswith('.xml')]
+    else:
+        category_ids = [ident for scope, ident in dependencies if scope == CATEGORY]
+        var_names = ([ALL_JOBS] if ALL in scopes else []) + list(
+            Category.objects.filter(pk__in=category_ids).values_list('slug', flat=True))
+    for var_name in var_names:
+        try:
+            os.remove(static_feed_path(var_name))
+        except FileNotFoundError:
+            pass
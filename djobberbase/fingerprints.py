@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import unicodedata
+from collections import Counter
+from time import time
+
+from django.db.models import Q
+from django.utils.encoding import force_bytes
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.search.base import tokenize
+
+SIMHASH_BITS = 64
+# Two SimHashes differing in fewer bits than there are bands have at least
+# one band in common, so near-duplicates are looked up by band in an index
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+BAND_FIELDS = tuple('simhash_band_{}'.format(band) for band in range(BANDS))
+SHINGLE_SIZE = 3
+FINGERPRINT_FIELDS = ('title_hash', 'simhash') + BAND_FIELDS
+
+# Words reposts add to or drop from their titles
+TITLE_STOPWORDS = frozenset(('a', 'an', 'and', 'at', 'for', 'hiring', 'immediate', 'immediately', 'in', 'job',
+                             'needed', 'new', 'now', 'of', 'or', 'the', 'to', 'urgent', 'urgently', 'wanted'))
+
+# Loaded from the candidates of find_duplicates()
+CANDIDATE_FIELDS = ('pk', 'title', 'slug', 'company', 'place_id', 'is_active', 'title_hash', 'simhash')
+
+
+def normalize_title(title):
+    ''' Returns the distinct words of a title, without accents nor filler
+        words, in alphabetical order.
+
+        >>> normalize_title('URGENT: Python developer needed!')
+        'developer python'
+    '''
+    title = unicodedata.normalize('NFKD', title or '')
+    title = ''.join(c for c in title if not unicodedata.combining(c))
+    return ' '.join(sorted(set(tokenize(title)) - TITLE_STOPWORDS))
+
+
+def title_hash(title):
+    normalized = normalize_title(title)
+    return hashlib.sha1(force_bytes(normalized)).hexdigest()[:16] if normalized else ''
+
+
+def simhash(text):
+    ''' Returns the SimHash of the shingles of SHINGLE_SIZE words of a text,
+        None when it has no words. Texts sharing most of their shingles get
+        SimHashes differing in a few bits only.
+    '''
+    words = tokenize(text)
+    if not words:
+        return None
+    shingles = Counter(' '.join(words[start:start + SHINGLE_SIZE])
+                       for start in range(max(1, len(words) - SHINGLE_SIZE + 1)))
+    weights = [0] * SIMHASH_BITS
+    for shingle, count in shingles.items():
+        hashed = int.from_bytes(hashlib.md5(force_bytes(shingle)).digest()[:8], 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if hashed >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def to_signed(value):
+    ''' SimHashes are stored in a signed 64 bit column. '''
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def to_unsigned(value):
+    return value + (1 << SIMHASH_BITS) if value < 0 else value
+
+
+def bands(value):
+    return [value >> (BAND_BITS * band) & ((1 << BAND_BITS) - 1) for band in range(BANDS)]
+
+
+def distance(simhash_1, simhash_2):
+    return bin(to_unsigned(simhash_1) ^ to_unsigned(simhash_2)).count('1')
+
+
+def fingerprint_job(job):
+    ''' Fills the title hash, the SimHash of the description and its bands,
+        unless the title and the description did not change since the job
+        was loaded. Returns whether they were filled.
+    '''
+    loaded = getattr(job, '_loaded_values', {})
+    if job.title_hash and loaded.get('title') == job.title and loaded.get('description') == job.description:
+        return False
+    value = simhash(job.description)
+    fingerprint = [title_hash(job.title), None if value is None else to_signed(value)] + \
+        (bands(value) if value is not None else [None] * BANDS)
+    for field, fingerprint_value in zip(FINGERPRINT_FIELDS, fingerprint):
+        setattr(job, field, fingerprint_value)
+    return True
+
+
+def is_near_duplicate(job, other):
+    ''' Whether two jobs have descriptions whose SimHashes differ in
+        DJOBBERBASE_DUPLICATE_DISTANCE bits at most or, for jobs of the same
+        company, the same normalized title. Common titles are shared by the
+        jobs of many companies.
+    '''
+    if job.title_hash and job.title_hash == other.title_hash and job.company_id == other.company_id:
+        return True
+    return job.simhash is not None and other.simhash is not None and \
+        distance(job.simhash, other.simhash) <= min(djobberbase_settings.DJOBBERBASE_DUPLICATE_DISTANCE, BANDS - 1)
+
+
+def fingerprint_lookup(jobs):
+    ''' Returns the Q of the jobs sharing the title hash or a SimHash band of
+        one of the jobs, each answered by an index. None when the jobs have no
+        fingerprint.
+    '''
+    lookup = Q()
+    hashes = set(job.title_hash for job in jobs if job.title_hash)
+    if hashes:
+        lookup |= Q(title_hash__in=hashes)
+    for field in BAND_FIELDS:
+        values = set(getattr(job, field) for job in jobs) - {None}
+        if values:
+            lookup |= Q(**{field + '__in': values})
+    return lookup or None
+
+
+def near_duplicates(job, queryset=None):
+    ''' Returns the jobs of the queryset that the job nearly duplicates, by
+        default those of its company or place, newest first. Only the jobs
+        older than an existing job are considered, a repost being the newer
+        one.
+    '''
+    from djobberbase.models import Job
+    lookup = fingerprint_lookup([job])
+    if lookup is None:
+        return []
+    if queryset is None:
+        queryset = Job.objects.filter(Q(company_id=job.company_id) | Q(place_id=job.place_id))
+    if job.pk:
+        queryset = queryset.filter(pk__lt=job.pk)
+    return [other for other in queryset.filter(lookup).select_related('company__admin').order_by('-pk')
+            if is_near_duplicate(job, other)]
+
+
+def find_duplicates(jobs, chunk_size=100):
+    ''' Sets duplicate_of of each job to the newest older job of its company
+        or place it nearly duplicates, reading the candidates of chunk_size
+        jobs with one query. The candidates are loaded with CANDIDATE_FIELDS.
+    '''
+    from djobberbase.models import Job
+    for start in range(0, len(jobs), chunk_size):
+        chunk = jobs[start:start + chunk_size]
+        lookup = fingerprint_lookup(chunk)
+        candidates = [] if lookup is None else list(
+            Job.objects.filter(Q(company_id__in=set(job.company_id for job in chunk)) |
+                               Q(place_id__in=set(job.place_id for job in chunk)))
+            .filter(lookup).select_related('company__admin').only(*CANDIDATE_FIELDS).order_by('-pk'))
+        for job in chunk:
+            job.duplicate_of = next((candidate for candidate in candidates
+                                     if (candidate.company_id == job.company_id or candidate.place_id == job.place_id)
+                                     and (job.pk is None or candidate.pk < job.pk)
+                                     and is_near_duplicate(job, candidate)), None)
+
+
+def fingerprint_jobs(queryset=None, chunk_size=500, force=False):
+    ''' Fingerprints the jobs without a fingerprint, or all of them with
+        force, walking them by primary key. Each chunk is stored with one
+        query, then the near-duplicates of its jobs among the older ones are
+        stored with another. Returns the number of fingerprinted jobs and the
+        time it took.
+    '''
+    from djobberbase.helpers import bulk_update
+    from djobberbase.models import Job
+    queryset = Job.objects.all() if queryset is None else queryset
+    if not force:
+        queryset = queryset.filter(title_hash='')
+    start = time()
+    fingerprinted = 0
+    last = 0
+    while True:
+        jobs = list(queryset.filter(pk__gt=last).order_by('pk').only(
+            'pk', 'title', 'description', 'company_id', 'place_id', *FINGERPRINT_FIELDS)[:chunk_size])
+        if not jobs:
+            break
+        last = jobs[-1].pk
+        for job in jobs:
+            job.title_hash = ''
+            fingerprint_job(job)
+        bulk_update(Job.objects.all(), [[job.pk] + [getattr(job, field) for field in FINGERPRINT_FIELDS]
+                                        for job in jobs], FINGERPRINT_FIELDS, chunk_size)
+        find_duplicates(jobs)
+        bulk_update(Job.objects.all(), [(job.pk, job.duplicate_of_id) for job in jobs], ('duplicate_of',), chunk_size)
+        fingerprinted += len(jobs)
+    return fingerprinted, time() - start
@@ -1,98 +1,101 @@
-# -*- coding: utf-8 -*-
-
-from django import forms
-from djobberbase.models import Job, Category, Type, JobStat
-from django.utils.safestring import mark_safe
-from djobberbase.conf import settings as djobberbase_settings
-from django.utils.translation import ugettext_lazy as _
-from datetime import datetime, timedelta
-
-try:
-    from django.utils.encoding import force_unicode
-except:
-    from django.utils.encoding import force_text as force_unicode
-
-class HorizRadioRenderer(forms.RadioSelect.renderer):
-    """ this overrides widget method to put radio buttons horizontally
-        instead of vertically.
-    """
-    def render(self):
-        """Outputs radios"""
-        return mark_safe(u'\n'.join([u'%s\n' % w for w in self]))
-
-class JobForm(forms.ModelForm):
-    class Meta:
-        model = Job
-        fields = ('category', 'jobtype', 'title', 'description', 'company', 'place', 'url')
-        widgets = {
-            'jobtype': forms.RadioSelect(renderer=HorizRadioRenderer),
-            'title': forms.TextInput(attrs={'size':50}),
-            'description': forms.Textarea(attrs={'rows':15, 'cols':80}),
-            'place': forms.Select(attrs={'id':'city_id'}),
-            'submitter': forms.TextInput(attrs={'size':40}),
-            'url': forms.TextInput(attrs={'size':31}),
-            'poster_email': forms.TextInput(attrs={'size':70}),
-        }
-
-    def __init__(self, *args, **kwargs):
-        super(JobForm, self).__init__(*args, **kwargs)
-        self.fields['jobtype'].empty_label = None
-        self.fields['category'].empty_label = None
-        try:               
-            self.fields['category'].initial = Category.objects.all()[0].id
-        except IndexError:
-            pass
-        try:
-            self.fields['jobtype'].initial = Type.objects.all()[0].id
-        except IndexError:
-            pass
-
-class CaptchaJobForm(JobForm):
-    if djobberbase_settings.DJOBBERBASE_CAPTCHA_POST == "simple":
-        from captcha.fields import CaptchaField
-        captcha = CaptchaField()
-    else:
-        pass
-
-class ApplicationForm(forms.Form):
-    def __init__(self, *args, **kwargs):
-        self.applicant_data = kwargs.pop('applicant_data')
-        super(ApplicationForm, self).__init__(*args, **kwargs)
-    apply_name = forms.CharField(max_length=50, widget=forms.TextInput(attrs={'id':'apply_name', 'size':30}))
-    apply_email = forms.EmailField(max_length=50, widget=forms.TextInput(attrs={'id':'apply_email', 'size':30}))
-    apply_msg = forms.CharField(widget=forms.Textarea(attrs={'rows':15, 'cols':60, 'id':'apply_msg'}))
-    apply_cv = forms.FileField(required=False)
-
-    if djobberbase_settings.DJOBBERBASE_CAPTCHA_APPLICATION == "simple":
-        from captcha.fields import CaptchaField
-        captcha = CaptchaField()     
-
-    def clean(self):
-        cleaned_data = self.cleaned_data
-        ip = self.applicant_data['ip']
-        mb = self.applicant_data['mb']
-        previous_applications = JobStat.objects.filter(created_on__range=mb, ip=ip, stat_type='A')
-        m = previous_applications.count()
-        if m > 0:
-            #Getting how many minutes until user can apply again
-            d1 = previous_applications.latest('created_on').created_on + timedelta(minutes=djobberbase_settings.DJOBBERBASE_MINUTES_BETWEEN)
-            d2 = datetime.now()
-            remaining = d1 - d2
-            remaining = remaining.seconds / 60
-            raise forms.ValidationError(_('You need to wait %(remaining)s more minute(s) before you can apply for a job again.') % {'remaining': remaining+1})
-
-        if cleaned_data['apply_cv']:
-            #checking if cv extension is permitted
-            extension = cleaned_data['apply_cv'].name.lower().split('.')[-1]
-            if extension not in djobberbase_settings.DJOBBERBASE_CV_EXTENSIONS:
-                raise forms.ValidationError(_('Your resume/CV has an invalid extension.'))
-            #checking cv size does not exceed the permitted one
-            permitted_size = djobberbase_settings.DJOBBERBASE_MAX_UPLOAD_SIZE
-            if cleaned_data['apply_cv']._size > permitted_size:
-                raise forms.ValidationError(_('Your resume/CV must not exceed the file size limit. (%(size)sMB)') % {'size': (permitted_size/1024)/1024})
-
-        return cleaned_data          
-
-class SearchForm(forms.Form):
-    keywords = forms.CharField(widget=forms.TextInput(attrs={'placeholder': _('What kind of job?'), 'class': 'form-control input-lg'}))
+# -*- coding: utf-8 -*-
+
+import math
+
+from django import forms
+from djobberbase.models import Job, Category, Type
+from django.utils.safestring import mark_safe
+from djobberbase.conf import settings as djobberbase_settings
+from django.utils.translation import ugettext_lazy as _
+from djobberbase.ratelimit import APPLY, rate_limiter
+
+try:
+    from django.utils.encoding import force_unicode
+except:
+    from django.utils.encoding import force_text as force_unicode
+
+class HorizRadioRenderer(forms.RadioSelect.renderer):
+    """ this overrides widget method to put radio buttons horizontally
+        instead of vertically.
+    """
+    def render(self):
+        """Outputs radios"""
+        return mark_safe(u'\n'.join([u'%s\n' % w for w in self]))
+
+class JobForm(forms.ModelForm):
+    class Meta:
+        model = Job
+        fields = ('category', 'jobtype', 'title', 'description', 'company', 'place', 'url')
+        widgets = {
+            'jobtype': forms.RadioSelect(renderer=HorizRadioRenderer),
+            'title': forms.TextInput(attrs={'size':50}),
+            'description': forms.Textarea(attrs={'rows':15, 'cols':80}),
+            'place': forms.Select(attrs={'id':'city_id'}),
+            'submitter': forms.TextInput(attrs={'size':40}),
+            'url': forms.TextInput(attrs={'size':31}),
+            'poster_email': forms.TextInput(attrs={'size':70}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super(JobForm, self).__init__(*args, **kwargs)
+        self.fields['jobtype'].empty_label = None
+        self.fields['category'].empty_label = None
+        try:               
+            self.fields['category'].initial = Category.objects.all()[0].id
+        except IndexError:
+            pass
+        try:
+            self.fields['jobtype'].initial = Type.objects.all()[0].id
+        except IndexError:
+            pass
+
+class CaptchaJobForm(JobForm):
+    if djobberbase_settings.DJOBBERBASE_CAPTCHA_POST == "simple":
+        from captcha.fields import CaptchaField
+        captcha = CaptchaField()
+    else:
+        pass
+
+class ApplicationForm(forms.Form):
+    def __init__(self, *args, **kwargs):
+        self.applicant_data = kwargs.pop('applicant_data')
+        super(ApplicationForm, self).__init__(*args, **kwargs)
+    apply_name = forms.CharField(max_length=50, widget=forms.TextInput(attrs={'id':'apply_name', 'size':30}))
+    apply_email = forms.EmailField(max_length=50, widget=forms.TextInput(attrs={'id':'apply_email', 'size':30}))
+    apply_msg = forms.CharField(widget=forms.Textarea(attrs={'rows':15, 'cols':60, 'id':'apply_msg'}))
+    apply_cv = forms.FileField(required=False)
+
+    if djobberbase_settings.DJOBBERBASE_CAPTCHA_APPLICATION == "simple":
+        from captcha.fields import CaptchaField
+        captcha = CaptchaField()     
+
+    def clean(self):
+        cleaned_data = self.cleaned_data
+        self.check_rate_limit(rate_limiter.check(APPLY, self.applicant_data['ip']))
+
+        if self.applicant_data.get('cv_error'):
+            # Rejected by the CVUploadHandler while it was uploaded
+            raise forms.ValidationError(self.applicant_data['cv_error'])
+        if cleaned_data['apply_cv']:
+            #checking if cv extension is permitted
+            extension = cleaned_data['apply_cv'].name.lower().split('.')[-1]
+            if extension not in djobberbase_settings.DJOBBERBASE_CV_EXTENSIONS:
+                raise forms.ValidationError(_('Your resume/CV has an invalid extension.'))
+            #checking cv size does not exceed the permitted one
+            permitted_size = djobberbase_settings.DJOBBERBASE_MAX_UPLOAD_SIZE
+            if cleaned_data['apply_cv'].size > permitted_size:
+                raise forms.ValidationError(_('Your resume/CV must not exceed the file size limit. (%(size)sMB)') % {'size': (permitted_size/1024)/1024})
+
+        if not self.errors:
+            # Counted once the application is valid, so that concurrent ones cannot both pass the check
+            self.check_rate_limit(rate_limiter.hit(APPLY, self.applicant_data['ip']))
+        return cleaned_data
+
+    def check_rate_limit(self, retry_after):
+        if retry_after:
+            remaining = int(math.ceil(retry_after / 60.0))
+            raise forms.ValidationError(_('You need to wait %(remaining)s more minute(s) before you can apply for a job again.') % {'remaining': remaining})          
+
+class SearchForm(forms.Form):
+    keywords = forms.CharField(widget=forms.TextInput(attrs={'placeholder': _('What kind of job?'), 'class': 'form-control input-lg'}))
     place = forms.CharField(required=False, widget=forms.TextInput(attrs={'placeholder': _('Where?'), "class": 'form-control input-lg'}))
\ No newline at end of file
@@ -1,77 +1,105 @@
-# -*- coding: utf-8 -*-
-
-import re
-import os
-from datetime import datetime, timedelta
-
-from django.db.models import Q
-
-from djobberbase.conf import settings as djobberbase_settings
-
-def normalize_query(query_string,
-                    findterms=re.compile(r'"([^"]+)"|(\S+)').findall,
-                    normspace=re.compile(r'\s{2,}').sub):
-    ''' Splits the query string in invidual keywords, getting rid of unecessary spaces
-        and grouping quoted words together.
-        Example:
-        
-        >>> normalize_query('  some random  words "with   quotes  " and   spaces')
-        ['some', 'random', 'words', 'with quotes', 'and', 'spaces']
-    
-    '''
-    return [normspace(' ', (t[0] or t[1]).strip()) for t in findterms(query_string)] 
-
-
-def get_query(query_string, search_fields):
-    ''' Returns a query, that is a combination of Q objects. That combination
-        aims to search keywords within a model by testing the given search fields.
-        It has been slightly modified from the original to support related fields.    
-    '''    
-    query = None # Query to search for every search term        
-    terms = normalize_query(query_string)
-    for term in terms:
-        or_query = None # Query to search for a given term in each field
-        for field_name in search_fields:
-            if field_name == 'category' or field_name == 'jobtype' or field_name == 'company':
-                q = Q(**{"%s__name" % field_name: term})
-            else:
-                q = Q(**{"%s__icontains" % field_name: term})
-            if or_query is None:
-                or_query = q
-            else:
-                or_query = or_query | q
-        if query is None:
-            query = or_query
-        else:
-            query = query & or_query
-    return query
-
-
-def handle_uploaded_file(f, name):
-    file_uploads = djobberbase_settings.DJOBBERBASE_FILE_UPLOADS
-    with open(file_uploads + name, 'wb+') as destination:
-        for chunk in f.chunks():
-            destination.write(chunk)
-
-
-def delete_uploaded_file(name):
-    os.remove(name)
-
-
-def minutes_between():
-    end = datetime.now()
-    start = end - timedelta(minutes=djobberbase_settings.DJOBBERBASE_MINUTES_BETWEEN)
-    return (start, end)
-
-
-def last_hour():
-    start = datetime.now() - timedelta(hours=1)
-    end = datetime.now()
-    return (start, end)
-
-
-def getIP(request):
-    ip = request.META['REMOTE_ADDR']
-    if (not ip or ip == '127.0.0.1'):
-        ip = request.META.get('HTTP_X_FORWARDED_FOR', '')
-    return ip
+# -*- coding: utf-8 -*-
+
+import re
+import os
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+
+from djobberbase.conf import settings as djobberbase_settings
+
+def normalize_query(query_string,
+                    findterms=re.compile(r'"([^"]+)"|(\S+)').findall,
+                    normspace=re.compile(r'\s{2,}').sub):
+    ''' Splits the query string in invidual keywords, getting rid of unecessary spaces
+        and grouping quoted words together.
+        Example:
+        
+        >>> normalize_query('  some random  words "with   quotes  " and   spaces')
+        ['some', 'random', 'words', 'with quotes', 'and', 'spaces']
+    
+    '''
+    return [normspace(' ', (t[0] or t[1]).strip()) for t in findterms(query_string)] 
+
+
+def get_query(query_string, search_fields):
+    ''' Returns a query, that is a combination of Q objects. That combination
+        aims to search keywords within a model by testing the given search fields.
+        It has been slightly modified from the original to support related fields.    
+    '''    
+    query = None # Query to search for every search term        
+    terms = normalize_query(query_string)
+    for term in terms:
+        or_query = None # Query to search for a given term in each field
+        for field_name in search_fields:
+            if field_name == 'category' or field_name == 'jobtype' or field_name == 'company':
+                q = Q(**{"%s__name" % field_name: term})
+            else:
+                q = Q(**{"%s__icontains" % field_name: term})
+            if or_query is None:
+                or_query = q
+            else:
+                or_query = or_query | q
+        if query is None:
+            query = or_query
+        else:
+            query = query & or_query
+    return query
+
+
+def bulk_update(queryset, rows, fields, batch_size=500):
+    ''' Sets the given fields of many rows with one UPDATE per batch. rows
+        are (pk, value of each field) tuples.
+    '''
+    rows = list(rows)
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        queryset.filter(pk__in=[row[0] for row in batch]).update(**dict(
+            (field, Case(*[When(pk=row[0], then=Value(row[n])) for row in batch],
+                         output_field=queryset.model._meta.get_field(field)))
+            for n, field in enumerate(fields, 1)))
+    return len(rows)
+
+
+def database_datetime(value):
+    ''' Returns the datetime as the database takes it: aware with USE_TZ,
+        naive otherwise, in the default time zone when it has none.
+    '''
+    if settings.USE_TZ and timezone.is_naive(value):
+        return timezone.make_aware(value, is_dst=False)
+    if not settings.USE_TZ and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+def handle_uploaded_file(f, name):
+    file_uploads = djobberbase_settings.DJOBBERBASE_FILE_UPLOADS
+    with open(file_uploads + name, 'wb+') as destination:
+        for chunk in f.chunks():
+            destination.write(chunk)
+
+
+def delete_uploaded_file(name):
+    os.remove(name)
+
+
+def minutes_between():
+    end = datetime.now()
+    start = end - timedelta(minutes=djobberbase_settings.DJOBBERBASE_MINUTES_BETWEEN)
+    return (start, end)
+
+
+def last_hour():
+    start = datetime.now() - timedelta(hours=1)
+    end = datetime.now()
+    return (start, end)
+
+
+def getIP(request):
+    ip = request.META['REMOTE_ADDR']
+    if (not ip or ip == '127.0.0.1'):
+        # The client comes first in a list of proxies
+        ip = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip()
+    return ip
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import math
+
+from django.utils.encoding import force_bytes
+
+
+class HyperLogLog:
+    ''' Estimates the number of distinct values added to it in 2 ** precision
+        bytes, with a standard error of 1.04 / sqrt(2 ** precision). Sketches
+        of the same precision merge into the sketch of the union of their
+        values, so sketches of several processes or days can be combined.
+    '''
+
+    def __init__(self, precision=11, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError('A sketch of precision {} has {} registers.'.format(precision, self.size))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        return cls(len(data).bit_length() - 1, data)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    def add(self, value):
+        ''' Adds a value and returns whether the sketch changed. '''
+        hashed = int.from_bytes(hashlib.sha1(force_bytes(value)).digest()[:8], 'big')
+        bits = 64 - self.precision
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of precisions {} and {}.'.format(self.precision, other.precision))
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        raw = alpha * self.size * self.size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * self.size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return int(round(self.size * math.log(self.size / zeros)))
+        return int(round(raw))
+
+    def __len__(self):
+        return self.estimate()
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+from collections import Counter, defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase import search
+from djobberbase.cache import job_dependencies, result_cache
+from djobberbase.counters import job_state, update_job_counts
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.export import CSV, JSONL
+from djobberbase.fingerprints import FINGERPRINT_FIELDS, find_duplicates, fingerprint_job
+from djobberbase.helpers import bulk_update, database_datetime
+from djobberbase.markup import render_job
+from djobberbase.models import Category, Company, Job, JobScore, Place, Type
+from djobberbase.slugs import slug_base
+from djobberbase.trees import trees
+
+FORMATS = (JSONL, CSV)
+BATCH_SIZE = 500
+MAX_ERRORS = 100
+
+# The columns of an export a posting is read from, the others are ignored
+REQUIRED_COLUMNS = ('title', 'description', 'category', 'jobtype', 'place', 'company')
+OPTIONAL_COLUMNS = ('external_url', 'salary_range_min', 'salary_range_max', 'valid_until')
+
+# Read from the existing jobs the postings of a batch may duplicate
+EXISTING_FIELDS = ('pk', 'company_id', 'slug', 'place_id', 'category_id', 'jobtype_id', 'is_active', 'title',
+                   'description', 'description_html', 'description_hash', 'url', 'salary_range_min',
+                   'salary_range_max', 'valid_until', 'duplicate_of_id')
+COMPARED_FIELDS = ('title', 'description', 'category_id', 'jobtype_id', 'url', 'salary_range_min', 'salary_range_max',
+                   'valid_until')
+UPDATED_FIELDS = ('title', 'description', 'description_html', 'description_hash', 'category', 'jobtype', 'url',
+                  'salary_range_min', 'salary_range_max', 'valid_until', 'modified_on',
+                  'duplicate_of') + FINGERPRINT_FIELDS
+
+
+def text(value):
+    return '' if value is None else str(value).strip()
+
+
+def read_rows(f, file_format):
+    ''' Yields the line number and the posting of every line of a file, read
+        as a stream. The posting of a JSON line that cannot be decoded is None.
+    '''
+    if file_format == CSV:
+        reader = csv.DictReader(f)
+        missing = set(REQUIRED_COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError('Missing columns: {}.'.format(', '.join(sorted(missing))))
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == JSONL:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+    else:
+        raise ValueError('Unknown import format {}.'.format(file_format))
+
+
+class TreeResolver:
+    ''' Resolves the full names of categories or places, as exported, to
+        their ids. The candidates of a batch of names are read with one query
+        on their last part and checked against the tree snapshot. A name may
+        leave out the first ancestors as long as it still matches a single
+        node. Places can also be given by their external id.
+    '''
+
+    def __init__(self, model, by_external_id=False):
+        self.model = model
+        self.by_external_id = by_external_id
+        self.separator = model.name_separator.strip()
+        self.ids = {}
+
+    def resolve(self, names):
+        names = set(names) - set(self.ids)
+        if not names:
+            return
+        if self.by_external_id:
+            self.ids.update(self.model.objects.filter(external_id__in=names).values_list('external_id', 'pk'))
+            names -= set(self.ids)
+        parts = dict((name, [part.strip() for part in name.split(self.separator)]) for name in names)
+        candidates = defaultdict(list)
+        for pk, name in self.model.objects.filter(name__in=set(p[-1] for p in parts.values())).values_list('pk', 'name'):
+            candidates[name].append(pk)
+        tree = trees.get(self.model)
+        if not all(pk in tree for pks in candidates.values() for pk in pks):
+            # A node created by another process since the last version check
+            tree = trees.get(self.model, reload=True)
+        for name, name_parts in parts.items():
+            matches = [(pk, tree.names_of(pk)) for pk in candidates[name_parts[-1]] if pk in tree]
+            matches = [(pk, names) for pk, names in matches if names[-len(name_parts):] == name_parts]
+            exact = [pk for pk, names in matches if len(names) == len(name_parts)]
+            matches = exact or [pk for pk, names in matches]
+            self.ids[name] = matches[0] if len(matches) == 1 else None
+
+
+class JobImporter:
+    ''' Imports postings, as read by read_rows(), batch after batch. The
+        categories, job types, places and companies of a batch are resolved
+        and its duplicates found with a few set-based queries, then it is
+        written with bulk queries in a single transaction, keeping the job
+        counters, the scores, the search index and the cached job lists in
+        sync like Job.save() does.
+
+        A posting duplicates an active job of the same company and place with
+        the same slug, as Job.clean() sees it, or with that slug numbered.
+        Duplicates are skipped, or update the job with update set. Postings
+        repeated within the import are skipped.
+    '''
+
+    def __init__(self, batch_size=BATCH_SIZE, update=False, is_active=True, max_errors=MAX_ERRORS):
+        self.batch_size = batch_size
+        self.update = update
+        self.is_active = is_active
+        self.max_errors = max_errors
+        self.stats = Counter()
+        self.errors = []
+        self.categories = TreeResolver(Category)
+        self.places = TreeResolver(Place, by_external_id=True)
+        self.types = {}
+        for pk, name, slug in Type.objects.values_list('pk', 'name', 'slug'):
+            self.types.setdefault(slug, pk)
+            self.types[name] = pk
+        self.companies = {}
+        self.slug_length = Job._meta.get_field('slug').max_length
+        # (company id, place id, slug) of the imported postings and (company id, slug) of the new jobs
+        self.postings = set()
+        self.slugs = set()
+
+    def import_rows(self, rows):
+        ''' Imports (line number, posting) pairs and returns the stats. '''
+        batch = []
+        for line, row in rows:
+            self.stats['rows'] += 1
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.stats
+
+    def import_batch(self, batch):
+        postings = [(line, row) for line, row in batch if self.check(line, row)]
+        self.resolve([row for line, row in postings])
+        jobs = [job for job in (self.build(line, row) for line, row in postings) if job is not None]
+        created, updated = self.deduplicate(jobs)
+        created, updated = self.near_duplicates(created, updated)
+        rendered = {}
+        for job in created + [job for job, previous in updated]:
+            # Descriptions repeated within the batch are rendered once
+            if job.description in rendered:
+                job.description_html, job.description_hash = rendered[job.description]
+            render_job(job)
+            rendered[job.description] = (job.description_html, job.description_hash)
+        self.write(created, updated)
+
+    def error(self, line, message):
+        self.stats['invalid'] += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, message))
+        return False
+
+    def check(self, line, row):
+        if not isinstance(row, dict):
+            return self.error(line, _('Not a JSON object.'))
+        missing = [column for column in REQUIRED_COLUMNS if not text(row.get(column))]
+        if missing:
+            return self.error(line, _('Missing {}.').format(', '.join(missing)))
+        return True
+
+    def resolve(self, rows):
+        self.categories.resolve(text(row['category']) for row in rows)
+        self.places.resolve(text(row['place']) for row in rows)
+        usernames = set(text(row['company']) for row in rows) - set(self.companies)
+        if usernames:
+            self.companies.update(dict.fromkeys(usernames))
+            self.companies.update(Company.objects.filter(admin__username__in=usernames).values_list(
+                'admin__username', 'pk'))
+
+    def build(self, line, row):
+        ''' Returns the job of a posting, or None when it is invalid. '''
+        values = dict((column, text(row.get(column))) for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS)
+        job = Job(title=values['title'], description=values['description'],
+                  category_id=self.categories.ids.get(values['category']), jobtype_id=self.types.get(values['jobtype']),
+                  place_id=self.places.ids.get(values['place']), company_id=self.companies.get(values['company']),
+                  url=values['external_url'], salary_range_min=values['salary_range_min'] or None,
+                  salary_range_max=values['salary_range_max'] or None, is_active=self.is_active)
+        errors = ['{}: {}'.format(field, _('Unknown or ambiguous value "{}".').format(values[field]))
+                  for field in ('category', 'jobtype', 'place', 'company')
+                  if getattr(job, Job._meta.get_field(field).attname) is None]
+        if values['valid_until']:
+            job.valid_until = parse_datetime(values['valid_until'])
+            if job.valid_until is None:
+                errors.append('valid_until: {}'.format(_('Invalid date.')))
+            else:
+                job.valid_until = database_datetime(job.valid_until)
+            if job.valid_until and job.valid_until < timezone.now():
+                errors.append('valid_until: {}'.format(_('Job posting end date is in the past. ')))
+        try:
+            job.clean_fields(exclude=('category', 'jobtype', 'place', 'company', 'slug', 'valid_until'))
+        except ValidationError as e:
+            errors.extend('{}: {}'.format(field, ' '.join(messages)) for field, messages in sorted(e.message_dict.items()))
+        if errors:
+            self.error(line, ' '.join(errors))
+            return None
+        job.fill_salary_range()
+        job.slug = slug_base(job.get_slug(job.title) or Job._meta.model_name, self.slug_length)
+        return job
+
+    def deduplicate(self, jobs):
+        ''' Splits the jobs into new ones and (job, existing values) pairs of
+            the ones to update, with a query for the whole batch and another
+            one for the numbered slugs when some are taken.
+        '''
+        existing = {}
+        if jobs:
+            for values in Job.objects.filter(company_id__in=set(job.company_id for job in jobs),
+                                             slug__in=set(job.slug for job in jobs)).values(*EXISTING_FIELDS):
+                existing[(values['company_id'], values['slug'])] = values
+        numbered, suffixes = self.numbered_slugs([job for job in jobs if (job.company_id, job.slug) in existing or
+                                                  (job.company_id, job.slug) in self.slugs])
+        created, updated = [], []
+        for job in jobs:
+            posting = (job.company_id, job.place_id, job.slug)
+            if posting in self.postings:
+                self.stats['repeated'] += 1
+                continue
+            self.postings.add(posting)
+            key = (job.company_id, job.slug)
+            previous = existing.get(key)
+            if previous and not (previous['is_active'] and previous['place_id'] == job.place_id):
+                previous = numbered.get((job.company_id, job.place_id, job.slug))
+            if previous:
+                if not self.update:
+                    self.stats['duplicates'] += 1
+                elif all(getattr(job, field) == previous[field] for field in COMPARED_FIELDS):
+                    self.stats['unchanged'] += 1
+                else:
+                    job.pk, job.slug, job.is_active = previous['pk'], previous['slug'], previous['is_active']
+                    job.description_html, job.description_hash = previous['description_html'], previous['description_hash']
+                    updated.append((job, previous))
+                continue
+            if key in existing or key in self.slugs:
+                job.slug = self.free_slug(job.company_id, job.slug, suffixes)
+            self.slugs.add((job.company_id, job.slug))
+            created.append(job)
+        return created, updated
+
+    def near_duplicates(self, created, updated):
+        ''' Fingerprints the jobs and finds their near-duplicates in a few
+            queries. With DJOBBERBASE_REJECT_NEAR_DUPLICATES the new jobs
+            nearly duplicating an active job of the same company and place are
+            duplicates too, as in Job.clean().
+        '''
+        for job in created + [job for job, previous in updated]:
+            fingerprint_job(job)
+        find_duplicates(created + [job for job, previous in updated])
+        if not djobberbase_settings.DJOBBERBASE_REJECT_NEAR_DUPLICATES:
+            return created, updated
+        duplicates = [job for job in created if job.duplicate_of and job.duplicate_of.is_active and
+                      (job.duplicate_of.company_id, job.duplicate_of.place_id) == (job.company_id, job.place_id)]
+        if not duplicates:
+            return created, updated
+        # New jobs have no primary key to be hashed by
+        created = [job for job in created if not any(job is duplicate for duplicate in duplicates)]
+        if not self.update:
+            self.stats['duplicates'] += len(duplicates)
+            return created, updated
+        existing = dict((values['pk'], values) for values in Job.objects.filter(
+            pk__in=set(job.duplicate_of.pk for job in duplicates)).values(*EXISTING_FIELDS))
+        for job in duplicates:
+            previous = existing[job.duplicate_of.pk]
+            self.slugs.discard((job.company_id, job.slug))
+            if all(getattr(job, field) == previous[field] for field in COMPARED_FIELDS):
+                self.stats['unchanged'] += 1
+                continue
+            job.pk, job.slug, job.is_active = previous['pk'], previous['slug'], previous['is_active']
+            job.description_html, job.description_hash = previous['description_html'], previous['description_hash']
+            # The job keeps the older job it duplicates, if any
+            job.duplicate_of_id = previous['duplicate_of_id']
+            updated.append((job, previous))
+        return created, updated
+
+    def numbered_slugs(self, jobs):
+        ''' Looks up the jobs of the companies whose slug is the slug of one of
+            the jobs with a number, with one query for all of them. Returns the
+            oldest active ones of the same place, the duplicates whose slug got
+            a number because the plain one was taken, by (company id, place id,
+            slug), and the highest number taken by (company id, slug).
+        '''
+        numbered, suffixes = {}, {}
+        if not jobs:
+            return numbered, suffixes
+        keys = set((job.company_id, job.place_id, job.slug) for job in jobs)
+        lookup = Q()
+        for slug in set(job.slug for job in jobs):
+            lookup |= Q(slug__startswith=slug + '-')
+        for values in Job.objects.filter(lookup, company_id__in=set(job.company_id for job in jobs)).order_by(
+                '-pk').values(*EXISTING_FIELDS):
+            base, suffix = values['slug'].rsplit('-', 1)
+            if not suffix.isdigit():
+                continue
+            suffixes[(values['company_id'], base)] = max(int(suffix), suffixes.get((values['company_id'], base), 1))
+            if values['is_active'] and (values['company_id'], values['place_id'], base) in keys:
+                numbered[(values['company_id'], values['place_id'], base)] = values
+        return numbered, suffixes
+
+    def free_slug(self, company_id, base, suffixes):
+        ''' The next slug free in the database and in the batch, after the
+            highest number taken in the database like next_free_slug().
+        '''
+        suffix = suffixes.get((company_id, base), 1) + 1
+        slug = '{}-{}'.format(base, suffix)
+        while (company_id, slug) in self.slugs:
+            suffix += 1
+            slug = '{}-{}'.format(base, suffix)
+        return slug
+
+    def write(self, created, updated):
+        if not created and not updated:
+            return
+        now = timezone.now()
+        with transaction.atomic():
+            Job.objects.bulk_create(created)
+            if any(job.pk is None for job in created):
+                # Only some databases return the ids of bulk inserts
+                pks = dict(((company_id, slug), pk) for pk, company_id, slug in Job.objects.filter(
+                    company_id__in=set(job.company_id for job in created),
+                    slug__in=set(job.slug for job in created)).values_list('pk', 'company_id', 'slug'))
+                for job in created:
+                    job.pk = pks[(job.company_id, job.slug)]
+            JobScore.objects.bulk_create([JobScore(job_id=job.pk, category_id=job.category_id, is_active=job.is_active)
+                                          for job in created])
+            for job, previous in updated:
+                job.modified_on = now
+            attnames = [Job._meta.get_field(field).attname for field in UPDATED_FIELDS]
+            bulk_update(Job.objects.all(), [[job.pk] + [getattr(job, attname) for attname in attnames]
+                                            for job, previous in updated], UPDATED_FIELDS, self.batch_size)
+            bulk_update(JobScore.objects.all(), [(job.pk, job.category_id) for job, previous in updated
+                                                 if job.category_id != previous['category_id']], ('category',))
+            update_job_counts([(None, job_state(job.__dict__)) for job in created] +
+                              [(job_state(previous), job_state(job.__dict__)) for job, previous in updated])
+        for job, previous in updated:
+            job._loaded_values = previous
+        jobs = created + [job for job, previous in updated]
+        dependencies = job_dependencies(*jobs)
+        transaction.on_commit(lambda: search.index_jobs(jobs))
+        transaction.on_commit(lambda: result_cache.invalidate(dependencies))
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(updated)
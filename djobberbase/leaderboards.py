@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import math
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.models import JobScore, JobStat
+
+MOST_APPLIED = 'applications'
+TRENDING = 'trending'
+BOARDS = (MOST_APPLIED, TRENDING)
+
+# Jobs are read with the relations their listings show
+JOB_RELATED = ('job__category', 'job__jobtype', 'job__place', 'job__company')
+
+
+def decay_rate():
+    return math.log(2) / (djobberbase_settings.DJOBBERBASE_TRENDING_HALF_LIFE * 3600)
+
+
+def log_add(a, b):
+    ''' Returns log(exp(a) + exp(b)) without overflowing. '''
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def event_score(stat_type, created_on):
+    ''' The trending score of a stat as a logarithm, log(weight) plus the decay
+        rate times its timestamp. Scores of older stats are smaller by the
+        decay they had since, so the stored sums never need to be decayed and
+        compare as they are.
+    '''
+    weight = djobberbase_settings.DJOBBERBASE_TRENDING_WEIGHTS.get(stat_type)
+    if weight:
+        return math.log(weight) + decay_rate() * created_on.timestamp()
+
+
+def record_stats(events):
+    ''' Adds (job id, stat type, created on) stats to the leaderboards, with
+        one update per job.
+    '''
+    applications = Counter()
+    scores = defaultdict(list)
+    for job_id, stat_type, created_on in events:
+        if stat_type == JobStat.APPLICATION:
+            applications[job_id] += 1
+        score = event_score(stat_type, created_on)
+        if score is not None:
+            scores[job_id].append(score)
+    job_ids = set(applications) | set(scores)
+    if not job_ids:
+        return
+    with transaction.atomic():
+        current = dict(JobScore.objects.select_for_update().filter(job_id__in=job_ids).values_list('job_id', 'trending'))
+        for job_id in current:
+            values = {}
+            if applications[job_id]:
+                values['applications'] = F('applications') + applications[job_id]
+            if scores[job_id]:
+                trending = current[job_id]
+                for score in scores[job_id]:
+                    trending = log_add(trending, score)
+                values['trending'] = trending
+            JobScore.objects.filter(job_id=job_id).update(**values)
+
+
+def top_jobs(board, num, category=None):
+    ''' Returns the num first active jobs of a leaderboard, overall or of a
+        category, in a single query.
+    '''
+    scores = JobScore.objects.filter(is_active=True)
+    if category is not None:
+        scores = scores.filter(category=category)
+    if board == MOST_APPLIED:
+        scores = scores.filter(applications__gt=0)
+    scores = scores.select_related(*JOB_RELATED).order_by('-' + board, '-job_id')
+    return [score.job for score in scores[:num]]
+
+
+def rebuild():
+    ''' Recomputes the scores of all the jobs from their stats and returns
+        the number of jobs.
+    '''
+    from djobberbase.stats import count_stats
+    from djobberbase.models import Job, JobStatDaily
+    with transaction.atomic():
+        JobScore.objects.all().delete()
+        applications = count_stats(JobStat.APPLICATION)
+        trending = {}
+        for job_id, stat_type, created_on in JobStat.objects.values_list('job_id', 'stat_type', 'created_on').iterator():
+            score = event_score(stat_type, created_on)
+            if score is not None:
+                trending[job_id] = log_add(trending[job_id], score) if job_id in trending else score
+        # Compacted stats count as happening at noon
+        for job_id, stat_type, day, count in JobStatDaily.objects.values_list('job_id', 'stat_type', 'day', 'count'):
+            score = event_score(stat_type, datetime(day.year, day.month, day.day, 12, tzinfo=timezone.utc))
+            if score is not None:
+                score += math.log(count)
+                trending[job_id] = log_add(trending[job_id], score) if job_id in trending else score
+        JobScore.objects.bulk_create(
+            JobScore(job_id=job_id, category_id=category_id, is_active=is_active,
+                     applications=applications[job_id], trending=trending.get(job_id, 0.0))
+            for job_id, category_id, is_active in Job.objects.values_list('pk', 'category_id', 'is_active'))
+    return JobScore.objects.count()
@@ -1,2 +1,2 @@
-#!/usr/bin/env python
+#!/usr/bin/env python
 #-*- coding: utf-8 -*-
\ No newline at end of file
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+import random
+import string
+import tracemalloc
+from time import time
+
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.autocomplete import PrefixIndex, PLACE, KEYWORD, autocomplete
+from djobberbase.conf import settings as djobberbase_settings
+
+
+class Command(BaseCommand):
+    help = _('Measures the memory use and lookup latency of the search autocomplete.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', dest='entries', type=int, default=100000,
+                            help=_('Number of synthetic places and keywords.'))
+        parser.add_argument('--lookups', dest='lookups', type=int, default=10000)
+        parser.add_argument('--database', dest='database', action='store_true', default=False,
+                            help=_('Benchmark the autocomplete built from the database instead.'))
+        parser.add_argument('--seed', dest='seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        tracemalloc.start()
+        start = time()
+        if options['database']:
+            prefix_index = autocomplete.build()
+        else:
+            prefix_index = PrefixIndex(max(options['entries'], djobberbase_settings.DJOBBERBASE_AUTOCOMPLETE_MAX_ENTRIES))
+            prefix_index.load(self.entries(rng, options['entries']))
+        build = time() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(_('{} entries, {} rows: built in {:.2f}s using {:.1f}MB.').format(
+            len(prefix_index), len(prefix_index.rows), build, memory / 1024.0 / 1024.0))
+
+        labels = [data[0] for data in prefix_index.items.values()] or ['']
+        prefixes = [self.prefix(rng, rng.choice(labels)) for i in range(options['lookups'])]
+        timings = []
+        for prefix in prefixes:
+            start = time()
+            prefix_index.lookup(prefix)
+            timings.append(time() - start)
+        timings.sort()
+        percentile = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))] * 1000
+        self.stdout.write(_('{} lookups: p50 {:.3f}ms, p95 {:.3f}ms, p99 {:.3f}ms, max {:.3f}ms.').format(
+            len(timings), percentile(0.5), percentile(0.95), percentile(0.99), timings[-1] * 1000))
+
+    def word(self, rng):
+        return ''.join(rng.choice(string.ascii_lowercase) for i in range(rng.randint(3, 10))).capitalize()
+
+    def entries(self, rng, count):
+        for n in range(count):
+            if n % 10:
+                name = self.word(rng)
+                full_name = ', '.join([self.word(rng) for i in range(rng.randint(1, 4))] + [name])
+                yield PLACE, n, full_name, name, rng.randint(0, 100)
+            else:
+                keywords = ' '.join(self.word(rng).lower() for i in range(rng.randint(1, 3)))
+                yield KEYWORD, keywords, keywords, keywords, rng.randint(1, 1000)
+
+    def prefix(self, rng, label):
+        word = rng.choice(label.replace(',', ' ').split() or [''])
+        return word[:rng.randint(1, max(1, len(word)))]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+import random
+import resource
+import string
+from datetime import timedelta
+from time import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.export import CONTENT_TYPES, FIELDS, job_rows, serialize
+
+
+class Command(BaseCommand):
+    help = _('Measures the throughput and memory use of the job export.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', dest='rows', type=int, default=1000000,
+                            help=_('Number of synthetic jobs.'))
+        parser.add_argument('--database', dest='database', action='store_true', default=False,
+                            help=_('Export the jobs of the database instead.'))
+        parser.add_argument('--seed', dest='seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        for export_format in sorted(CONTENT_TYPES):
+            rng = random.Random(options['seed'])
+            rows = job_rows() if options['database'] else self.rows(rng, options['rows'])
+            start = time()
+            count = size = 0
+            for line in serialize(rows, export_format):
+                count += 1
+                size += len(line)
+            elapsed = time() - start
+            # The peak resident size of the process, in kilobytes on Linux
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.stdout.write(_('{}: {} lines, {:.1f}MB in {:.2f}s, {:.0f} rows/s, {:.1f}MB peak memory.').format(
+                export_format, count, size / 1024.0 / 1024.0, elapsed, count / elapsed if elapsed else 0,
+                peak / 1024.0))
+
+    def word(self, rng):
+        return ''.join(rng.choice(string.ascii_lowercase) for i in range(rng.randint(3, 10)))
+
+    def rows(self, rng, count, samples=1000):
+        ''' Yields count jobs cycling through a few random ones, so that
+            generating them does not weigh on the measure.
+        '''
+        now = timezone.now()
+        titles, descriptions = [], []
+        for i in range(min(samples, count)):
+            titles.append(' '.join(self.word(rng) for j in range(3)).capitalize())
+            descriptions.append(' '.join(self.word(rng) for j in range(rng.randint(50, 150))))
+        created_on, modified_on = (now - timedelta(days=1)).isoformat(), now.isoformat()
+        for pk in range(1, count + 1):
+            title = titles[pk % len(titles)]
+            yield dict(zip(FIELDS, (
+                pk, title, '/job/tyrell/{}~{}/'.format(title.lower().replace(' ', '-'), pk),
+                descriptions[pk % len(descriptions)], 'Engineering > Genetics', 'Full time',
+                'Los Angeles, California', 'tyrell', 1000 + pk % 4000, None, '', created_on, modified_on, None,
+                True)))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from time import time
+
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.models import Company, Job
+from djobberbase.postman import MailRenderer
+
+TEMPLATES = ('publish_to_admin', 'publish_pending_to_user', 'publish_to_user')
+
+
+class Command(BaseCommand):
+    help = _('Measures how many notification emails are rendered per second, one by one and in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', dest='messages', type=int, default=2000,
+                            help=_('Number of emails rendered per template.'))
+
+    def handle(self, *args, **options):
+        jobs = list(self.jobs(options['messages']))
+        renderer = MailRenderer()
+        for name in TEMPLATES:
+            start = time()
+            for job in jobs:
+                # What rendering an email took before: loading both templates for every message
+                context = dict(renderer.job_context(job, Site.objects.get_current().domain), site_name='')
+                render_to_string('djobberbase/emails/{}.txt'.format(name), context)
+                render_to_string('djobberbase/emails/{}.html'.format(name), context)
+            single = time() - start
+            start = time()
+            renderer.render_batch(name, jobs)
+            batch = time() - start
+            self.stdout.write(_('{}: {:.0f} messages/s one by one, {:.0f} messages/s in a batch.').format(
+                name, len(jobs) / single, len(jobs) / batch))
+
+    def jobs(self, count):
+        company = Company(admin=User(username='tyrell', email='tyrell@example.com'), logo='tyrell.png')
+        for pk in range(1, count + 1):
+            yield Job(pk=pk, title='Replicant designer {}'.format(pk), slug='replicant-designer-{}'.format(pk),
+                      description='Nexus 6 ' * 50, company=company, created_on=timezone.now())
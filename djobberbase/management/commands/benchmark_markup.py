@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+import os
+import random
+import string
+from concurrent.futures import ProcessPoolExecutor
+from time import time
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.markup import markup_hash, render_chunk, render_markup
+
+
+class Command(BaseCommand):
+    help = _('Compares rendering job descriptions serially, in worker processes, and skipping unchanged ones, '
+             'and displaying them with the nofollow filter or as stored.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--descriptions', dest='descriptions', type=int, default=5000,
+                            help=_('Number of synthetic descriptions.'))
+        parser.add_argument('--language', dest='language', default='markdown', choices=('markdown', 'textile'))
+        parser.add_argument('--workers', dest='workers', type=int, default=None,
+                            help=_('Number of rendering processes, one per CPU by default.'))
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=500)
+        parser.add_argument('--seed', dest='seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        language = options['language']
+        workers = options['workers'] or os.cpu_count() or 1
+        descriptions = [(n, self.description(rng)) for n in range(options['descriptions'])]
+        chunks = [descriptions[start:start + options['chunk_size']]
+                  for start in range(0, len(descriptions), options['chunk_size'])]
+
+        start = time()
+        rows = [row for chunk in chunks for row in render_chunk(chunk, language)]
+        serial = time() - start
+        self.stdout.write(_('Serial: {} descriptions in {:.2f}s.').format(len(rows), serial))
+
+        start = time()
+        with ProcessPoolExecutor(workers) as executor:
+            parallel_rows = [row for rendered in executor.map(render_chunk, chunks, [language] * len(chunks))
+                             for row in rendered]
+        parallel = time() - start
+        assert parallel_rows == rows
+        self.stdout.write(_('{} workers: {} descriptions in {:.2f}s ({:.1f}x).').format(
+            workers, len(parallel_rows), parallel, serial / parallel if parallel else 0))
+
+        hashes = dict((pk, description_hash) for pk, html, description_hash in rows)
+        start = time()
+        outdated = [(pk, description) for pk, description in descriptions
+                    if hashes[pk] != markup_hash(description, language)]
+        unchanged = time() - start
+        self.stdout.write(_('Unchanged: {} descriptions checked, {} rendered in {:.2f}s ({:.0f}x).').format(
+            len(descriptions), len(outdated), unchanged, serial / unchanged if unchanged else 0))
+
+        # What job_detail.html used to do on every display, and what it does now
+        filtered = Template('{% load djobberbase_tags %}{{ html|safe|nofollow }}')
+        stored = Template('{{ html|safe }}')
+        for label, template, htmls in ((_('Displayed with nofollow'), filtered,
+                                        [render_markup(description, language) for pk, description in descriptions]),
+                                       (_('Displayed as stored'), stored, [html for pk, html, description_hash in rows])):
+            start = time()
+            for html in htmls:
+                template.render(Context({'html': html}))
+            elapsed = time() - start
+            self.stdout.write(_('{}: {:.3f}ms per job.').format(label, elapsed * 1000 / len(htmls)))
+
+    def word(self, rng):
+        return ''.join(rng.choice(string.ascii_lowercase) for i in range(rng.randint(2, 10)))
+
+    def description(self, rng):
+        paragraphs = []
+        for i in range(rng.randint(2, 6)):
+            words = [self.word(rng) for j in range(rng.randint(20, 80))]
+            if rng.random() < 0.3:
+                paragraphs.append('\n'.join('* ' + word for word in words[:8]))
+            else:
+                words[rng.randrange(len(words))] = '*{}*'.format(words[0])
+                paragraphs.append(' '.join(words))
+        return '\n\n'.join(paragraphs)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+import random
+from time import time
+
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.search.base import tokenize
+from djobberbase.search.inverted import InvertedIndex, InvertedIndexBackend
+from djobberbase.search.simple import IcontainsBackend
+
+TITLES = ('developer', 'engineer', 'designer', 'manager', 'analyst', 'administrator',
+          'architect', 'consultant', 'tester', 'writer', 'recruiter', 'scientist')
+SKILLS = ('python', 'django', 'javascript', 'react', 'java', 'scala', 'golang', 'rust',
+          'postgres', 'mysql', 'linux', 'docker', 'kubernetes', 'aws', 'css', 'html',
+          'photoshop', 'figma', 'excel', 'sales', 'marketing', 'support', 'security')
+CATEGORIES = ('Programming', 'Design', 'UI&UX', 'Sysadmin', 'Marketing', 'Management')
+JOBTYPES = ('Full time', 'Part time', 'Freelance')
+# A Zipf distributed vocabulary, so that the corpus has a realistic mix of
+# very common and rare terms.
+VOCABULARY = SKILLS + TITLES + tuple('term{}'.format(n) for n in range(20000))
+CUMULATIVE_WEIGHTS = []
+for rank in range(len(VOCABULARY)):
+    CUMULATIVE_WEIGHTS.append((CUMULATIVE_WEIGHTS[-1] if CUMULATIVE_WEIGHTS else 0) + 1.0 / (rank + 1))
+
+
+class Command(BaseCommand):
+    help = _('Compares the inverted index search with the icontains search.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', dest='sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help=_('Numbers of synthetic jobs to benchmark with.'))
+        parser.add_argument('--queries', dest='queries', type=int, default=50,
+                            help=_('Number of queries run against every corpus.'))
+        parser.add_argument('--database', dest='database', action='store_true', default=False,
+                            help=_('Benchmark both search backends against the jobs in the database instead.'))
+        parser.add_argument('--limit', dest='limit', type=int,
+                            default=djobberbase_settings.DJOBBERBASE_JOBS_PER_SEARCH,
+                            help=_('Number of ranked results fetched per query.'))
+        parser.add_argument('--seed', dest='seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        queries = [self.query(rng) for i in range(options['queries'])]
+        if options['database']:
+            self.benchmark_database(queries, options['limit'])
+        else:
+            for size in options['sizes']:
+                self.benchmark_corpus(rng, size, queries, options['limit'])
+
+    def query(self, rng):
+        terms = [rng.choice(SKILLS + TITLES)]
+        if rng.random() < 0.5:
+            terms.append(rng.choice(VOCABULARY[100:5000]))
+        return ' '.join(terms)
+
+    def document(self, rng):
+        title = '{} {}'.format(rng.choice(SKILLS), rng.choice(TITLES))
+        description = ' '.join(rng.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS, k=rng.randint(20, 120)))
+        return title, description, rng.choice(CATEGORIES), rng.choice(JOBTYPES)
+
+    def benchmark_corpus(self, rng, size, queries, limit):
+        ''' Builds a synthetic corpus in memory. The icontains path is emulated
+            by what the database does for LIKE '%term%': a scan over the
+            lowercased title and description of every job.
+        '''
+        backend = InvertedIndexBackend()
+        documents = [self.document(rng) for i in range(size)]
+
+        start = time()
+        inverted_index = InvertedIndex()
+        for doc_id, document in enumerate(documents):
+            inverted_index.add(doc_id, backend.document(document))
+        build = time() - start
+
+        lowered = [(title.lower(), description.lower(), category, jobtype)
+                   for title, description, category, jobtype in documents]
+        parsed = [[tokenize(term) for term in query.split()] for query in queries]
+
+        start = time()
+        for groups in parsed:
+            inverted_index.search(groups, limit=limit)
+        indexed = (time() - start) / len(queries)
+
+        start = time()
+        for query in queries:
+            terms = query.split()
+            [doc_id for doc_id, (title, description, category, jobtype) in enumerate(lowered)
+             if all(term in title or term in description or term == category or term == jobtype
+                    for term in terms)]
+        scanned = (time() - start) / len(queries)
+
+        self.stdout.write(_('{} jobs: index built in {:.2f}s, {} terms. '
+                            'Inverted index {:.3f}ms/query, icontains scan {:.3f}ms/query ({:.0f}x).').format(
+            size, build, len(inverted_index.postings), indexed * 1000, scanned * 1000,
+            scanned / indexed if indexed else 0))
+
+    def benchmark_database(self, queries, limit):
+        for backend in (IcontainsBackend(), InvertedIndexBackend()):
+            start = time()
+            backend.rebuild()
+            build = time() - start
+            start = time()
+            for query in queries:
+                list(backend.search(query)[:limit])
+            elapsed = (time() - start) / len(queries)
+            self.stdout.write(_('{}: rebuilt in {:.2f}s, {:.3f}ms/query.').format(
+                backend.__class__.__name__, build, elapsed * 1000))
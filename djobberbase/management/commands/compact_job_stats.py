@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from datetime import timedelta
+from time import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.stats import compact_stats
+
+
+class Command(BaseCommand):
+    help = _('Rolls up the job stats older than some days into daily counts and deletes them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', dest='days', type=int, default=djobberbase_settings.DJOBBERBASE_STATS_KEEP_DAYS,
+                            help=_('Number of days of stats kept as they are.'))
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=5000,
+                            help=_('Number of stats compacted per transaction.'))
+
+    def handle(self, *args, **options):
+        start = time()
+        before = timezone.now() - timedelta(days=options['days'])
+        compacted = compact_stats(before, chunk_size=options['chunk_size'])
+        self.stdout.write(_('Compacted {} stats older than {} in {:.2f}s.').format(
+            compacted, before.strftime('%Y-%m-%d %H:%M'), time() - start))
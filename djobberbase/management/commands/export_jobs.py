@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.export import CONTENT_TYPES, JSONL, export_jobs, parse_since
+
+
+class Command(BaseCommand):
+    help = _('Exports the active jobs, or the ones modified since a date, as JSON Lines, CSV or XML.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='format', default=JSONL, choices=sorted(CONTENT_TYPES))
+        parser.add_argument('--since', dest='since', default=None,
+                            help=_('Only export the jobs modified after this ISO 8601 date, deactivated ones included.'))
+        parser.add_argument('--output', dest='output', default=None,
+                            help=_('File to write the export to instead of the standard output.'))
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_since(options['since'])
+            except ValueError:
+                raise CommandError(_('Invalid since date.'))
+        until, lines = export_jobs(options['format'], since)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+        self.stderr.write(_('Export until {}, pass it as --since to the next export.').format(until.isoformat()))
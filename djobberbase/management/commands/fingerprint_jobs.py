@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.fingerprints import fingerprint_jobs
+
+
+class Command(BaseCommand):
+    help = _('Fingerprints the jobs posted before duplicate detection, and finds their near-duplicates.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=500,
+                            help=_('Number of jobs fingerprinted and stored at once.'))
+        parser.add_argument('--force', dest='force', action='store_true', default=False,
+                            help=_('Fingerprint all the jobs and find their near-duplicates again, after a change of '
+                                   'DJOBBERBASE_DUPLICATE_DISTANCE.'))
+
+    def handle(self, *args, **options):
+        fingerprinted, elapsed = fingerprint_jobs(chunk_size=options['chunk_size'], force=options['force'])
+        self.stdout.write(_('{} jobs fingerprinted in {:.2f}s.').format(fingerprinted, elapsed))
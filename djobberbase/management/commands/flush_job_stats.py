@@ -0,0 +1,17 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.stats import stats_buffer
+
+
+class Command(BaseCommand):
+    help = _('Writes the job stats waiting in the shared DJOBBERBASE_STATS_BUFFER cache to the database.')
+
+    def handle(self, *args, **options):
+        depth = stats_buffer.depth()
+        written = stats_buffer.flush()
+        stats = stats_buffer.stats()
+        self.stdout.write(_('{} of {} buffered stats written in {:.3f}s, {} left.').format(
+            written, depth, stats['last_flush_latency'] or 0, stats['depth']))
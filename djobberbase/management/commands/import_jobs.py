@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+import os
+import sys
+from time import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.export import JSONL
+from djobberbase.ingest import BATCH_SIZE, FORMATS, MAX_ERRORS, JobImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = _('Imports job postings from a JSON Lines or CSV file with the columns of an export: title, '
+             'description, category, jobtype, place and company, and optionally external_url, salary_range_min, '
+             'salary_range_max and valid_until. Categories and places are given by their full names, places '
+             'also by their external id, job types by name or slug and companies by the username of their admin.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help=_('The file to import, - for the standard input.'))
+        parser.add_argument('--format', dest='format', default=None, choices=FORMATS,
+                            help=_('Format of the file, guessed from its extension by default.'))
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=BATCH_SIZE,
+                            help=_('Number of postings validated and written to the database at once.'))
+        parser.add_argument('--update', dest='update', action='store_true', default=False,
+                            help=_('Update the active jobs the postings duplicate instead of skipping them.'))
+        parser.add_argument('--inactive', dest='inactive', action='store_true', default=False,
+                            help=_('Import the new jobs deactivated, to be reviewed by a moderator.'))
+        parser.add_argument('--max-errors', dest='max_errors', type=int, default=MAX_ERRORS,
+                            help=_('Number of invalid postings reported.'))
+        parser.add_argument('--encoding', dest='encoding', default='utf-8')
+
+    def handle(self, *args, **options):
+        path = options['file']
+        file_format = options['format'] or os.path.splitext(path)[1][1:].lower()
+        if file_format not in FORMATS:
+            file_format = JSONL
+        self.batch_size = options['batch_size']
+        self.start = time()
+        importer = JobImporter(batch_size=self.batch_size, update=options['update'],
+                               is_active=not options['inactive'], max_errors=options['max_errors'])
+        try:
+            if path == '-':
+                importer.import_rows(self.progress(read_rows(sys.stdin, file_format)))
+            else:
+                with open(path, encoding=options['encoding'], newline='') as f:
+                    importer.import_rows(self.progress(read_rows(f, file_format)))
+        except ValueError as e:
+            raise CommandError(e)
+        for line, message in importer.errors:
+            self.stderr.write(_('Line {}: {}').format(line, message))
+        stats = importer.stats
+        elapsed = time() - self.start
+        self.stdout.write(_('{} rows in {:.1f}s ({:.0f} rows/s): {} created, {} updated, {} unchanged, '
+                            '{} duplicates skipped, {} repeated, {} invalid.').format(
+            stats['rows'], elapsed, stats['rows'] / elapsed if elapsed else 0, stats['created'], stats['updated'],
+            stats['unchanged'], stats['duplicates'], stats['repeated'], stats['invalid']))
+
+    def progress(self, rows):
+        for count, row in enumerate(rows, 1):
+            yield row
+            if count % (self.batch_size * 10) == 0:
+                self.stdout.write(_('{} rows, {:.0f} rows/s.').format(count, count / (time() - self.start)))
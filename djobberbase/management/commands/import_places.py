@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+import csv
+import sys
+from collections import Counter, OrderedDict, defaultdict
+from time import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.template.defaultfilters import slugify
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.autocomplete import autocomplete
+from djobberbase.cache import RELATED, result_cache
+from djobberbase.helpers import bulk_update
+from djobberbase.models import Place
+from djobberbase.slugs import slug_base
+from djobberbase.trees import trees
+
+# GeoNames feature codes, matched by prefix
+FEATURE_CODES = (
+    ('CONT', Place.CONTINENT),
+    ('RGN', Place.REGION),
+    ('PCL', Place.COUNTRY),
+    ('ADM1', Place.STATE),
+    ('ADM', Place.COUNTY),
+    ('PPL', Place.CITY),
+    ('STM', Place.STREET),
+)
+
+
+def place_type(row):
+    ''' Returns the place type of a row, raises ValueError when its place_type
+        is not one.
+    '''
+    if row.get('place_type'):
+        kind = int(row['place_type'])
+        if kind not in dict(Place.PLACE_TYPE_CHOICES):
+            raise ValueError(row['place_type'])
+        return kind
+    code = (row.get('feature_code') or '').upper()
+    for prefix, value in FEATURE_CODES:
+        if code.startswith(prefix):
+            return value
+    return Place.CITY
+
+
+class PlaceTree:
+    ''' The paths, slugs and external ids of all the places, kept in memory so
+        that new places get their path and a unique sibling slug without any
+        query.
+    '''
+
+    def __init__(self):
+        self.steplen = Place.steplen
+        self.by_external_id = {}
+        self.last_step = Counter()
+        self.slugs = set()
+        self.slug_suffixes = Counter()
+        self.new_children = Counter()
+        for pk, path, slug, external_id, name, kind in Place.objects.values_list(
+                'pk', 'path', 'slug', 'external_id', 'name', 'place_type').iterator():
+            parent_path, step = path[:-self.steplen], Place._str2int(path[-self.steplen:])
+            self.last_step[parent_path] = max(self.last_step[parent_path], step)
+            self.slugs.add((parent_path, slug))
+            if external_id:
+                self.by_external_id[external_id] = (pk, path, name, kind)
+
+    def new_path(self, parent_path):
+        self.last_step[parent_path] += 1
+        self.new_children[parent_path] += 1
+        return Place._get_path(parent_path, len(parent_path) // self.steplen + 1, self.last_step[parent_path])
+
+    def new_slug(self, parent_path, name):
+        base = slug_base(slugify(name), Place._meta.get_field('slug').max_length) or 'place'
+        slug = base
+        while (parent_path, slug) in self.slugs:
+            self.slug_suffixes[(parent_path, base)] += 1
+            slug = '{}-{}'.format(base, self.slug_suffixes[(parent_path, base)] + 1)
+        self.slugs.add((parent_path, slug))
+        return slug
+
+
+class Command(BaseCommand):
+    help = _('Imports or updates places from a tab separated file with a header row. The id, name and '
+             'parent_id columns are required, place_type or a GeoNames feature_code column is optional. '
+             'Places are matched to existing ones by their external id.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help=_('The file to import, - for the standard input.'))
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=2000,
+                            help=_('Number of places written to the database at once.'))
+        parser.add_argument('--delimiter', dest='delimiter', default='\t')
+        parser.add_argument('--encoding', dest='encoding', default='utf-8')
+
+    def handle(self, *args, **options):
+        self.chunk_size = options['chunk_size']
+        self.start = time()
+        self.rows = 0
+        self.stats = Counter()
+        self.tree = PlaceTree()
+        self.pending = OrderedDict()
+        self.updates = []
+        # Rows waiting for a parent that has not been read yet
+        self.orphans = defaultdict(list)
+        if options['file'] == '-':
+            self.read(sys.stdin, options['delimiter'])
+        else:
+            with open(options['file'], encoding=options['encoding'], newline='') as f:
+                self.read(f, options['delimiter'])
+        self.flush()
+        self.update_numchild()
+        skipped = sum(len(rows) for rows in self.orphans.values())
+        trees.invalidate(Place)
+        autocomplete.invalidate()
+        result_cache.invalidate([(RELATED, None)])
+        elapsed = time() - self.start
+        self.stdout.write(_('{} rows in {:.1f}s ({:.0f} rows/s): {} created, {} updated, {} unchanged, '
+                            '{} skipped without parent, {} not moved to another parent, {} invalid.').format(
+            self.rows, elapsed, self.rows / elapsed if elapsed else 0, self.stats['created'],
+            self.stats['updated'], self.stats['unchanged'], skipped, self.stats['not moved'], self.stats['invalid']))
+
+    def read(self, f, delimiter):
+        reader = csv.DictReader(f, delimiter=delimiter, quoting=csv.QUOTE_NONE)
+        missing = {'id', 'name', 'parent_id'} - set(reader.fieldnames or ())
+        if missing:
+            raise CommandError(_('Missing columns: {}.').format(', '.join(sorted(missing))))
+        for row in reader:
+            self.rows += 1
+            self.import_row(row)
+            if self.rows % (self.chunk_size * 10) == 0:
+                self.stdout.write(_('{} rows, {:.0f} rows/s.').format(self.rows, self.rows / (time() - self.start)))
+
+    def import_row(self, row):
+        external_id, parent_id = row['id'].strip(), (row['parent_id'] or '').strip()
+        if parent_id and parent_id not in self.tree.by_external_id:
+            self.orphans[parent_id].append(row)
+            return
+        try:
+            kind = place_type(row)
+        except ValueError:
+            self.stats['invalid'] += 1
+            return
+        name = row['name'].strip()[:255]
+        parent_path = self.tree.by_external_id[parent_id][1] if parent_id else ''
+        if external_id in self.tree.by_external_id:
+            pk, path, old_name, old_kind = self.tree.by_external_id[external_id]
+            if path[:-self.tree.steplen] != parent_path:
+                self.stats['not moved'] += 1
+            if (name, kind) == (old_name, old_kind):
+                self.stats['unchanged'] += 1
+            else:
+                if pk is None:
+                    # Repeated in the file, the place is not written yet
+                    self.pending[external_id].name, self.pending[external_id].place_type = name, kind
+                else:
+                    self.updates.append((pk, name, kind))
+                self.tree.by_external_id[external_id] = (pk, path, name, kind)
+                self.stats['updated'] += 1
+        else:
+            path = self.tree.new_path(parent_path)
+            self.pending[external_id] = Place(
+                path=path, parent_path=parent_path, depth=len(path) // self.tree.steplen, numchild=0, name=name,
+                slug=self.tree.new_slug(parent_path, name), place_type=kind, external_id=external_id)
+            self.tree.by_external_id[external_id] = (None, path, name, kind)
+            self.stats['created'] += 1
+        if len(self.pending) + len(self.updates) >= self.chunk_size:
+            self.flush()
+        for orphan in self.orphans.pop(external_id, ()):
+            self.import_row(orphan)
+
+    def flush(self):
+        with transaction.atomic():
+            Place.objects.bulk_create(self.pending.values())
+            bulk_update(Place.objects.all(), self.updates, ('name', 'place_type'))
+        # Later rows repeating the new places update them by primary key
+        external_ids = list(self.pending)
+        for start in range(0, len(external_ids), 500):
+            for external_id, pk in Place.objects.filter(external_id__in=external_ids[start:start + 500]).values_list(
+                    'external_id', 'pk'):
+                self.tree.by_external_id[external_id] = (pk,) + self.tree.by_external_id[external_id][1:]
+        self.pending = OrderedDict()
+        self.updates = []
+
+    def update_numchild(self):
+        by_count = defaultdict(list)
+        for path, count in self.tree.new_children.items():
+            if path:
+                by_count[count].append(path)
+        with transaction.atomic():
+            for count, paths in by_count.items():
+                for start in range(0, len(paths), 500):
+                    Place.objects.filter(path__in=paths[start:start + 500]).update(numchild=F('numchild') + count)
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.autocomplete import autocomplete
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.models import JobSearch
+
+
+class Command(BaseCommand):
+    help = _('Deletes the saved searches older than some days and counts the keywords suggested by the '
+             'autocomplete from the remaining ones.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', dest='days', type=int,
+                            default=djobberbase_settings.DJOBBERBASE_SEARCHES_KEEP_DAYS,
+                            help=_('Number of days of searches kept.'))
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        deleted = JobSearch.objects.filter(created_on__lt=before).delete()[0]
+        keywords = autocomplete.refresh_keywords()
+        self.stdout.write(_('Deleted {} searches older than {}, {} keywords suggested.').format(
+            deleted, before.strftime('%Y-%m-%d %H:%M'), keywords))
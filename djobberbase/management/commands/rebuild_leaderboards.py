@@ -0,0 +1,17 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from time import time
+
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.leaderboards import rebuild
+
+
+class Command(BaseCommand):
+    help = _('Recomputes the most applied and trending scores of all the jobs from their stats.')
+
+    def handle(self, *args, **options):
+        start = time()
+        jobs = rebuild()
+        self.stdout.write(_('Scored {} jobs in {:.2f}s.').format(jobs, time() - start))
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from time import time
+
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.search import get_backend
+
+
+class Command(BaseCommand):
+    help = _('Rebuilds the job search index of the configured search backend.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int,
+                            default=djobberbase_settings.DJOBBERBASE_SEARCH_INDEX_CHUNK_SIZE,
+                            help=_('Number of jobs read from the database at once.'))
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        start = time()
+        indexed = backend.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(_('Indexed {} jobs with {} in {:.2f}s.').format(
+            indexed, backend.__class__.__name__, time() - start))
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.counters import recount
+
+
+class Command(BaseCommand):
+    help = _('Recomputes the active job counters of the categories and places.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', dest='check', action='store_true', default=False,
+                            help=_('Only report the wrong counters and fail if there is any.'))
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            mismatches = recount(fix=not options['check'])
+        for model, pk, stored, actual in mismatches:
+            self.stdout.write(_('{} {}: {} jobs, {} in total instead of {} and {}.').format(
+                model._meta.verbose_name, pk, stored[0], stored[1], actual[0], actual[1]))
+        if options['check'] and mismatches:
+            raise CommandError(_('{} wrong counters.').format(len(mismatches)))
+        self.stdout.write(_('{} counters {}.').format(len(mismatches), _('wrong') if options['check'] else _('fixed')))
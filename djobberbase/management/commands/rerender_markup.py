@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.markup import rerender_jobs
+
+
+class Command(BaseCommand):
+    help = _('Renders again the job descriptions that changed or were rendered with another markup language.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', dest='workers', type=int, default=None,
+                            help=_('Number of rendering processes, one per CPU by default.'))
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=500,
+                            help=_('Number of jobs rendered and stored at once.'))
+        parser.add_argument('--force', dest='force', action='store_true', default=False,
+                            help=_('Render all the jobs, even the up to date ones.'))
+
+    def handle(self, *args, **options):
+        rendered, elapsed = rerender_jobs(workers=options['workers'], chunk_size=options['chunk_size'],
+                                          force=options['force'])
+        self.stdout.write(_('{} jobs rendered as {} in {:.2f}s.').format(
+            rendered, djobberbase_settings.DJOBBERBASE_MARKUP_LANGUAGE or 'HTML', elapsed))
@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.postman import mail_moderation_digest
+
+
+class Command(BaseCommand):
+    help = _('Queues a summary of the jobs posted or edited since the previous run to the moderators. '
+             'Schedule it at the interval the digests should be sent.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to', dest='recipients', action='append',
+                            help=_('Recipient of the digest, instead of DJOBBERBASE_ADMIN_DIGEST_RECIPIENTS.'))
+
+    def handle(self, *args, **options):
+        jobs = mail_moderation_digest(options['recipients'])
+        self.stdout.write(_('{} jobs reported.').format(jobs))
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from time import sleep
+
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.outbox import send_outbox
+
+
+class Command(BaseCommand):
+    help = _('Sends the emails waiting in the outbox over a single connection.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', dest='batch_size', type=int,
+                            default=djobberbase_settings.DJOBBERBASE_OUTBOX_BATCH_SIZE,
+                            help=_('Number of messages claimed at once.'))
+        parser.add_argument('--loop', dest='loop', action='store_true', default=False,
+                            help=_('Keep polling the outbox instead of exiting once it is empty.'))
+        parser.add_argument('--interval', dest='interval', type=float, default=5,
+                            help=_('Seconds between two polls with --loop.'))
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed, elapsed = send_outbox(batch_size=options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(_('{} sent, {} failed in {:.2f}s ({:.0f} messages/s).').format(
+                    sent, failed, elapsed, (sent + failed) / elapsed if elapsed else 0))
+            if not options['loop']:
+                break
+            sleep(options['interval'])
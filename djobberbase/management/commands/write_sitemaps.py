@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+from time import time
+
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.sitemaps import SitemapWriter
+
+
+class Command(BaseCommand):
+    help = _('Writes the gzipped sitemaps of the jobs, categories, places and companies and their index.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', dest='root', default=djobberbase_settings.DJOBBERBASE_SITEMAP_ROOT,
+                            help=_('Directory to write the sitemaps to.'))
+        parser.add_argument('--full', dest='full', action='store_true', default=False,
+                            help=_('Write all the job sitemaps, not only the ones whose jobs changed.'))
+
+    def handle(self, *args, **options):
+        start = time()
+        written, files = SitemapWriter(options['root']).write(full=options['full'])
+        self.stdout.write(_('{} sitemaps in the index, {} job sitemaps written in {:.2f}s.').format(
+            files, len(written), time() - start))
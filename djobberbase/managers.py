@@ -1,13 +1,49 @@
-# -*- coding: utf-8 -*-
-
-from django.db import models
-
-
-class TempJobsManager(models.Manager):
-    def get_query_set(self):
-        return super(TempJobsManager, self).get_query_set().filter(status=self.model.TEMPORARY)
-
-
-class ActiveJobsManager(models.Manager):
-    def get_query_set(self):
-        return super(ActiveJobsManager, self).get_query_set().filter(status=self.model.ACTIVE)
+# -*- coding: utf-8 -*-
+
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class JobQuerySet(models.QuerySet):
+    def change(self, **values):
+        ''' Updates the jobs like update() does, keeping the job counters of
+            their categories and places, the search index and the cached job
+            lists in sync. Returns the number of changed jobs.
+        '''
+        from djobberbase import search
+        from djobberbase.cache import job_dependencies, result_cache
+        from djobberbase.counters import job_state, update_job_counts
+        values.setdefault('modified_on', timezone.now())
+        changes = dict((self.model._meta.get_field(name).attname, getattr(value, 'pk', value))
+                       for name, value in values.items())
+        with transaction.atomic():
+            # Locks the jobs by pk alone: the joins of select_related() or of the
+            # filters may be outer joins, which cannot be locked on PostgreSQL.
+            locked = self.model._default_manager.filter(pk__in=self.order_by().values('pk'))
+            jobs = list(locked.select_for_update())
+            updated = self.update(**values)
+            update_job_counts((job_state(job.__dict__), job_state(dict(job.__dict__, **changes))) for job in jobs)
+            scores = dict((name, changes[name]) for name in ('category_id', 'is_active') if name in changes)
+            if scores:
+                from djobberbase.models import JobScore
+                JobScore.objects.filter(job__in=[job.pk for job in jobs]).update(**scores)
+        for job in jobs:
+            job.__dict__.update(changes)
+            transaction.on_commit(lambda job=job: search.index_job(job))
+        dependencies = job_dependencies(*jobs)
+        transaction.on_commit(lambda: result_cache.invalidate(dependencies))
+        return updated
+
+
+class JobManager(models.Manager.from_queryset(JobQuerySet)):
+    pass
+
+
+class TempJobsManager(models.Manager):
+    def get_query_set(self):
+        return super(TempJobsManager, self).get_query_set().filter(status=self.model.TEMPORARY)
+
+
+class ActiveJobsManager(JobManager):
+    def get_queryset(self):
+        return super(ActiveJobsManager, self).get_queryset().filter(is_active=True)
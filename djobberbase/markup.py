@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+from html.parser import HTMLParser
+from time import time
+
+from django.utils.encoding import force_bytes, force_text, smart_str
+from django.utils.html import linebreaks
+
+from djobberbase.conf import settings as djobberbase_settings
+
+# Bump it whenever the output of render_html changes, the stored descriptions
+# are then rendered again as they are displayed or by rerender_markup
+PIPELINE_VERSION = 1
+
+ALLOWED_TAGS = {
+    'a': ('href', 'title'),
+    'abbr': ('title',), 'acronym': ('title',), 'b': (), 'blockquote': (), 'br': (), 'code': (), 'dd': (),
+    'del': (), 'div': (), 'dl': (), 'dt': (), 'em': (), 'h1': (), 'h2': (), 'h3': (), 'h4': (), 'h5': (),
+    'h6': (), 'hr': (), 'i': (), 'li': (), 'ol': (), 'p': (), 'pre': (), 'span': (), 'strong': (),
+    'sub': (), 'sup': (), 'table': (), 'tbody': (), 'td': ('colspan', 'rowspan'), 'th': ('colspan', 'rowspan'),
+    'thead': (), 'tr': (), 'u': (), 'ul': (),
+}
+VOID_TAGS = ('br', 'hr')
+DROPPED_TAGS = ('script', 'style', 'iframe', 'object', 'embed', 'template') # removed with their content
+LINK_SCHEMES = ('http', 'https', 'mailto', 'ftp')
+
+
+def render_markup(text, language):
+    ''' Returns the HTML of a description written in language, 'textile',
+        'markdown' or None for plain text.
+    '''
+    if language == 'textile':
+        import textile
+        return force_text(textile.textile(smart_str(text)))
+    elif language == 'markdown':
+        import markdown
+        return force_text(markdown.markdown(smart_str(text)))
+    return linebreaks(escape(text))
+
+
+def nofollow(attrs):
+    ''' Asks search engines not to follow the links to other sites. '''
+    if is_external(attrs.get('href', '')):
+        attrs['rel'] = 'nofollow noopener'
+    return attrs
+
+
+def rewrite_link(attrs):
+    ''' Completes the links to www. hosts and opens the links to other sites
+        in a new window.
+    '''
+    href = attrs.get('href', '')
+    if href.lower().startswith('www.'):
+        attrs['href'] = href = 'http://' + href
+    if is_external(href):
+        attrs['target'] = '_blank'
+    return attrs
+
+
+LINK_FILTERS = (nofollow, rewrite_link)
+
+
+def is_external(href):
+    return href.lower().startswith(('http://', 'https://', '//', 'www.'))
+
+
+def is_safe_url(href):
+    scheme = href.split(':', 1)[0].lower() if ':' in href.split('/', 1)[0] else None
+    return scheme is None or scheme in LINK_SCHEMES
+
+
+class HTMLSanitizer(HTMLParser):
+    ''' Keeps the ALLOWED_TAGS with their allowed attributes and the text of
+        the other tags, and drops DROPPED_TAGS with their content, links to
+        unsafe schemes such as javascript: and comments. Unclosed tags are
+        closed and stray closing tags are ignored, so the result can be
+        displayed as it is. The attributes of links go through link_filters.
+    '''
+
+    def __init__(self, link_filters=()):
+        super().__init__(convert_charrefs=True)
+        self.link_filters = link_filters
+        self.output = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        attrs = dict((name, (value or '').strip()) for name, value in attrs if name in ALLOWED_TAGS[tag])
+        if tag == 'a':
+            if 'href' in attrs and not is_safe_url(attrs['href']):
+                del attrs['href']
+            for link_filter in self.link_filters:
+                attrs = link_filter(attrs)
+        self.output.append('<{}{}>'.format(tag, ''.join(
+            ' {}="{}"'.format(name, escape(value)) for name, value in sorted(attrs.items()))))
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(0, self.dropping - 1)
+        if self.dropping or tag not in self.open_tags:
+            return
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.output.append('</{}>'.format(open_tag))
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.output.append(escape(data, quote=False))
+
+    def sanitize(self, html):
+        self.feed(html)
+        self.close()
+        self.output.extend('</{}>'.format(tag) for tag in reversed(self.open_tags))
+        return ''.join(self.output).strip()
+
+
+def sanitize(html, link_filters=()):
+    return HTMLSanitizer(link_filters).sanitize(html)
+
+
+def render_html(text, language):
+    ''' The description HTML pipeline: markup, then sanitizing, nofollow and
+        link rewriting. Its result is stored and displayed without any
+        further filter.
+    '''
+    return sanitize(render_markup(text, language), LINK_FILTERS)
+
+
+def markup_hash(text, language):
+    ''' Identifies a description, the language and the version of the
+        pipeline it is rendered with, so that it is only rendered again when
+        any of them changes.
+    '''
+    return hashlib.sha1(force_bytes('{}\0{}\0{}'.format(PIPELINE_VERSION, language or '', text))).hexdigest()
+
+
+def render_job(job, force=False):
+    ''' Fills description_html unless the hash of the description did not
+        change. Returns whether the description was rendered.
+    '''
+    language = djobberbase_settings.DJOBBERBASE_MARKUP_LANGUAGE
+    description_hash = markup_hash(job.description, language)
+    if not force and job.description_hash == description_hash and job.description_html:
+        return False
+    job.description_html = render_html(job.description, language)
+    job.description_hash = description_hash
+    return True
+
+
+def refresh_job(job):
+    ''' Renders a job loaded with an outdated description_html, after a change
+        of the markup language or pipeline, and stores it without saving the
+        whole job.
+    '''
+    if render_job(job):
+        job.__class__.objects.filter(pk=job.pk).update(description_html=job.description_html,
+                                                       description_hash=job.description_hash)
+
+
+def render_chunk(descriptions, language):
+    ''' Renders (pk, description) pairs into (pk, html, hash) rows. Runs in
+        the worker processes of rerender_jobs.
+    '''
+    return [(pk, render_html(description, language), markup_hash(description, language))
+            for pk, description in descriptions]
+
+
+def outdated_chunks(queryset, language, chunk_size, force=False):
+    ''' Yields the (pk, description) pairs of the jobs to render, chunk_size
+        at a time, walking the jobs by primary key.
+    '''
+    last = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last).order_by('pk').values_list(
+            'pk', 'description', 'description_hash')[:chunk_size])
+        if not rows:
+            break
+        last = rows[-1][0]
+        chunk = [(pk, description) for pk, description, description_hash in rows
+                 if force or description_hash != markup_hash(description, language)]
+        if chunk:
+            yield chunk
+
+
+def rerender_jobs(queryset=None, workers=None, chunk_size=500, force=False):
+    ''' Renders again the descriptions of the jobs whose description or markup
+        language changed, in chunks spread over a pool of worker processes,
+        and stores each chunk with a single query. With one worker the chunks
+        are rendered in this process. Returns the number of rendered jobs and
+        the time it took.
+    '''
+    from djobberbase.helpers import bulk_update
+    from djobberbase.models import Job
+    queryset = Job.objects.all() if queryset is None else queryset
+    language = djobberbase_settings.DJOBBERBASE_MARKUP_LANGUAGE
+    workers = workers or os.cpu_count() or 1
+    chunks = outdated_chunks(queryset, language, chunk_size, force)
+    store = lambda rows: bulk_update(Job.objects.all(), rows, ('description_html', 'description_hash'), chunk_size)
+    start = time()
+    rendered = 0
+    if workers == 1:
+        for chunk in chunks:
+            rendered += store(render_chunk(chunk, language))
+        return rendered, time() - start
+    with ProcessPoolExecutor(workers) as executor:
+        # A few chunks are rendered ahead while the previous ones are stored
+        pending = []
+        for chunk in chunks:
+            pending.append(executor.submit(render_chunk, chunk, language))
+            if len(pending) > workers * 2:
+                rendered += store(pending.pop(0).result())
+        for future in pending:
+            rendered += store(future.result())
+    return rendered, time() - start
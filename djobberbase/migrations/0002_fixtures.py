@@ -1,27 +1,45 @@
-# -*- coding: utf-8 -*-
-# Generated by Django 1.10.2 on 2016-10-05 15:28
-from __future__ import unicode_literals
-
-from django.db import migrations
-import os.path
-
-from django.conf import settings
-from django.core.management import call_command
-from django.core.management.base import CommandError
-
-
-def loaddata(app, schema, fixture_name='initial_data.json'):
-    try:
-        return call_command('loaddata', os.path.join('..', 'fixtures', fixture_name))
-    except CommandError:
-        print('Skipped fixture {}'.format(fixture_name))
-
-class Migration(migrations.Migration):
-
-    dependencies = [
-        ('djobberbase', '0001_initial'),
-    ]
-
-    operations = [
-        migrations.RunPython(loaddata)
-    ]
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.2 on 2016-10-05 15:28
+from __future__ import unicode_literals
+
+from django.core.management.color import no_style
+from django.db import migrations
+import json
+import os.path
+
+
+def loaddata(apps, schema_editor, fixture_name='initial_data.json'):
+    ''' Loads the fixture with the models as they are at this migration,
+        loaddata would use the current ones and fail on any field added later.
+    '''
+    fixture = os.path.join(os.path.dirname(__file__), '..', 'fixtures', fixture_name)
+    try:
+        with open(fixture) as f:
+            objects = json.load(f)
+    except (IOError, ValueError):
+        print('Skipped fixture {}'.format(fixture_name))
+        return
+    models = set()
+    for data in objects:
+        model = apps.get_model(data['model'])
+        fields = {}
+        for name, value in data['fields'].items():
+            field = model._meta.get_field(name)
+            fields[field.attname if field.is_relation else name] = value
+        model(pk=data['pk'], **fields).save()
+        models.add(model)
+    # The primary keys were given explicitly
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(loaddata)
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 17:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0002_fixtures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='salary_range_max',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True, verbose_name='Salary range maximum'),
+        ),
+    ]
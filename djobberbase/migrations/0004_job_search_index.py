@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+
+from django.db import migrations, transaction
+from django.db.utils import DatabaseError
+
+SEARCH_TABLE = 'djobberbase_job_fts'
+
+logger = logging.getLogger(__name__)
+
+CREATE_SQL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE {} USING fts5(title, description, category, jobtype, place, "
+        "tokenize = 'unicode61')".format(SEARCH_TABLE),
+    ],
+    'postgresql': [
+        "CREATE TABLE {0} (job_id integer PRIMARY KEY REFERENCES djobberbase_job (id) "
+        "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)".format(SEARCH_TABLE),
+        "CREATE INDEX {0}_document ON {0} USING gin (document)".format(SEARCH_TABLE),
+    ],
+}
+
+
+def create_search_index(apps, schema_editor):
+    ''' Creates the full text index table for the database in use. SQLite
+        builds without FTS5 and other databases are skipped, the search then
+        falls back to icontains lookups.
+    '''
+    statements = CREATE_SQL.get(schema_editor.connection.vendor)
+    if not statements:
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            for statement in statements:
+                schema_editor.execute(statement)
+    except DatabaseError:
+        logger.warning('Skipped full text search index, it is not supported by this database.')
+
+
+def drop_search_index(apps, schema_editor):
+    if SEARCH_TABLE in schema_editor.connection.introspection.table_names():
+        schema_editor.execute('DROP TABLE {}'.format(SEARCH_TABLE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0003_job_salary_range_max'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
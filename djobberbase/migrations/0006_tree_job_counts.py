@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 17:50
+from __future__ import unicode_literals
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_jobs(apps, schema_editor):
+    Job = apps.get_model('djobberbase', 'Job')
+    for model_name, field in (('Category', 'category'), ('Place', 'place')):
+        model = apps.get_model('djobberbase', model_name)
+        direct = dict(Job.objects.filter(is_active=True).values_list(field).annotate(models.Count('pk')).order_by())
+        nodes = list(model.objects.values_list('pk', 'path'))
+        totals = Counter()
+        for pk, path in nodes:
+            for end in range(4, len(path) + 1, 4):
+                totals[path[:end]] += direct.get(pk, 0)
+        for pk, path in nodes:
+            if totals[path]:
+                model.objects.filter(pk=pk).update(job_count=direct.get(pk, 0), total_job_count=totals[path])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0005_job_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='job_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Active jobs'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='total_job_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Active jobs with subcategories'),
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='job_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Active jobs'),
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='total_job_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Active jobs with places within'),
+        ),
+        migrations.RunPython(count_jobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 17:53
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0006_tree_job_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='external_id',
+            field=models.CharField(blank=True, help_text='The id of the place in the data it was imported from.', max_length=64, null=True, unique=True, verbose_name='External id'),
+        ),
+    ]
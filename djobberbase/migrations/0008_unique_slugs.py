@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 18:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models.functions import Length, Substr
+
+
+def deduplicate(model, scope_field):
+    ''' Renames the slugs that are not unique within their scope to slug-2,
+        slug-3 and so on, oldest object first.
+    '''
+    taken = set(model.objects.values_list(scope_field, 'slug'))
+    seen = set()
+    for pk, scope, slug in model.objects.order_by('pk').values_list('pk', scope_field, 'slug').iterator():
+        if (scope, slug) not in seen and slug:
+            seen.add((scope, slug))
+            continue
+        base, suffix = (slug or model._meta.model_name)[:44], 2
+        while (scope, '{}-{}'.format(base, suffix)) in taken:
+            suffix += 1
+        new_slug = '{}-{}'.format(base, suffix)
+        taken.add((scope, new_slug))
+        seen.add((scope, new_slug))
+        model.objects.filter(pk=pk).update(slug=new_slug)
+
+
+def unique_slugs(apps, schema_editor):
+    Place = apps.get_model('djobberbase', 'Place')
+    Place.objects.update(parent_path=Substr('path', 1, Length('path') - 4))
+    deduplicate(Place, 'parent_path')
+    deduplicate(apps.get_model('djobberbase', 'Job'), 'company_id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0007_place_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='parent_path',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Parent path'),
+        ),
+        migrations.RunPython(unique_slugs, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='job',
+            unique_together=set([('company', 'slug')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='place',
+            unique_together=set([('parent_path', 'slug')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 18:05
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0008_unique_slugs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobstat',
+            name='ip',
+            field=models.GenericIPAddressField(blank=True, null=True, verbose_name='IP address'),
+        ),
+        migrations.AlterField(
+            model_name='jobstat',
+            name='created_on',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='jobstat',
+            name='submitter',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 18:06
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0009_job_stat_ip'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobStatDaily',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stat_type', models.CharField(choices=[('A', 'Application'), ('H', 'Hit'), ('S', 'Spam')], max_length=1)),
+                ('day', models.DateField(verbose_name='Day')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Count')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='djobberbase.Job')),
+            ],
+            options={
+                'verbose_name': 'Daily Job Stat',
+                'verbose_name_plural': 'Daily Job Stats',
+            },
+        ),
+        migrations.AlterField(
+            model_name='jobstat',
+            name='created_on',
+            field=models.DateTimeField(blank=True, db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterUniqueTogether(
+            name='jobstatdaily',
+            unique_together=set([('job', 'stat_type', 'day')]),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 18:07
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_scores(apps, schema_editor):
+    ''' Every job gets its scores row, the rebuild_leaderboards command
+        computes the scores from the existing stats.
+    '''
+    Job = apps.get_model('djobberbase', 'Job')
+    JobScore = apps.get_model('djobberbase', 'JobScore')
+    JobScore.objects.bulk_create(
+        JobScore(job_id=job_id, category_id=category_id, is_active=is_active)
+        for job_id, category_id, is_active in Job.objects.values_list('pk', 'category_id', 'is_active').iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0010_job_stat_daily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobScore',
+            fields=[
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='djobberbase.Job')),
+                ('is_active', models.BooleanField(default=True)),
+                ('applications', models.PositiveIntegerField(default=0, verbose_name='Applications')),
+                ('trending', models.FloatField(default=0.0, verbose_name='Trending score')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='djobberbase.Category')),
+            ],
+            options={
+                'verbose_name': 'Job Score',
+                'verbose_name_plural': 'Job Scores',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='jobscore',
+            index_together=set([('is_active', 'applications'), ('is_active', 'trending'), ('category', 'is_active', 'trending'), ('category', 'is_active', 'applications')]),
+        ),
+        migrations.RunPython(create_scores, migrations.RunPython.noop),
+    ]
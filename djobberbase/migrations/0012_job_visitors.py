@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 18:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0011_job_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobVisitors',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Day')),
+                ('sketch', models.BinaryField(verbose_name='Sketch')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visitor_sketches', to='djobberbase.Job')),
+            ],
+            options={
+                'verbose_name': 'Job Visitors',
+                'verbose_name_plural': 'Job Visitors',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='jobvisitors',
+            unique_together=set([('job', 'day')]),
+        ),
+    ]
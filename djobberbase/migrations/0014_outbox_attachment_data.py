@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 18:16
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0013_outbox_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='attachment_data',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Attachment data'),
+        ),
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='attachment_name',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Attachment name'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 18:17
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0014_outbox_attachment_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created on')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moderation_events', to='djobberbase.Job')),
+            ],
+            options={
+                'verbose_name': 'Moderation event',
+                'verbose_name_plural': 'Moderation events',
+                'ordering': ['id'],
+            },
+        ),
+    ]
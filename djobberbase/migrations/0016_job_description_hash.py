@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 18:19
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0015_moderation_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='description_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the description and markup language description_html was rendered from.', max_length=40, verbose_name='Description hash'),
+        ),
+    ]
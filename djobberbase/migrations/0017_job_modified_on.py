@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 18:26
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_on(apps, schema_editor):
+    apps.get_model('djobberbase', 'Job').objects.update(modified_on=F('created_on'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0016_job_description_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='modified_on',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Modified on'),
+        ),
+        migrations.RunPython(copy_created_on, migrations.RunPython.noop),
+    ]
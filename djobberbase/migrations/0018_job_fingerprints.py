@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 18:41
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0017_job_modified_on'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, help_text='The newest older job of the same company or place this one nearly duplicates, when it was posted or edited.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='near_duplicates', to='djobberbase.Job', verbose_name='Near duplicate of'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='simhash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Description SimHash'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='simhash_band_0',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='simhash_band_1',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='simhash_band_2',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='simhash_band_3',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='title_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Hash of the normalized title.', max_length=16, verbose_name='Title hash'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-17 19:09
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djobberbase', '0018_job_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='jobsearch',
+            name='created_on',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Created on'),
+        ),
+    ]
@@ -1,368 +1,578 @@
-# -*- coding: utf-8 -*-
-
-from django.db import models
-from django.template.defaultfilters import slugify
-from django.core.exceptions import ValidationError
-from django.utils.safestring import mark_safe
-from django.utils.encoding import smart_str
-from django.utils.translation import ugettext_lazy as _
-from django.utils import timezone
-from django.utils.encoding import force_text
-from django.urls import reverse
-from django.conf import settings
-from django.utils.functional import cached_property
-
-from treebeard.mp_tree import MP_Node
-from djobberbase.managers import ActiveJobsManager, TempJobsManager
-from djobberbase.conf import settings as djobberbase_settings
-
-
-class SlugMixin(models.Model):
-    slug_field = ''
-
-    slug = models.SlugField(blank=True, db_index=True)
-
-    def get_slug(self, field):
-        return slugify(field)
-
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            slug = self.get_slug(getattr(self, self.slug_field))
-            setattr(self, self.slug_field, slug)
-        super().save(self, *args, **kwargs)
-
-    class Meta:
-        abstract = True
-
-class TreeNodeMixin:
-    name_separator = ' > '
-    path_separator = '/'
-
-    @property
-    def job_count(self):
-        return self.jobs.count()
-
-    @property
-    def total_job_count(self):
-        return sum(node.job_count for node in self.get_ancestors_and_self())
-
-    @cached_property
-    def full_name(self):
-        return self.name_separator.join(str(node) for node in self.get_ancestors_and_self())
-
-    @cached_property
-    def reversed_full_name(self):
-        return self.name_separator.join(str(node) for node in self.get_self_and_ancestors())
-
-    @cached_property
-    def full_path(self):
-        return self.path_separator.join(node.slug for node in self.get_ancestors_and_self())
-
-
-    def get_self_and_descendants(self):
-        yield self
-        for node in reversed(self.get_ancestors()):
-            yield node
-
-
-    def get_self_and_ancestors(self):
-        yield self
-        for node in reversed(self.get_ancestors()):
-            yield node
-
-
-    def get_ancestors_and_self(self):
-        for node in self.get_ancestors():
-            yield node
-        yield self
-
-    def get_descendants_and_self(self):
-        for node in self.get_descendants():
-            yield node
-        yield self
-
-
-class Category(SlugMixin, MP_Node, TreeNodeMixin):
-    ''' The Category model, very straight forward. Includes a total_jobs
-        method that returns the total of jobs with that category.
-        The save() method is overriden so it can automatically asign
-        a category order in case no one is provided.
-    '''
-    slug_field = 'name'
-
-    name = models.CharField(_('Name'), unique=True, max_length=255)
-    description = models.TextField(_('Description'), blank=True, null=True)
-    category_order = models.PositiveIntegerField(_('Category order'), unique=True, blank=True, null=True)
-
-    class Meta:
-        verbose_name = _('Category')
-        verbose_name_plural = _('Categories')
-        ordering = ['category_order']
-
-    def __str__(self):
-        return self.name
-
-    def get_absolute_url(self):
-        return reverse('djobberbase:category', kwargs={'slug': self.slug})
-
-    def save(self, *args, **kwargs):
-        if not self.category_order:
-            try:
-                self.category_order = Category.objects.\
-                                    latest('category_order').category_order + 1
-            except Category.DoesNotExist:
-                self.category_order = 0
-        super(Category, self).save(*args, **kwargs)
-
-
-class Type(SlugMixin, models.Model):
-    ''' The Type model, nothing special, just the name and
-        var_name fields. Again, the var_name is slugified by the overriden
-        save() method in case it's not provided.
-    '''
-    slug_field = 'name'
-
-    name = models.CharField(_('Name'), unique=True, max_length=255)
-
-    class Meta:
-        verbose_name = _('Job type')
-        verbose_name_plural = _('Job types')
-
-    def get_absolute_url(self):
-        return reverse('djobberbase_type', kwargs={'type': self.slug})
-
-    def __str__(self):
-        return self.name
-
-
-class Place(SlugMixin, MP_Node, TreeNodeMixin):
-    ''' Place can be a country, state, county, place, street... and they can be nested.
-    '''
-    CONTINENT = 0   #Europe
-    REGION = 1      #Central Europe
-    COUNTRY = 2     #Germany
-    STATE = 3       #Bavaria
-    COUNTY = 4      #Oberpfalz
-    CITY = 5        #Regensburg
-    STREET = 6      #Silberne-Fisch-Gasse
-    PLACE_TYPE_CHOICES = (
-        (CONTINENT, _('Continent')),
-        (REGION, _('Region')),
-        (COUNTRY, _('Country')),
-        (STATE, _('State')),
-        (COUNTY, _('County')),
-        (CITY, _('City')),
-        (STREET, _('Street')),
-    )
-
-    slug_field = 'name'
-    name_separator = ', '
-
-    name = models.CharField(_('Name'), max_length=255)
-    place_type = models.IntegerField(_('Place Type'), choices=PLACE_TYPE_CHOICES, default=CITY)
-
-
-    def get_absolute_url(self):
-        return reverse('djobberbase:category', kwargs={'categories': self.full_name, 'pk': self.pk})
-
-    class Meta:
-        verbose_name = _('Place')
-        verbose_name_plural = _('Places')
-        ordering = ['place_type']
-
-    def __str__(self):
-        return self.name
-
-
-    #TODO does not work. It seems the ancestors are created after saving, so we cannot check them like this
-    def clean(self):
-        if self.place_type:
-            ancestor = self.get_ancestors().filter(place_type__lte=self.place_type).aggregate(models.Max('place_type'))['place_type__max']
-            if ancestor:
-                possible_place_types = (place_type[1] for place_type in
-                                        self.PLACE_TYPE_CHOICES[self.PLACE_TYPE_CHOICES.index(ancestor+1):])
-                raise ValidationError(_('Place cannot be of this type. It needs to be one of: ')+str(possible_place_types))
-
-
-    def save(self, *args, **kwargs):
-        check_slug = not bool(self.slug)
-        super(Place, self).save(*args, **kwargs)
-        if check_slug:
-            self.ensure_slug_uniqueness()
-
-
-    def ensure_slug_uniqueness(self):
-        """
-        Ensures that the category's slug is unique amongst it's siblings.
-        This is inefficient and probably not thread-safe.
-        """
-        self.slug = slugify(self.name)
-        unique_slug = self.slug
-        siblings = self.get_siblings().exclude(pk=self.pk)
-        next_num = 2
-        while siblings.filter(slug=unique_slug).exists():
-            unique_slug = '{slug}-{end}'.format(slug=self.slug, end=next_num)
-            next_num += 1
-
-        if unique_slug != self.slug:
-            self.slug = unique_slug
-            self.save()
-
-
-class Company(models.Model):
-    admin = models.OneToOneField(settings.AUTH_USER_MODEL, primary_key=True, verbose_name=_('Company admin'), on_delete=models.CASCADE)
-    logo = models.ImageField(verbose_name=_('Company logo'), upload_to='logos')
-
-    def get_absolute_url(self):
-        return reverse('djobberbase:company_jobs', kwargs={'company': str(self.admin)})
-
-    class Meta:
-        verbose_name_plural = _('Companies')
-        verbose_name = _('Company')
-
-    def __str__(self):
-        return str(self.admin)
-
-
-class Job(SlugMixin, models.Model):
-    ''' The basic job model.
-    '''
-    slug_field = 'title'
-
-    category = models.ForeignKey(Category, verbose_name=_('Category'), on_delete=models.CASCADE, related_name='jobs')
-    jobtype = models.ForeignKey(Type, verbose_name=_('Job Type'), on_delete=models.CASCADE, related_name='jobs')
-    place = models.ForeignKey(Place, verbose_name=_('Place'), on_delete=models.CASCADE, related_name='jobs')
-    company = models.ForeignKey(Company, verbose_name=_('Company'), on_delete=models.CASCADE, related_name="jobs")
-
-    title = models.CharField(verbose_name=_('Title'), max_length=255)
-    salary_range_min = models.PositiveIntegerField(verbose_name=_('Salary range minimum'), blank=True, null=True, db_index=True)
-    description = models.TextField(_('Description'))
-    description_html = models.TextField(_('Description in HTML'), blank=True)
-    url = models.URLField(_('External job URL'), blank=True, null=True)
-
-
-
-    created_on = models.DateTimeField(_('Created on'), blank=True, auto_now_add=True)
-    valid_until = models.DateTimeField(_('Valid until'), blank=True, null=True)
-    is_active = models.BooleanField(_('Created on'), default=True, db_index=True, help_text=_('You can hide the posting from others by unchecking this option.'))
-    spotlight = models.BooleanField(_('Spotlight'), default=False, blank=True, db_index=True)
-
-    objects = models.Manager()
-    active = ActiveJobsManager()
-    temporary = TempJobsManager()
-
-    class Meta:
-        verbose_name = _('Job')
-        verbose_name_plural = _('Jobs')
-
-
-    def __str__(self):
-        return self.title
-
-    @property
-    def application_count(self):
-        return self.stats.filter(stat_type=JobStat.APPLICATION).count()
-
-    def switch_activate(self):
-        self.is_active = not self.is_active
-        self.save()
-
-
-    def get_absolute_url(self):
-        return ('djobberbase:job_detail', [self.user.name, self.title_slug])
-
-    @property
-    def activation_url(self):
-        return ('djobberbase_job_activate', [self.id])
-
-    @property
-    def deactivation_url(self):
-        return ('djobberbase_job_deactivate', [self.id])
-
-    def clean(self):
-        if self.valid_until:
-            if self.valid_until < timezone.now():
-                raise ValidationError(_("Job posting end date is in the past. "))
-
-        slug = self.slug or self.get_slug(self.title)
-        similar = self.__class__.active.filter(place=self.place, company=self.company, slug=slug)
-        if similar:
-            url = similar.get_absolute_url()
-            raise ValidationError(_('Similar active job posting from your company already exists. You need to change the title of your posting or deactivate the original one. The original is available over here: ')+url)
-
-    def save(self, *args, **kwargs):
-        if self.salary_range_min:
-            if not self.salary_range_max:
-                self.salary_range_max = self.salary_range_min
-        else:
-            if self.salary_range_max:
-                self.salary_range_min = self.salary_range_max
-
-        if djobberbase_settings.DJOBBERBASE_MARKUP_LANGUAGE == 'textile':
-            import textile
-            self.description_html = mark_safe(
-                                        force_text(
-                                            textile.textile(
-                                                smart_str(self.description))))
-        #or markdown
-        elif djobberbase_settings.DJOBBERBASE_MARKUP_LANGUAGE == 'markdown':
-            import markdown
-            self.description_html = mark_safe(
-                                        force_text(
-                                            markdown.markdown(
-                                                smart_str(self.description))))
-        else:
-            self.description_html = self.description
-
-        if djobberbase_settings.DJOBBERBASE_ENABLE_NEW_POST_MODERATION and self.is_active is None:
-            self.is_active = False
-
-
-        super().save(*args, **kwargs)
-
-
-class JobStat(models.Model):
-    APPLICATION = 'A'
-    HIT = 'H'
-    SPAM = 'S'
-    STAT_TYPES = (
-        (APPLICATION, _('Application')),
-        (HIT, _('Hit')),
-        (SPAM, _('Spam')),
-    )
-    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='stats')
-    created_on = models.DateTimeField(auto_now_add=True, blank=True)
-    stat_type = models.CharField(max_length=1, choices=STAT_TYPES, db_index=True, blank=True)
-    description = models.TextField(_('Description'))
-    submitter = models.ForeignKey(settings.AUTH_USER_MODEL)
-
-    class Meta:
-        verbose_name = _('Job Stat')
-        verbose_name_plural = _('Job Stats')
-        ordering = ['-created_on']
-
-    def __str__(self):
-        return self.description
-
-    def save(self, *args, **kwargs):
-        if self.stat_type == 'A':
-            self.description = _('Job application for [{}]{} from IP: {}').format(self.job.pk, self.job.title)
-        elif self.stat_type == 'H':
-            self.description = _('Visit for [{}]{} from IP: {}').format(self.job.pk, self.job.title)
-        elif self.stat_type == 'S':
-            self.description = _('Spam report for [{}]{} from IP: {}').format(self.job.pk, self.job.title)
-        else:
-            self.description = _("Unknown stat")
-        super(JobStat, self).save(*args, **kwargs)
-
-
-class JobSearch(models.Model):
-    keywords = models.CharField(_('Keywords'), max_length=100, blank=False)
-    created_on = models.DateTimeField(_('Created on'), default=timezone.now)
-
-    class Meta:
-        verbose_name = _('Search')
-        verbose_name_plural = _('Searches')
-
-    def __str__(self):
-        return self.keywords
\ No newline at end of file
+# -*- coding: utf-8 -*-
+
+from django.db import models, transaction
+from django.template.defaultfilters import slugify
+from django.core.exceptions import ValidationError
+from django.utils.translation import ugettext_lazy as _
+from django.utils import timezone
+from django.urls import reverse
+from django.conf import settings
+from django.utils.functional import cached_property
+from django.db.models.functions import Length, Substr
+
+from treebeard.mp_tree import MP_Node
+from djobberbase.managers import ActiveJobsManager, JobManager, TempJobsManager
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.slugs import next_free_slug, save_with_unique_slug, slug_base
+from djobberbase.trees import trees
+
+
+class SlugMixin(models.Model):
+    slug_field = ''
+    # The fields the slug is unique together with, None if it does not need to be unique
+    slug_unique_with = None
+
+    slug = models.SlugField(blank=True, db_index=True)
+
+    def get_slug(self, field):
+        return slugify(field)
+
+    def slug_scope(self):
+        ''' The objects whose slugs the slug of this one must differ from. '''
+        scope = type(self)._default_manager.filter(**dict(
+            (field, getattr(self, field)) for field in self.slug_unique_with))
+        return scope.exclude(pk=self.pk) if self.pk else scope
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Saves compare with these: the job lists a job was part of and the
+        # search documents holding a name are refreshed when they change
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            slug = self.get_slug(getattr(self, self.slug_field))
+            if self.slug_unique_with is not None:
+                save = lambda: super(SlugMixin, self).save(*args, **kwargs)
+                return save_with_unique_slug(self, save, slug or self._meta.model_name, self.slug_scope())
+            self.slug = slug[:self._meta.get_field('slug').max_length]
+        super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+class TreeNodeMixin:
+    name_separator = ' > '
+    path_separator = '/'
+
+    @property
+    def tree(self):
+        ''' The TreeSnapshot of the whole tree, shared by the process. '''
+        return trees.get(type(self))
+
+    def ancestor_names(self):
+        ''' The names of the ancestors and of the node itself, root first. '''
+        if self.pk in self.tree:
+            return self.tree.names_of(self.pk)[:-1] + [self.name]
+        return [node.name for node in self.get_ancestors_and_self()]
+
+    def ancestor_slugs(self):
+        if self.pk in self.tree:
+            return self.tree.slugs_of(self.pk)[:-1] + [self.slug]
+        return [node.slug for node in self.get_ancestors_and_self()]
+
+    @cached_property
+    def full_name(self):
+        return self.name_separator.join(self.ancestor_names())
+
+    @cached_property
+    def reversed_full_name(self):
+        return self.name_separator.join(reversed(self.ancestor_names()))
+
+    @cached_property
+    def full_path(self):
+        return self.path_separator.join(self.ancestor_slugs())
+
+
+    def get_self_and_descendants(self):
+        yield self
+        for node in reversed(self.get_ancestors()):
+            yield node
+
+
+    def get_self_and_ancestors(self):
+        yield self
+        for node in reversed(self.get_ancestors()):
+            yield node
+
+
+    def get_ancestors_and_self(self):
+        for node in self.get_ancestors():
+            yield node
+        yield self
+
+    def get_descendants_and_self(self):
+        for node in self.get_descendants():
+            yield node
+        yield self
+
+
+class Category(SlugMixin, MP_Node, TreeNodeMixin):
+    ''' The Category model, very straight forward. job_count and
+        total_job_count hold the number of active jobs in the category and
+        in the category and its subcategories. The save() method is overriden so it can automatically asign
+        a category order in case no one is provided.
+    '''
+    slug_field = 'name'
+
+    name = models.CharField(_('Name'), unique=True, max_length=255)
+    description = models.TextField(_('Description'), blank=True, null=True)
+    category_order = models.PositiveIntegerField(_('Category order'), unique=True, blank=True, null=True)
+    job_count = models.PositiveIntegerField(_('Active jobs'), default=0, editable=False)
+    total_job_count = models.PositiveIntegerField(_('Active jobs with subcategories'), default=0, editable=False)
+
+    class Meta:
+        verbose_name = _('Category')
+        verbose_name_plural = _('Categories')
+        ordering = ['category_order']
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        return reverse('djobberbase:category', kwargs={'slug': self.slug})
+
+    def save(self, *args, **kwargs):
+        if not self.category_order:
+            try:
+                self.category_order = Category.objects.\
+                                    latest('category_order').category_order + 1
+            except Category.DoesNotExist:
+                self.category_order = 0
+        super(Category, self).save(*args, **kwargs)
+
+    def move(self, target, pos=None):
+        from djobberbase.counters import move_node
+        with transaction.atomic():
+            old_path = self.path
+            super().move(target, pos=pos)
+            move_node(self, old_path)
+        transaction.on_commit(lambda: trees.invalidate(type(self)))
+
+
+class Type(SlugMixin, models.Model):
+    ''' The Type model, nothing special, just the name and
+        var_name fields. Again, the var_name is slugified by the overriden
+        save() method in case it's not provided.
+    '''
+    slug_field = 'name'
+
+    name = models.CharField(_('Name'), unique=True, max_length=255)
+
+    class Meta:
+        verbose_name = _('Job type')
+        verbose_name_plural = _('Job types')
+
+    def get_absolute_url(self):
+        return reverse('djobberbase_type', kwargs={'type': self.slug})
+
+    def __str__(self):
+        return self.name
+
+
+class Place(SlugMixin, MP_Node, TreeNodeMixin):
+    ''' Place can be a country, state, county, place, street... and they can be nested.
+    '''
+    CONTINENT = 0   #Europe
+    REGION = 1      #Central Europe
+    COUNTRY = 2     #Germany
+    STATE = 3       #Bavaria
+    COUNTY = 4      #Oberpfalz
+    CITY = 5        #Regensburg
+    STREET = 6      #Silberne-Fisch-Gasse
+    PLACE_TYPE_CHOICES = (
+        (CONTINENT, _('Continent')),
+        (REGION, _('Region')),
+        (COUNTRY, _('Country')),
+        (STATE, _('State')),
+        (COUNTY, _('County')),
+        (CITY, _('City')),
+        (STREET, _('Street')),
+    )
+
+    slug_field = 'name'
+    slug_unique_with = ('parent_path',)
+    name_separator = ', '
+
+    name = models.CharField(_('Name'), max_length=255)
+    parent_path = models.CharField(_('Parent path'), max_length=255, blank=True, editable=False)
+    place_type = models.IntegerField(_('Place Type'), choices=PLACE_TYPE_CHOICES, default=CITY)
+    external_id = models.CharField(_('External id'), max_length=64, unique=True, blank=True, null=True,
+                                   help_text=_('The id of the place in the data it was imported from.'))
+    job_count = models.PositiveIntegerField(_('Active jobs'), default=0, editable=False)
+    total_job_count = models.PositiveIntegerField(_('Active jobs with places within'), default=0, editable=False)
+
+
+    def get_absolute_url(self):
+        return reverse('djobberbase:place', kwargs={'slug': self.slug, 'pk': self.pk})
+
+    class Meta:
+        verbose_name = _('Place')
+        verbose_name_plural = _('Places')
+        ordering = ['place_type']
+        # Slugs are unique amongst siblings
+        unique_together = [('parent_path', 'slug')]
+
+    def __str__(self):
+        return self.name
+
+
+    #TODO does not work. It seems the ancestors are created after saving, so we cannot check them like this
+    def clean(self):
+        if self.place_type:
+            ancestor = self.get_ancestors().filter(place_type__lte=self.place_type).aggregate(models.Max('place_type'))['place_type__max']
+            if ancestor:
+                possible_place_types = (place_type[1] for place_type in
+                                        self.PLACE_TYPE_CHOICES[self.PLACE_TYPE_CHOICES.index(ancestor+1):])
+                raise ValidationError(_('Place cannot be of this type. It needs to be one of: ')+str(possible_place_types))
+
+
+    def save(self, *args, **kwargs):
+        self.parent_path = self.path[:-self.steplen]
+        super().save(*args, **kwargs)
+
+    def move(self, target, pos=None):
+        from djobberbase.counters import move_node
+        with transaction.atomic():
+            old_path = self.path
+            super().move(target, pos=pos)
+            move_node(self, old_path)
+            parent_path = self.path[:-self.steplen]
+            siblings = Place.objects.filter(parent_path=parent_path).exclude(pk=self.pk)
+            if siblings.filter(slug=self.slug).exists():
+                self.slug = next_free_slug(siblings, self.slug, self._meta.get_field('slug').max_length)
+                Place.objects.filter(pk=self.pk).update(slug=self.slug)
+            Place.objects.filter(path__startswith=self.path).update(
+                parent_path=Substr('path', 1, Length('path') - self.steplen))
+        transaction.on_commit(lambda: trees.invalidate(type(self)))
+        # The search documents of the jobs within hold the names of the new ancestors
+        from djobberbase import search
+        transaction.on_commit(lambda: search.reindex_jobs(Job.active.filter(place__path__startswith=self.path)))
+
+
+class Company(models.Model):
+    admin = models.OneToOneField(settings.AUTH_USER_MODEL, primary_key=True, verbose_name=_('Company admin'), on_delete=models.CASCADE)
+    logo = models.ImageField(verbose_name=_('Company logo'), upload_to='logos')
+
+    def get_absolute_url(self):
+        return reverse('djobberbase:company_jobs', kwargs={'company': str(self.admin)})
+
+    class Meta:
+        verbose_name_plural = _('Companies')
+        verbose_name = _('Company')
+
+    def __str__(self):
+        return str(self.admin)
+
+
+class Job(SlugMixin, models.Model):
+    ''' The basic job model.
+    '''
+    slug_field = 'title'
+    slug_unique_with = ('company_id',)
+
+    category = models.ForeignKey(Category, verbose_name=_('Category'), on_delete=models.CASCADE, related_name='jobs')
+    jobtype = models.ForeignKey(Type, verbose_name=_('Job Type'), on_delete=models.CASCADE, related_name='jobs')
+    place = models.ForeignKey(Place, verbose_name=_('Place'), on_delete=models.CASCADE, related_name='jobs')
+    company = models.ForeignKey(Company, verbose_name=_('Company'), on_delete=models.CASCADE, related_name="jobs")
+
+    title = models.CharField(verbose_name=_('Title'), max_length=255)
+    salary_range_min = models.PositiveIntegerField(verbose_name=_('Salary range minimum'), blank=True, null=True, db_index=True)
+    salary_range_max = models.PositiveIntegerField(verbose_name=_('Salary range maximum'), blank=True, null=True, db_index=True)
+    description = models.TextField(_('Description'))
+    description_html = models.TextField(_('Description in HTML'), blank=True)
+    description_hash = models.CharField(_('Description hash'), max_length=40, blank=True, editable=False,
+                                        help_text=_('Hash of the description and markup language description_html was rendered from.'))
+    url = models.URLField(_('External job URL'), blank=True, null=True)
+    # Fingerprints finding the near-duplicates of a job, see djobberbase.fingerprints
+    title_hash = models.CharField(_('Title hash'), max_length=16, blank=True, editable=False, db_index=True,
+                                  help_text=_('Hash of the normalized title.'))
+    simhash = models.BigIntegerField(_('Description SimHash'), blank=True, null=True, editable=False)
+    simhash_band_0 = models.PositiveIntegerField(blank=True, null=True, editable=False, db_index=True)
+    simhash_band_1 = models.PositiveIntegerField(blank=True, null=True, editable=False, db_index=True)
+    simhash_band_2 = models.PositiveIntegerField(blank=True, null=True, editable=False, db_index=True)
+    simhash_band_3 = models.PositiveIntegerField(blank=True, null=True, editable=False, db_index=True)
+    duplicate_of = models.ForeignKey('self', verbose_name=_('Near duplicate of'), blank=True, null=True, editable=False,
+                                     on_delete=models.SET_NULL, related_name='near_duplicates',
+                                     help_text=_('The newest older job of the same company or place this one nearly duplicates, when it was posted or edited.'))
+
+
+
+    created_on = models.DateTimeField(_('Created on'), blank=True, auto_now_add=True)
+    modified_on = models.DateTimeField(_('Modified on'), auto_now=True, db_index=True)
+    valid_until = models.DateTimeField(_('Valid until'), blank=True, null=True)
+    is_active = models.BooleanField(_('Created on'), default=True, db_index=True, help_text=_('You can hide the posting from others by unchecking this option.'))
+    spotlight = models.BooleanField(_('Spotlight'), default=False, blank=True, db_index=True)
+
+    objects = JobManager()
+    active = ActiveJobsManager()
+    temporary = TempJobsManager()
+
+    class Meta:
+        verbose_name = _('Job')
+        verbose_name_plural = _('Jobs')
+        # Keyset pagination walks these newest first
+        index_together = [('is_active', 'created_on', 'id'), ('category', 'is_active', 'created_on', 'id')]
+        unique_together = [('company', 'slug')]
+
+
+    def __str__(self):
+        return self.title
+
+    @property
+    def application_count(self):
+        from djobberbase.stats import count_stats
+        return count_stats(JobStat.APPLICATION, [self.pk])[self.pk]
+
+    def switch_activate(self):
+        self.is_active = not self.is_active
+        self.save()
+
+
+    def get_absolute_url(self):
+        return reverse('djobberbase:job_detail', kwargs={'company': str(self.company), 'title_slug': self.slug,
+                                                         'pk': self.pk})
+
+    @property
+    def activation_url(self):
+        return ('djobberbase_job_activate', [self.id])
+
+    @property
+    def deactivation_url(self):
+        return ('djobberbase_job_deactivate', [self.id])
+
+    def clean(self):
+        if self.valid_until:
+            if self.valid_until < timezone.now():
+                raise ValidationError(_("Job posting end date is in the past. "))
+
+        slug = self.slug or slug_base(self.get_slug(self.title), self._meta.get_field('slug').max_length)
+        similar = self.__class__.active.filter(place=self.place, company=self.company, slug=slug).exclude(pk=self.pk).first()
+        if similar is None and djobberbase_settings.DJOBBERBASE_REJECT_NEAR_DUPLICATES:
+            from djobberbase.fingerprints import fingerprint_job, near_duplicates
+            fingerprint_job(self)
+            similar = next(iter(near_duplicates(self, self.__class__.active.filter(
+                place_id=self.place_id, company_id=self.company_id))), None)
+        if similar:
+            url = similar.get_absolute_url()
+            raise ValidationError(_('Similar active job posting from your company already exists. You need to change the title of your posting or deactivate the original one. The original is available over here: ')+url)
+
+    def fill_salary_range(self):
+        ''' Uses the only bound given of the salary range as the other one. '''
+        if self.salary_range_min:
+            if not self.salary_range_max:
+                self.salary_range_max = self.salary_range_min
+        else:
+            if self.salary_range_max:
+                self.salary_range_min = self.salary_range_max
+
+    def save(self, *args, **kwargs):
+        self.fill_salary_range()
+
+        from djobberbase.markup import render_job
+        render_job(self)
+
+        from djobberbase.fingerprints import find_duplicates, fingerprint_job
+        if fingerprint_job(self):
+            find_duplicates([self])
+
+        if djobberbase_settings.DJOBBERBASE_ENABLE_NEW_POST_MODERATION and self.is_active is None:
+            self.is_active = False
+
+
+        from djobberbase.counters import job_state, update_job_counts
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = Job.objects.select_for_update().filter(pk=self.pk).values(
+                    'is_active', 'category_id', 'place_id').first()
+            super().save(*args, **kwargs)
+            update_job_counts([(job_state(previous), job_state(self.__dict__))])
+            if previous is None:
+                JobScore.objects.create(job=self, category_id=self.category_id, is_active=self.is_active)
+            elif (previous['category_id'], previous['is_active']) != (self.category_id, self.is_active):
+                JobScore.objects.filter(job=self).update(category=self.category_id, is_active=self.is_active)
+
+        from djobberbase import search
+        from djobberbase.cache import job_dependencies, result_cache
+        dependencies = job_dependencies(self)
+        self._loaded_values = dict((field.attname, self.__dict__[field.attname])
+                                   for field in self._meta.concrete_fields if field.attname in self.__dict__)
+        transaction.on_commit(lambda: search.index_job(self))
+        transaction.on_commit(lambda: result_cache.invalidate(dependencies))
+
+    def delete(self, *args, **kwargs):
+        from djobberbase import search
+        from djobberbase.cache import job_dependencies, result_cache
+        job_id = self.pk
+        dependencies = job_dependencies(self)
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(lambda: search.remove_job(job_id))
+        transaction.on_commit(lambda: result_cache.invalidate(dependencies))
+        return result
+
+
+class JobStat(models.Model):
+    APPLICATION = 'A'
+    HIT = 'H'
+    SPAM = 'S'
+    STAT_TYPES = (
+        (APPLICATION, _('Application')),
+        (HIT, _('Hit')),
+        (SPAM, _('Spam')),
+    )
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='stats')
+    # Set when the stat happened rather than when a buffered stat gets written
+    created_on = models.DateTimeField(default=timezone.now, blank=True, db_index=True)
+    stat_type = models.CharField(max_length=1, choices=STAT_TYPES, db_index=True, blank=True)
+    description = models.TextField(_('Description'))
+    ip = models.GenericIPAddressField(_('IP address'), blank=True, null=True)
+    submitter = models.ForeignKey(settings.AUTH_USER_MODEL, blank=True, null=True)
+
+    class Meta:
+        verbose_name = _('Job Stat')
+        verbose_name_plural = _('Job Stats')
+        ordering = ['-created_on']
+
+    def __str__(self):
+        return self.description
+
+    @classmethod
+    def describe(cls, job_id, title, stat_type, ip):
+        if stat_type == cls.APPLICATION:
+            return _('Job application for [{}]{} from IP: {}').format(job_id, title, ip)
+        elif stat_type == cls.HIT:
+            return _('Visit for [{}]{} from IP: {}').format(job_id, title, ip)
+        elif stat_type == cls.SPAM:
+            return _('Spam report for [{}]{} from IP: {}').format(job_id, title, ip)
+        return _('Unknown stat')
+
+    def save(self, *args, **kwargs):
+        self.description = self.describe(self.job_id, self.job.title, self.stat_type, self.ip)
+        super(JobStat, self).save(*args, **kwargs)
+
+
+class JobStatDaily(models.Model):
+    ''' The number of stats of each type a job got in a day, for the stats
+        compacted out of JobStat.
+    '''
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='daily_stats')
+    stat_type = models.CharField(max_length=1, choices=JobStat.STAT_TYPES)
+    day = models.DateField(_('Day'))
+    count = models.PositiveIntegerField(_('Count'), default=0)
+
+    class Meta:
+        verbose_name = _('Daily Job Stat')
+        verbose_name_plural = _('Daily Job Stats')
+        unique_together = [('job', 'stat_type', 'day')]
+
+    def __str__(self):
+        return '{} {} {}: {}'.format(self.job_id, self.get_stat_type_display(), self.day, self.count)
+
+
+class JobVisitors(models.Model):
+    ''' A HyperLogLog sketch of the clients who visited a job in a day. '''
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='visitor_sketches')
+    day = models.DateField(_('Day'))
+    sketch = models.BinaryField(_('Sketch'))
+
+    class Meta:
+        verbose_name = _('Job Visitors')
+        verbose_name_plural = _('Job Visitors')
+        unique_together = [('job', 'day')]
+
+    def __str__(self):
+        return '{} {}'.format(self.job_id, self.day)
+
+
+class JobScore(models.Model):
+    ''' The leaderboard scores of a job. The category and the active flag are
+        copied from the job so that each leaderboard is read from an index.
+        trending is the logarithm of the sum of the weights of the job's
+        stats decayed exponentially with their age.
+    '''
+    job = models.OneToOneField(Job, on_delete=models.CASCADE, primary_key=True, related_name='score')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    is_active = models.BooleanField(default=True)
+    applications = models.PositiveIntegerField(_('Applications'), default=0)
+    trending = models.FloatField(_('Trending score'), default=0.0)
+
+    class Meta:
+        verbose_name = _('Job Score')
+        verbose_name_plural = _('Job Scores')
+        index_together = [('is_active', 'applications'), ('is_active', 'trending'),
+                          ('category', 'is_active', 'applications'), ('category', 'is_active', 'trending')]
+
+    def __str__(self):
+        return '{}: {} applications, trending {:.2f}'.format(self.job_id, self.applications, self.trending)
+
+
+class JobSearch(models.Model):
+    keywords = models.CharField(_('Keywords'), max_length=100, blank=False)
+    created_on = models.DateTimeField(_('Created on'), default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = _('Search')
+        verbose_name_plural = _('Searches')
+
+    def __str__(self):
+        return self.keywords
+
+
+class OutboxMessage(models.Model):
+    ''' An email waiting to be sent by the send_outbox command. Views only
+        enqueue messages, workers claim them in batches, send them over a
+        single connection and retry the failed ones later.
+    '''
+    PENDING = 'P'
+    SENT = 'S'
+    FAILED = 'F'
+    STATUSES = (
+        (PENDING, _('Pending')),
+        (SENT, _('Sent')),
+        (FAILED, _('Failed')),
+    )
+    subject = models.CharField(_('Subject'), max_length=255)
+    body = models.TextField(_('Body'))
+    html_body = models.TextField(_('HTML body'), blank=True)
+    from_email = models.CharField(_('From'), max_length=255)
+    to = models.TextField(_('To'), help_text=_('One address per line.'))
+    reply_to = models.CharField(_('Reply to'), max_length=255, blank=True)
+    attachment = models.CharField(_('Attachment'), max_length=255, blank=True,
+                                  help_text=_('Path of a file attached and deleted once the message is sent.'))
+    attachment_data = models.BinaryField(_('Attachment data'), blank=True, null=True)
+    attachment_name = models.CharField(_('Attachment name'), max_length=255, blank=True)
+    status = models.CharField(_('Status'), max_length=1, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(_('Attempts'), default=0)
+    last_error = models.TextField(_('Last error'), blank=True)
+    created_on = models.DateTimeField(_('Created on'), default=timezone.now)
+    send_after = models.DateTimeField(_('Send after'), default=timezone.now)
+    claimed_until = models.DateTimeField(_('Claimed until'), blank=True, null=True)
+    sent_on = models.DateTimeField(_('Sent on'), blank=True, null=True)
+
+    class Meta:
+        verbose_name = _('Outbox message')
+        verbose_name_plural = _('Outbox messages')
+        ordering = ['send_after', 'id']
+        index_together = [('status', 'send_after')]
+
+    def __str__(self):
+        return self.subject
+
+
+class ModerationEvent(models.Model):
+    ''' A posted or edited job waiting to be reported to the moderators by the
+        next digest, when DJOBBERBASE_ADMIN_DIGEST is on.
+    '''
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='moderation_events')
+    created_on = models.DateTimeField(_('Created on'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('Moderation event')
+        verbose_name_plural = _('Moderation events')
+        ordering = ['id']
+
+    def __str__(self):
+        return '{} ({})'.format(self.job_id, self.created_on)
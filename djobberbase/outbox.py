@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import os
+from datetime import timedelta
+from time import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.models import OutboxMessage
+
+
+def enqueue(subject, body, to, from_email=None, html_body='', reply_to='', attachment='',
+            attachment_data=None, attachment_name=''):
+    ''' Adds a message to the outbox. With DJOBBERBASE_ASYNC_NOTIFICATIONS a
+        Celery task sends the outbox once the transaction commits, otherwise
+        the send_outbox command has to run. A small attachment is stored with
+        the message as attachment_data, a large one is referenced by the path
+        of its file.
+    '''
+    if isinstance(to, str):
+        to = [to]
+    message = OutboxMessage.objects.create(
+        subject=subject, body=body, html_body=html_body or '', to='\n'.join(to), reply_to=reply_to or '',
+        from_email=from_email or djobberbase_settings.DJOBBERBASE_ADMIN_EMAIL, attachment=attachment,
+        attachment_data=attachment_data, attachment_name=attachment_name)
+    if djobberbase_settings.DJOBBERBASE_ASYNC_NOTIFICATIONS:
+        from djobberbase import tasks
+        transaction.on_commit(lambda: tasks.send_outbox.delay())
+    return message
+
+
+def claim(batch_size):
+    ''' Claims up to batch_size due messages for DJOBBERBASE_OUTBOX_LEASE
+        seconds. The rows are locked while they are claimed so that concurrent
+        workers never claim the same message, and the messages of a worker
+        that died are claimed again once its lease expired.
+    '''
+    now = timezone.now()
+    due = OutboxMessage.objects.filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now),
+                                       status=OutboxMessage.PENDING, send_after__lte=now)
+    with transaction.atomic():
+        pks = list(due.select_for_update().order_by('send_after', 'pk').values_list('pk', flat=True)[:batch_size])
+        OutboxMessage.objects.filter(pk__in=pks).update(
+            claimed_until=now + timedelta(seconds=djobberbase_settings.DJOBBERBASE_OUTBOX_LEASE))
+    return list(OutboxMessage.objects.filter(pk__in=pks).order_by('send_after', 'pk'))
+
+
+def build_email(message, connection=None):
+    email = EmailMultiAlternatives(message.subject, message.body, message.from_email, message.to.splitlines(),
+                                   connection=connection, reply_to=[message.reply_to] if message.reply_to else None)
+    if message.html_body:
+        email.attach_alternative(message.html_body, 'text/html')
+    # The content type is guessed from the name, the one of the upload is not trusted
+    if message.attachment_data is not None:
+        email.attach(message.attachment_name, bytes(message.attachment_data))
+    elif message.attachment:
+        with open(message.attachment, 'rb') as attachment:
+            email.attach(message.attachment_name or os.path.basename(message.attachment), attachment.read())
+    return email
+
+
+def retry_delay(attempts):
+    ''' Exponential backoff: the delay doubles after every failed attempt. '''
+    return timedelta(seconds=djobberbase_settings.DJOBBERBASE_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def send_messages(messages, connection):
+    ''' Sends claimed messages over one connection and returns the numbers of
+        sent and failed ones.
+    '''
+    sent = failed = 0
+    for message in messages:
+        try:
+            connection.send_messages([build_email(message, connection)])
+        except Exception as e:
+            # A broken connection is opened again for the next message
+            connection.close()
+            attempts = message.attempts + 1
+            status = OutboxMessage.FAILED if attempts >= djobberbase_settings.DJOBBERBASE_OUTBOX_MAX_ATTEMPTS \
+                else OutboxMessage.PENDING
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                status=status, attempts=attempts, last_error='{}: {}'.format(type(e).__name__, e),
+                send_after=timezone.now() + retry_delay(attempts), claimed_until=None)
+            failed += 1
+        else:
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                status=OutboxMessage.SENT, attempts=message.attempts + 1, sent_on=timezone.now(), claimed_until=None)
+            if message.attachment and os.path.exists(message.attachment):
+                os.remove(message.attachment)
+            sent += 1
+    return sent, failed
+
+
+def send_outbox(batch_size=None, connection=None):
+    ''' Sends all the due messages, batch after batch over one reused
+        connection. Returns the numbers of sent and failed messages and the
+        time it took.
+    '''
+    batch_size = batch_size or djobberbase_settings.DJOBBERBASE_OUTBOX_BATCH_SIZE
+    connection = connection or get_connection()
+    start = time()
+    sent = failed = 0
+    try:
+        while True:
+            messages = claim(batch_size)
+            if not messages:
+                break
+            connection.open()
+            batch_sent, batch_failed = send_messages(messages, connection)
+            sent, failed = sent + batch_sent, failed + batch_failed
+    finally:
+        connection.close()
+    return sent, failed, time() - start
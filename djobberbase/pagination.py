@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import binascii
+import json
+
+from django.core.paginator import InvalidPage
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.conf import settings as djobberbase_settings
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, created_on, pk):
+    value = '{}|{}|{}'.format(direction, created_on.isoformat(), pk)
+    return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    ''' Returns the (direction, created_on, pk) of a cursor built by
+        encode_cursor. Raises InvalidPage for anything else.
+    '''
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        direction, created_on, pk = value.split('|')
+        created_on, pk = parse_datetime(created_on), int(pk)
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        raise InvalidPage(_('Invalid cursor.'))
+    if direction not in (NEXT, PREVIOUS) or created_on is None:
+        raise InvalidPage(_('Invalid cursor.'))
+    return direction, created_on, pk
+
+
+def count_jobs(queryset):
+    ''' Counts the jobs of a queryset. On PostgreSQL the estimate of the query
+        planner is used instead when it is over DJOBBERBASE_EXACT_COUNT_LIMIT,
+        so that large lists never pay for a full count.
+    '''
+    connection = connections[queryset.db]
+    limit = djobberbase_settings.DJOBBERBASE_EXACT_COUNT_LIMIT
+    if connection.vendor == 'postgresql' and limit is not None:
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate > limit:
+            return estimate
+    return queryset.count()
+
+
+class KeysetPage:
+    ''' A page of a KeysetPaginator. Instead of page numbers it has cursors
+        pointing to the previous and next pages.
+    '''
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return '<Keyset page of {} jobs>'.format(len(self.object_list))
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            first = self.object_list[0]
+            return encode_cursor(PREVIOUS, first.created_on, first.pk)
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            last = self.object_list[-1]
+            return encode_cursor(NEXT, last.created_on, last.pk)
+
+
+class KeysetPaginator:
+    ''' Paginates jobs newest first on (created_on, id) with a range condition
+        instead of an OFFSET, so deep pages cost as much as the first one.
+        count is a callable returning the total number of jobs, only called
+        when a template asks for it.
+    '''
+    keyset = True
+
+    def __init__(self, queryset, per_page, count=None):
+        self.queryset = queryset.order_by('-created_on', '-pk')
+        self.per_page = int(per_page)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        return self._count() if self._count else count_jobs(self.queryset)
+
+    def page(self, cursor=None):
+        if not cursor:
+            jobs = list(self.queryset[:self.per_page + 1])
+            return KeysetPage(jobs[:self.per_page], self, False, len(jobs) > self.per_page)
+        direction, created_on, pk = decode_cursor(cursor)
+        if direction == NEXT:
+            jobs = self.queryset.filter(Q(created_on__lt=created_on) | Q(created_on=created_on, pk__lt=pk))
+            jobs = list(jobs[:self.per_page + 1])
+            return KeysetPage(jobs[:self.per_page], self, True, len(jobs) > self.per_page)
+        jobs = self.queryset.filter(Q(created_on__gt=created_on) | Q(created_on=created_on, pk__gt=pk))
+        jobs = list(jobs.order_by('created_on', 'pk')[:self.per_page + 1])
+        return KeysetPage(jobs[:self.per_page][::-1], self, len(jobs) > self.per_page, True)
@@ -1,75 +1,179 @@
-# -*- coding: utf-8 -*-
-from time import time
-import threading
-
-from django.core.mail import EmailMessage
-from django.contrib.sites.models import Site
-from django.forms import model_to_dict
-from django.template.loader import render_to_string
-
-from djobberbase.helpers import getIP, handle_uploaded_file, delete_uploaded_file
-from djobberbase.conf import settings as djobberbase_settings
-from djobberbase import tasks
-
-site_domain = Site.objects.get_current().domain
-site_url = lambda url, domain=site_domain, protocol="http": "{}://{}{}".format(protocol, domain, url)
-
-
-def mail_template(job, email_template, subject_string, to, msg='', from_email=djobberbase_settings.DJOBBERBASE_ADMIN_EMAIL, include_activate_url=False):
-    context = model_to_dict(job, fields=('url', 'title', 'company', 'description', 'poster_email', 'post_date'))
-    context['job_url'] = site_url(job.absolute_url)
-    context['job_edit_url'] = site_url(job.edit_url)
-    context['job_deactivate_url'] = site_url(job.deactivation_url)
-    context['msg_body'] = msg
-
-    job_info = {
-        'site_name': djobberbase_settings.DJOBBERBASE_SITE_NAME,
-        'job_title': job.title,
-    }
-    subject = subject_string % job_info
-    if include_activate_url and not job.is_active:
-        subject = djobberbase_settings.DJOBBERBASE_NEW_POST_ADMIN_SUBJECT % job_info
-        context['job_activate_url'] = site_url(job.activation_url)
-
-    text_content = render_to_string('djobberbase/emails/{}.txt'.format(email_template), context)
-    html_content = render_to_string('djobberbase/emails/{}.html'.format(email_template), context)
-    return tasks.send_mail(subject=subject, body=text_content, from_email=from_email, to=[to], html_message=html_content)
-
-
-def mail_publish_to_admin(job):
-    return mail_template(job, email_template='publish_to_admin', to=djobberbase_settings.DJOBBERBASE_ADMIN_EMAIL,
-                         subject_string=djobberbase_settings.DJOBBERBASE_EDIT_POST_ADMIN_SUBJECT, include_activate_url=True)
-
-
-def mail_publish_pending_to_user(job):
-    return mail_template(job, email_template='publish_pending_to_user', to=job.poster_email,
-                         subject_string=djobberbase_settings.DJOBBERBASE_MAIL_PENDING_SUBJECT)
-
-
-def mail_publish_to_user(job):
-    return mail_template(job, email_template='publish_to_user', to=job.poster_email,
-                         subject_string=djobberbase_settings.DJOBBERBASE_MAIL_PUBLISH_SUBJECT)
-
-
-def mail_apply_online(job, **post_args):
-    return mail_template(job, email_template='publish_to_user', to=job.poster_email,
-                         subject_string=djobberbase_settings.DJOBBERBASE_MAIL_APPLY_ONLINE_SUBJECT)
-
-class MailApplyOnline(threading.Thread):
-
-    def __init__(self, job, request):
-        threading.Thread.__init__(self)
-        job_info = {
-                    'site_name': djobberbase_settings.DJOBBERBASE_SITE_NAME,
-                    'job_title': job.title,
-        }
-        subject = djobberbase_settings.DJOBBERBASE_MAIL_APPLY_ONLINE_SUBJECT % job_info
-        from_email = djobberbase_settings.DJOBBERBASE_ADMIN_EMAIL
-        to = job.poster_email
-        msg = request.POST['apply_msg']
-        self.email = EmailMessage(subject, msg, from_email, [to], headers = {'Reply-To': request.POST['apply_email']})
-        if 'apply_cv' in request.FILES.keys():
-            name = "{}_{}".format(int(time()), request.FILES['apply_csv'].name)
-            handle_uploaded_file(request.FILES['apply_cv'], name)
-            self.email.attach_file(djobberbase_settings.DJOBBERBASE_FILE_UPLOADS + name)
-            delete_uploaded_file(djobberbase_settings.DJOBBERBASE_FILE_UPLOADS + name)
\ No newline at end of file
+# -*- coding: utf-8 -*-
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.db import transaction
+from django.db.models import Count, Max
+from django.template import Context
+from django.template.loader import get_template
+from django.urls import reverse
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.models import Job, ModerationEvent
+from djobberbase.outbox import enqueue
+from djobberbase.uploads import CVFile
+
+
+def poster_email(job):
+    return job.company.admin.email
+
+
+class MailRenderer:
+    ''' Renders the text and HTML bodies of the notification emails. The
+        templates of each email are loaded and compiled once per process
+        (on every render with DEBUG, so that they can be edited), and a batch
+        of jobs is rendered through a single context built once.
+    '''
+
+    def __init__(self):
+        self.templates = {}
+
+    def get_templates(self, name):
+        templates = self.templates.get(name)
+        if templates is None:
+            templates = tuple(get_template('djobberbase/emails/{}.{}'.format(name, extension)).template
+                              for extension in ('txt', 'html'))
+            if not settings.DEBUG:
+                self.templates[name] = templates
+        return templates
+
+    def job_context(self, job, domain):
+        return {
+            'job_title': job.title,
+            'job_company': job.company,
+            'job_description': job.description,
+            'job_url': 'http://{}{}'.format(domain, job.get_absolute_url()),
+            'job_external_url': job.url,
+            'job_poster_email': poster_email(job),
+            'job_post_date': job.created_on,
+        }
+
+    def render_batch(self, name, jobs, **extra):
+        ''' Returns the (text, html) bodies of the email for each job. The
+            jobs should come with their company and its admin.
+        '''
+        templates = self.get_templates(name)
+        domain = Site.objects.get_current().domain
+        context = Context(dict({'site_name': djobberbase_settings.DJOBBERBASE_SITE_NAME}, **extra))
+        rendered = []
+        for job in jobs:
+            with context.push(self.job_context(job, domain)):
+                rendered.append(tuple(template.render(context) for template in templates))
+        return rendered
+
+    def render(self, name, job, **extra):
+        return self.render_batch(name, [job], **extra)[0]
+
+
+renderer = MailRenderer()
+
+
+def mail_template(job, email_template, subject_string, to, msg='', from_email=djobberbase_settings.DJOBBERBASE_ADMIN_EMAIL, include_activate_url=False):
+    job_info = {
+        'site_name': djobberbase_settings.DJOBBERBASE_SITE_NAME,
+        'job_title': job.title,
+    }
+    subject = subject_string % job_info
+    if include_activate_url and not job.is_active:
+        subject = djobberbase_settings.DJOBBERBASE_NEW_POST_ADMIN_SUBJECT % job_info
+    text_content, html_content = renderer.render(email_template, job, msg_body=msg)
+    return enqueue(subject, text_content, to, from_email=from_email, html_body=html_content)
+
+
+def mail_batch(jobs, email_template, subject_string, to=None):
+    ''' Queues the same email about several jobs, rendered in one pass. The
+        messages go to the posters of the jobs unless to is given.
+    '''
+    jobs = list(jobs)
+    for job, (text_content, html_content) in zip(jobs, renderer.render_batch(email_template, jobs)):
+        subject = subject_string % {'site_name': djobberbase_settings.DJOBBERBASE_SITE_NAME, 'job_title': job.title}
+        enqueue(subject, text_content, to or poster_email(job), html_body=html_content)
+    return len(jobs)
+
+
+def mail_publish_to_admin(job):
+    if djobberbase_settings.DJOBBERBASE_ADMIN_DIGEST:
+        # Reported by the next moderation digest
+        return ModerationEvent.objects.create(job=job)
+    return mail_template(job, email_template='publish_to_admin', to=djobberbase_settings.DJOBBERBASE_ADMIN_EMAIL,
+                         subject_string=djobberbase_settings.DJOBBERBASE_EDIT_POST_ADMIN_SUBJECT, include_activate_url=True)
+
+
+def mail_moderation_digest(recipients=None):
+    ''' Queues to each recipient one summary of the jobs posted or edited
+        since the previous digest, the jobs waiting for activation first, with
+        a link to each job in the admin. Returns the number of jobs reported.
+    '''
+    recipients = recipients or djobberbase_settings.DJOBBERBASE_ADMIN_DIGEST_RECIPIENTS or \
+        [djobberbase_settings.DJOBBERBASE_ADMIN_EMAIL]
+    with transaction.atomic():
+        # Locking the last event keeps concurrent digests from reporting the same events
+        last = ModerationEvent.objects.select_for_update().order_by('-pk').values_list('pk', flat=True).first()
+        if last is None:
+            return 0
+        jobs = Job.objects.filter(moderation_events__pk__lte=last).annotate(
+            events=Count('moderation_events'), last_event_on=Max('moderation_events__created_on'))
+        total, pending = jobs.count(), jobs.filter(is_active=False).count()
+        listed = jobs.select_related('company__admin', 'duplicate_of').order_by('is_active', '-last_event_on', '-pk')[
+            :djobberbase_settings.DJOBBERBASE_ADMIN_DIGEST_MAX_JOBS]
+        domain = Site.objects.get_current().domain
+        context = Context({
+            'site_name': djobberbase_settings.DJOBBERBASE_SITE_NAME,
+            'jobs': [{
+                'job_title': job.title,
+                'job_company': job.company,
+                'job_url': 'http://{}{}'.format(domain, job.get_absolute_url()),
+                'job_admin_url': 'http://{}{}'.format(domain, reverse('admin:djobberbase_job_change', args=[job.pk])),
+                'job_is_active': job.is_active,
+                'job_events': job.events,
+                'job_last_event_on': job.last_event_on,
+                'job_duplicate_of': job.duplicate_of,
+                'job_duplicate_of_admin_url': job.duplicate_of and 'http://{}{}'.format(
+                    domain, reverse('admin:djobberbase_job_change', args=[job.duplicate_of.pk])),
+            } for job in listed],
+            'jobs_count': total,
+            'pending_count': pending,
+            'more_count': max(0, total - djobberbase_settings.DJOBBERBASE_ADMIN_DIGEST_MAX_JOBS),
+            'pending_url': 'http://{}{}?is_active__exact=0'.format(domain, reverse('admin:djobberbase_job_changelist')),
+        })
+        text_content, html_content = (template.render(context) for template in renderer.get_templates('moderation_digest'))
+        subject = djobberbase_settings.DJOBBERBASE_ADMIN_DIGEST_SUBJECT % {
+            'site_name': djobberbase_settings.DJOBBERBASE_SITE_NAME, 'jobs': total, 'pending': pending}
+        for recipient in recipients:
+            enqueue(subject, text_content, recipient, html_body=html_content)
+        ModerationEvent.objects.filter(pk__lte=last).delete()
+    return total
+
+
+def mail_publish_pending_to_user(job):
+    return mail_template(job, email_template='publish_pending_to_user', to=poster_email(job),
+                         subject_string=djobberbase_settings.DJOBBERBASE_MAIL_PENDING_SUBJECT)
+
+
+def mail_publish_to_user(job):
+    return mail_template(job, email_template='publish_to_user', to=poster_email(job),
+                         subject_string=djobberbase_settings.DJOBBERBASE_MAIL_PUBLISH_SUBJECT)
+
+
+def mail_apply_online(job, request):
+    ''' Queues an application to the job poster, replying to the applicant
+        and with the uploaded CV attached.
+    '''
+    job_info = {
+                'site_name': djobberbase_settings.DJOBBERBASE_SITE_NAME,
+                'job_title': job.title,
+    }
+    subject = djobberbase_settings.DJOBBERBASE_MAIL_APPLY_ONLINE_SUBJECT % job_info
+    cv = request.FILES.get('apply_cv')
+    attachment = {}
+    if isinstance(cv, CVFile) and not cv.in_memory():
+        # Large CVs are already in DJOBBERBASE_FILE_UPLOADS, the outbox only keeps their path
+        cv.close()
+        attachment = {'attachment': cv.path}
+    elif cv:
+        data = cv.getvalue() if isinstance(cv, CVFile) else cv.read()
+        attachment = {'attachment_data': data}
+    if cv:
+        attachment['attachment_name'] = cv.name
+    return enqueue(subject, request.POST['apply_msg'], poster_email(job), reply_to=request.POST['apply_email'],
+                   **attachment)
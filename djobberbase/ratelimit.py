@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import math
+from time import time
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.conf import settings as djobberbase_settings
+
+APPLY = 'apply'
+EXPORT = 'export'
+POST = 'post'
+SEARCH = 'search'
+VISIT = 'visit'
+
+
+class RateLimiter:
+    ''' Limits how often a client may do an action with sliding window
+        counters kept in the DJOBBERBASE_RATE_LIMIT_CACHE cache, without any
+        database query. DJOBBERBASE_RATE_LIMITS maps each action to a number
+        of times allowed per period of seconds. The count of the current
+        window is added to the count of the previous one weighted by how much
+        of it still overlaps the sliding period. Actions limited to None are
+        not limited.
+    '''
+
+    @property
+    def cache(self):
+        return caches[djobberbase_settings.DJOBBERBASE_RATE_LIMIT_CACHE]
+
+    def key(self, action, client, window):
+        return 'djobberbase:ratelimit:{}:{}:{}'.format(action, client, window)
+
+    def usage(self, action, client, now=None):
+        ''' Returns (limit, period, elapsed seconds of the current window,
+            count of the previous window, count of the current window) and the
+            current window.
+        '''
+        limit, period = djobberbase_settings.DJOBBERBASE_RATE_LIMITS[action]
+        now = time() if now is None else now
+        window = int(now // period)
+        keys = [self.key(action, client, window - 1), self.key(action, client, window)]
+        counts = self.cache.get_many(keys)
+        return (limit, period, now - window * period, counts.get(keys[0], 0), counts.get(keys[1], 0)), window
+
+    def retry_after(self, limit, period, elapsed, previous, current):
+        ''' Returns in how many seconds one more action will be allowed, 0 if it
+            is allowed now.
+        '''
+        if previous * (period - elapsed) / period + current + 1 <= limit:
+            return 0
+        if limit <= 0:
+            # The action is blocked
+            return max(1, int(math.ceil(period - elapsed)))
+        if current + 1 > limit:
+            # Wait for the next window, and for the current one to slide out far enough
+            wait = period - elapsed + period * (1 - (limit - 1) / current)
+        else:
+            wait = period - elapsed - (limit - current - 1) * period / previous
+        return max(1, int(math.ceil(wait)))
+
+    def check(self, action, client):
+        ''' Returns in how many seconds the client may do the action, 0 if it
+            may do it now, without counting it.
+        '''
+        if not djobberbase_settings.DJOBBERBASE_RATE_LIMITS.get(action):
+            return 0
+        return self.retry_after(*self.usage(action, client)[0])
+
+    def hit(self, action, client):
+        ''' Counts the action unless it is over the limit. Returns 0 when it is
+            allowed and in how many seconds to retry when it is not.
+        '''
+        if not djobberbase_settings.DJOBBERBASE_RATE_LIMITS.get(action):
+            return 0
+        (limit, period, elapsed, previous, current), window = self.usage(action, client)
+        retry_after = self.retry_after(limit, period, elapsed, previous, current)
+        if retry_after:
+            return retry_after
+        key = self.key(action, client, window)
+        self.cache.add(key, 0, period * 2)
+        try:
+            counted = self.cache.incr(key)
+        except ValueError:
+            # The counter expired in between
+            self.cache.add(key, 1, period * 2)
+            return 0
+        if previous * (period - elapsed) / period + counted > limit:
+            # Another request got there first
+            self.cache.decr(key)
+            return self.retry_after(limit, period, elapsed, previous, counted - 1)
+        return 0
+
+    def reset(self, action, client):
+        window = int(time() // djobberbase_settings.DJOBBERBASE_RATE_LIMITS[action][1])
+        self.cache.delete_many([self.key(action, client, window - 1), self.key(action, client, window)])
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse(_('Too many requests, please try again in {} seconds.').format(retry_after),
+                            status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+rate_limiter = RateLimiter()
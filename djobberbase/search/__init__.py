@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+from django.utils.module_loading import import_string
+
+from djobberbase.conf import settings as djobberbase_settings
+
+_backend = None
+
+
+def get_backend():
+    ''' Returns the search backend configured with DJOBBERBASE_SEARCH_BACKEND.
+        The instance is created once per process and shared afterwards.
+    '''
+    global _backend
+    if _backend is None:
+        _backend = import_string(djobberbase_settings.DJOBBERBASE_SEARCH_BACKEND)()
+    return _backend
+
+
+def search(query_string, place=''):
+    return get_backend().search(query_string, place=place)
+
+
+def index_job(job):
+    return get_backend().index(job)
+
+
+def index_jobs(jobs):
+    return get_backend().index_many(jobs)
+
+
+def remove_job(job_id):
+    return get_backend().remove(job_id)
+
+
+def reindex_jobs(jobs, chunk_size=djobberbase_settings.DJOBBERBASE_SEARCH_INDEX_CHUNK_SIZE):
+    ''' Reindexes the jobs of a queryset chunk by chunk, when the name of a
+        category, job type or place their documents hold changed. Returns the
+        number of reindexed jobs.
+    '''
+    reindexed = 0
+    last_pk = 0
+    while True:
+        chunk = list(jobs.filter(pk__gt=last_pk).order_by('pk').only('pk')[:chunk_size])
+        if not chunk:
+            break
+        index_jobs(chunk)
+        reindexed += len(chunk)
+        last_pk = chunk[-1].pk
+    return reindexed
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.helpers import normalize_query
+from djobberbase.models import Job, Place
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+JOB_RELATED = ('category', 'jobtype', 'place', 'company', 'company__admin')
+
+
+def tokenize(text):
+    ''' Splits a text in lowercased word tokens.
+
+        >>> tokenize('Senior Python/Django developer')
+        ['senior', 'python', 'django', 'developer']
+    '''
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class RankedJobList:
+    ''' A lazy, ordered list of jobs backed by a list of job ids. Only the
+        slices that are actually accessed are loaded from the database, so it
+        can be handed to a Paginator or sliced directly by a view.
+    '''
+    model = Job
+    ordered = True
+
+    def __init__(self, ids, related=JOB_RELATED):
+        self.ids = list(ids)
+        self.related = related
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __bool__(self):
+        return bool(self.ids)
+
+    def count(self):
+        return len(self.ids)
+
+    def exists(self):
+        return bool(self.ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.load(self.ids[key])
+        jobs = self.load([self.ids[key]])
+        if not jobs:
+            raise IndexError(key)
+        return jobs[0]
+
+    def load(self, ids):
+        jobs = Job.objects.select_related(*self.related).in_bulk(ids)
+        return [jobs[pk] for pk in ids if pk in jobs]
+
+
+class BaseSearchBackend:
+    ''' Interface every search backend implements. search() returns the active
+        jobs matching the query string, best match first. index() and remove()
+        are called whenever a job is saved or deleted, index_many() after
+        jobs are imported in bulk, and rebuild() recreates the whole index
+        from the database.
+    '''
+
+    def parse(self, query_string):
+        ''' Returns the query as a list of token lists, one per term returned
+            by normalize_query. Every token of every term has to match.
+        '''
+        terms = (tokenize(term) for term in normalize_query(query_string))
+        return [tokens for tokens in terms if tokens]
+
+    def get_place_ids(self, place):
+        return list(Place.objects.filter(name__iexact=place.strip()).values_list('pk', flat=True))
+
+    def search(self, query_string, place=''):
+        raise NotImplementedError
+
+    def index(self, job):
+        pass
+
+    def index_many(self, jobs):
+        for job in jobs:
+            self.index(job)
+
+    def remove(self, job_id):
+        pass
+
+    def rebuild(self, chunk_size=djobberbase_settings.DJOBBERBASE_SEARCH_INDEX_CHUNK_SIZE):
+        ''' Returns the number of indexed jobs. '''
+        return 0
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+from django.db import connection, transaction
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.models import Job, Place
+from djobberbase.search.base import BaseSearchBackend, JOB_RELATED
+from djobberbase.search.simple import IcontainsBackend
+from djobberbase.trees import trees
+
+SEARCH_TABLE = 'djobberbase_job_fts'
+
+
+def place_names(place_ids):
+    ''' Returns {place id: names of the place and all its ancestors}, read
+        from the tree snapshot.
+    '''
+    place_ids = set(place_ids)
+    tree = trees.get(Place)
+    if not all(pk in tree for pk in place_ids):
+        # A place created by another process since the last version check
+        tree = trees.get(Place, reload=True)
+    return dict((pk, ' '.join(reversed(tree.names_of(pk)))) for pk in place_ids if pk in tree)
+
+
+class FullTextBackend(BaseSearchBackend):
+    ''' Base class of the backends searching a full text index kept in the
+        SEARCH_TABLE table, which holds one row per active job with its title,
+        description, category, job type and place names. The table is created
+        by the 0004_job_search_index migration.
+    '''
+    table = SEARCH_TABLE
+
+    def documents(self, jobs):
+        rows = list(jobs.values_list('pk', 'title', 'description', 'category__name', 'jobtype__name', 'place_id'))
+        places = place_names(row[5] for row in rows)
+        return [row[:5] + (places.get(row[5], ''),) for row in rows]
+
+    def ranked(self, jobs, groups):
+        raise NotImplementedError
+
+    def delete_documents(self, cursor, job_ids):
+        raise NotImplementedError
+
+    def insert_documents(self, cursor, documents):
+        raise NotImplementedError
+
+    def search(self, query_string, place=''):
+        groups = self.parse(query_string)
+        if not groups:
+            return Job.objects.none()
+        jobs = Job.active.select_related(*JOB_RELATED)
+        if place:
+            jobs = jobs.filter(place__in=self.get_place_ids(place))
+        return self.ranked(jobs, groups)
+
+    def update(self, job_ids):
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.delete_documents(cursor, job_ids)
+            self.insert_documents(cursor, self.documents(Job.active.filter(pk__in=job_ids)))
+
+    def index(self, job):
+        self.update([job.pk])
+
+    def index_many(self, jobs):
+        self.update([job.pk for job in jobs])
+
+    def remove(self, job_id):
+        with connection.cursor() as cursor:
+            self.delete_documents(cursor, [job_id])
+
+    def rebuild(self, chunk_size=djobberbase_settings.DJOBBERBASE_SEARCH_INDEX_CHUNK_SIZE):
+        ''' Empties the index and refills it chunk by chunk, every chunk in its
+            own transaction.
+        '''
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(self.table))
+        indexed = 0
+        last_pk = 0
+        while True:
+            job_ids = list(Job.active.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not job_ids:
+                break
+            self.update(job_ids)
+            indexed += len(job_ids)
+            last_pk = job_ids[-1]
+        return indexed
+
+
+class SQLiteBackend(FullTextBackend):
+    ''' Searches an FTS5 virtual table whose rowid is the job id. Each term of
+        the query is matched as a phrase and results are ranked with bm25().
+    '''
+    column_weights = (10.0, 1.0, 5.0, 5.0, 3.0)
+
+    def ranked(self, jobs, groups):
+        match = ' AND '.join('"{}"'.format(' '.join(tokens)) for tokens in groups)
+        rank = 'bm25({}, {})'.format(self.table, ', '.join(str(weight) for weight in self.column_weights))
+        return jobs.extra(tables=[self.table],
+                          where=['{}.rowid = {}.id'.format(self.table, Job._meta.db_table),
+                                 '{} MATCH %s'.format(self.table)],
+                          params=[match],
+                          select={'search_rank': rank},
+                          order_by=['search_rank', '-created_on'])
+
+    def delete_documents(self, cursor, job_ids):
+        cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(self.table, ', '.join(['%s'] * len(job_ids))),
+                       list(job_ids))
+
+    def insert_documents(self, cursor, documents):
+        cursor.executemany('INSERT INTO {} (rowid, title, description, category, jobtype, place) '
+                           'VALUES (%s, %s, %s, %s, %s, %s)'.format(self.table), documents)
+
+    def rebuild(self, chunk_size=djobberbase_settings.DJOBBERBASE_SEARCH_INDEX_CHUNK_SIZE):
+        indexed = super().rebuild(chunk_size=chunk_size)
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO {0} ({0}) VALUES ('optimize')".format(self.table))
+        return indexed
+
+
+class PostgreSQLBackend(FullTextBackend):
+    ''' Searches a tsvector column with a GIN index. Title, category and job
+        type, place and description are weighted A, B, C and D and results are
+        ranked with ts_rank_cd().
+    '''
+    document_sql = ("setweight(to_tsvector(%s, %s), 'A') || setweight(to_tsvector(%s, %s), 'D') || "
+                    "setweight(to_tsvector(%s, %s || ' ' || %s), 'B') || setweight(to_tsvector(%s, %s), 'C')")
+
+    @property
+    def config(self):
+        return djobberbase_settings.DJOBBERBASE_SEARCH_CONFIG
+
+    def ranked(self, jobs, groups):
+        tsquery = ' && '.join(['phraseto_tsquery(%s, %s)'] * len(groups))
+        params = []
+        for tokens in groups:
+            params.extend((self.config, ' '.join(tokens)))
+        return jobs.extra(tables=[self.table],
+                          where=['{}.job_id = {}.id'.format(self.table, Job._meta.db_table),
+                                 '{}.document @@ ({})'.format(self.table, tsquery)],
+                          params=params,
+                          select={'search_rank': 'ts_rank_cd({}.document, ({}))'.format(self.table, tsquery)},
+                          select_params=params,
+                          order_by=['-search_rank', '-created_on'])
+
+    def delete_documents(self, cursor, job_ids):
+        cursor.execute('DELETE FROM {} WHERE job_id = ANY(%s)'.format(self.table), [list(job_ids)])
+
+    def insert_documents(self, cursor, documents):
+        config = self.config
+        cursor.executemany('INSERT INTO {} (job_id, document) VALUES (%s, {})'.format(self.table, self.document_sql),
+                           [(pk, config, title, config, description, config, category, jobtype, config, place)
+                            for pk, title, description, category, jobtype, place in documents])
+
+
+class DatabaseBackend(BaseSearchBackend):
+    ''' Uses the full text index of the database in use: FTS5 on SQLite and
+        tsvector on PostgreSQL. Other databases, or databases where the index
+        table could not be created, fall back to the IcontainsBackend.
+    '''
+    implementations = {
+        'sqlite': SQLiteBackend,
+        'postgresql': PostgreSQLBackend,
+    }
+
+    def __init__(self):
+        self._implementation = None
+
+    @property
+    def implementation(self):
+        if self._implementation is None:
+            implementation = self.implementations.get(connection.vendor, IcontainsBackend)
+            if SEARCH_TABLE not in connection.introspection.table_names():
+                implementation = IcontainsBackend
+            self._implementation = implementation()
+        return self._implementation
+
+    def search(self, query_string, place=''):
+        return self.implementation.search(query_string, place=place)
+
+    def index(self, job):
+        return self.implementation.index(job)
+
+    def index_many(self, jobs):
+        return self.implementation.index_many(jobs)
+
+    def remove(self, job_id):
+        return self.implementation.remove(job_id)
+
+    def rebuild(self, chunk_size=djobberbase_settings.DJOBBERBASE_SEARCH_INDEX_CHUNK_SIZE):
+        return self.implementation.rebuild(chunk_size=chunk_size)
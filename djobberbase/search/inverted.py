@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import math
+import threading
+import uuid
+
+from django.core.cache import caches
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.models import Job
+from djobberbase.search.base import BaseSearchBackend, RankedJobList, tokenize
+
+GENERATION_KEY = 'djobberbase:search:generation'
+SEQUENCE_KEY = 'djobberbase:search:sequence'
+CHANGE_KEY = 'djobberbase:search:change:{}'
+
+
+class InvertedIndex:
+    ''' An in-memory inverted index: every term points to a posting list of
+        {job id: weighted term frequency}. Documents are ranked with BM25.
+        The index is not thread-safe by itself, callers serialize access.
+    '''
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = {}
+        self.terms = {}
+        self.places = {}
+        self.total_length = 0.0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, doc_id, weighted_tokens, place_id=None):
+        ''' Indexes a document given as an iterable of (token, weight) pairs,
+            replacing any previous version of it.
+        '''
+        self.discard(doc_id)
+        frequencies = {}
+        for token, weight in weighted_tokens:
+            frequencies[token] = frequencies.get(token, 0) + weight
+        if not frequencies:
+            return
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+        length = sum(frequencies.values())
+        self.lengths[doc_id] = length
+        self.terms[doc_id] = tuple(frequencies)
+        self.places[doc_id] = place_id
+        self.total_length += length
+
+    def discard(self, doc_id):
+        terms = self.terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id)
+        del self.places[doc_id]
+
+    def idf(self, term):
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.lengths) - df + 0.5) / (df + 0.5))
+
+    def search(self, groups, place_ids=None, limit=None):
+        ''' Returns the ids of the documents containing every token of every
+            group, best BM25 score first. Ties are broken by the newest id.
+            With a limit only the best `limit` ids are returned.
+        '''
+        tokens = set(token for group in groups for token in group)
+        if not tokens or not self.lengths:
+            return []
+        postings = [self.postings.get(token) for token in tokens]
+        if not all(postings):
+            return []
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates = set(doc_id for doc_id in candidates if doc_id in posting)
+            if not candidates:
+                return []
+        if place_ids is not None:
+            place_ids = set(place_ids)
+            candidates = set(doc_id for doc_id in candidates if self.places[doc_id] in place_ids)
+
+        k1, b = self.k1, self.b
+        average_length = self.total_length / len(self.lengths)
+        weights = [(self.postings[token], self.idf(token)) for token in tokens]
+        scores = {}
+        for doc_id in candidates:
+            norm = k1 * (1 - b + b * self.lengths[doc_id] / average_length)
+            score = 0.0
+            for posting, idf in weights:
+                frequency = posting[doc_id]
+                score += idf * frequency * (k1 + 1) / (frequency + norm)
+            scores[doc_id] = score
+        rank = lambda doc_id: (scores[doc_id], doc_id)
+        if limit is not None:
+            return heapq.nlargest(limit, scores, key=rank)
+        return sorted(scores, key=rank, reverse=True)
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    ''' Keeps an InvertedIndex of the active jobs in every process. The index
+        is loaded lazily on the first search. Saved and deleted jobs are
+        published as a numbered change log in the DJOBBERBASE_SEARCH_CACHE
+        cache, every process replays the changes it has not seen yet before
+        searching. Bumping the generation forces a full reload everywhere.
+    '''
+    field_weights = (
+        ('title', 3),
+        ('category__name', 2),
+        ('jobtype__name', 2),
+        ('description', 1),
+    )
+    max_replayed_changes = 1000
+
+    def __init__(self):
+        self.cache = caches[djobberbase_settings.DJOBBERBASE_SEARCH_CACHE]
+        self.lock = threading.RLock()
+        self.inverted_index = None
+        self.generation = None
+        self.sequence = 0
+
+    def document(self, row):
+        for (field, weight), value in zip(self.field_weights, row):
+            for token in tokenize(value):
+                yield token, weight
+
+    def rows(self, jobs):
+        fields = [field for field, weight in self.field_weights]
+        return jobs.values_list('pk', 'place_id', *fields)
+
+    def add_rows(self, inverted_index, rows):
+        for row in rows:
+            inverted_index.add(row[0], self.document(row[2:]), place_id=row[1])
+
+    def build(self, chunk_size=djobberbase_settings.DJOBBERBASE_SEARCH_INDEX_CHUNK_SIZE):
+        inverted_index = InvertedIndex()
+        last_pk = 0
+        while True:
+            rows = list(self.rows(Job.active.filter(pk__gt=last_pk).order_by('pk'))[:chunk_size])
+            if not rows:
+                break
+            self.add_rows(inverted_index, rows)
+            last_pk = rows[-1][0]
+        return inverted_index
+
+    def replay(self, job_ids):
+        rows = list(self.rows(Job.active.filter(pk__in=job_ids)))
+        for job_id in set(job_ids) - set(row[0] for row in rows):
+            self.inverted_index.discard(job_id)
+        self.add_rows(self.inverted_index, rows)
+
+    def sync(self):
+        ''' Brings the local index up to date with the shared change log. '''
+        state = self.cache.get_many([GENERATION_KEY, SEQUENCE_KEY])
+        generation = state.get(GENERATION_KEY)
+        sequence = state.get(SEQUENCE_KEY) or 0
+        if self.inverted_index is not None and generation == self.generation:
+            if sequence <= self.sequence:
+                return
+            if sequence - self.sequence <= self.max_replayed_changes:
+                keys = [CHANGE_KEY.format(n) for n in range(self.sequence + 1, sequence + 1)]
+                changes = self.cache.get_many(keys)
+                if len(changes) == len(keys):
+                    self.replay(set(changes.values()))
+                    self.sequence = sequence
+                    return
+        # First use, a new generation or a change log we cannot replay.
+        self.inverted_index = self.build()
+        self.generation = generation
+        self.sequence = sequence
+
+    def publish(self, job_id):
+        self.cache.add(SEQUENCE_KEY, 0, None)
+        sequence = self.cache.incr(SEQUENCE_KEY)
+        self.cache.set(CHANGE_KEY.format(sequence), job_id)
+
+    def search(self, query_string, place=''):
+        groups = self.parse(query_string)
+        if not groups:
+            return RankedJobList([])
+        place_ids = self.get_place_ids(place) if place else None
+        with self.lock:
+            self.sync()
+            ids = self.inverted_index.search(groups, place_ids=place_ids)
+        return RankedJobList(ids)
+
+    def index(self, job):
+        self.publish(job.pk)
+
+    def remove(self, job_id):
+        self.publish(job_id)
+
+    def rebuild(self, chunk_size=djobberbase_settings.DJOBBERBASE_SEARCH_INDEX_CHUNK_SIZE):
+        ''' Starts a new index generation, which makes every process reload its
+            index on the next search, and builds the local one right away.
+        '''
+        with self.lock:
+            self.generation = uuid.uuid4().hex
+            self.sequence = self.cache.get(SEQUENCE_KEY) or 0
+            self.inverted_index = self.build(chunk_size=chunk_size)
+            self.cache.set(GENERATION_KEY, self.generation, None)
+        return len(self.inverted_index)
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+from djobberbase.helpers import get_query
+from djobberbase.models import Job
+from djobberbase.search.base import BaseSearchBackend, JOB_RELATED
+
+
+class IcontainsBackend(BaseSearchBackend):
+    ''' The original search: every term is looked up with icontains on the
+        title and description and with an exact match on the category and job
+        type names. It needs no index but scans the whole job table.
+    '''
+    search_fields = ['title', 'description', 'category', 'jobtype']
+
+    def search(self, query_string, place=''):
+        entry_query = get_query(query_string, search_fields=self.search_fields)
+        if entry_query is None:
+            return Job.objects.none()
+        jobs = Job.active.filter(entry_query)
+        if place:
+            jobs = jobs.filter(place__name__iexact=place.strip())
+        return jobs.select_related(*JOB_RELATED).order_by('-created_on')
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from djobberbase import search
+from djobberbase.autocomplete import autocomplete
+from djobberbase.cache import RELATED, result_cache
+from djobberbase.counters import job_state, update_job_counts
+from djobberbase.models import Category, Company, Job, Place, Type
+from djobberbase.trees import trees
+
+AUTOCOMPLETE_MODELS = (Category, Place, Type)
+
+# Cached job lists show the names of these
+RELATED_MODELS = (Category, Company, Place, Type)
+
+
+def update_autocomplete(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: autocomplete.changed(instance))
+
+
+def remove_from_autocomplete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: autocomplete.deleted(instance))
+
+
+def invalidate_job_lists(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: result_cache.invalidate([(RELATED, None)]))
+
+
+@receiver(post_delete, sender=Job)
+def update_job_counts_on_delete(sender, instance, **kwargs):
+    # Also covers the jobs deleted along with their company or place
+    update_job_counts([(job_state(instance.__dict__), None)])
+
+
+def invalidate_tree(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: trees.invalidate(sender))
+
+
+def reindex_renamed(sender, instance, created=False, raw=False, **kwargs):
+    ''' Reindexes the active jobs whose search documents hold the name of a
+        renamed category, job type or place, a place name being in the
+        documents of the jobs of the places within too.
+    '''
+    loaded = getattr(instance, '_loaded_values', {})
+    if created or raw or loaded.get('name', instance.name) == instance.name:
+        return
+    instance._loaded_values = dict(loaded, name=instance.name)
+    if sender is Place:
+        jobs = Job.active.filter(place__path__startswith=instance.path)
+    elif sender is Category:
+        jobs = Job.active.filter(category=instance)
+    else:
+        jobs = Job.active.filter(jobtype=instance)
+    transaction.on_commit(lambda: search.reindex_jobs(jobs))
+
+
+# Connected to the models they handle only, so that deleting other models,
+# like moderation events, needs no signal and is done with a single query
+for model in AUTOCOMPLETE_MODELS:
+    post_save.connect(update_autocomplete, sender=model)
+    post_delete.connect(remove_from_autocomplete, sender=model)
+for model in RELATED_MODELS:
+    post_save.connect(invalidate_job_lists, sender=model)
+    post_delete.connect(invalidate_job_lists, sender=model)
+for model in (Category, Place):
+    post_save.connect(invalidate_tree, sender=model)
+    post_delete.connect(invalidate_tree, sender=model)
+# After invalidate_tree, so that the place names are read from the new tree
+for model in (Category, Place, Type):
+    post_save.connect(reindex_renamed, sender=model)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import os
+from xml.sax.saxutils import escape
+
+from django.contrib.sites.models import Site
+from django.db.models import Count, Max
+from django.urls import reverse
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.models import Category, Company, Job, Place
+
+JOBS = 'jobs'
+CATEGORIES = 'categories'
+PLACES = 'places'
+COMPANIES = 'companies'
+
+INDEX_FILE = 'sitemap.xml'
+STATE_FILE = 'sitemap-jobs.json'
+CHUNK_SIZE = 2000
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+class SitemapWriter:
+    ''' Writes the sitemaps of the board as gzipped files of at most
+        DJOBBERBASE_SITEMAP_SHARD_SIZE URLs and a sitemap index listing them.
+
+        The job URLs are sharded by ranges of job ids, so a job always lands
+        in the same shard. The count and latest modification of the active
+        jobs of each shard are kept in a state file, and only the shards
+        whose jobs were added, changed, deactivated or deleted since the
+        previous run are written again. The jobs are streamed in chunks and
+        never all loaded at once. The category, place and company sitemaps
+        are small and written on every run.
+    '''
+
+    def __init__(self, root=None, base_url=None, shard_size=None):
+        self.root = root or djobberbase_settings.DJOBBERBASE_SITEMAP_ROOT
+        self.shard_size = shard_size or djobberbase_settings.DJOBBERBASE_SITEMAP_SHARD_SIZE
+        self.domain = 'http://{}'.format(Site.objects.get_current().domain)
+        base_url = base_url or djobberbase_settings.DJOBBERBASE_SITEMAP_URL
+        self.base_url = self.domain + base_url if base_url.startswith('/') else base_url
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def shard_name(self, section, number):
+        return 'sitemap-{}-{}.xml.gz'.format(section, number)
+
+    def write_file(self, name, lines, compress=True):
+        ''' Writes the lines to a temporary file first, the web server keeps
+            serving the previous version until it is complete.
+        '''
+        temporary = self.path('{}.{}.tmp'.format(name, os.getpid()))
+        with (gzip.open(temporary, 'wt', encoding='utf-8') if compress
+              else open(temporary, 'w', encoding='utf-8')) as f:
+            f.writelines(lines)
+        os.replace(temporary, self.path(name))
+
+    def urlset(self, urls):
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{}">\n'.format(XMLNS)
+        for location, lastmod in urls:
+            if lastmod:
+                yield '<url><loc>{}</loc><lastmod>{}</lastmod></url>\n'.format(
+                    escape(self.domain + location), lastmod.strftime('%Y-%m-%d'))
+            else:
+                yield '<url><loc>{}</loc></url>\n'.format(escape(self.domain + location))
+        yield '</urlset>\n'
+
+    def job_urls(self, low, high):
+        ''' Yields the URLs of the active jobs with ids in [low, high), reading
+            CHUNK_SIZE of them at a time.
+        '''
+        jobs = Job.active.filter(pk__lt=high).order_by('pk').values_list(
+            'pk', 'slug', 'company__admin__username', 'modified_on')
+        last = low - 1
+        while True:
+            count = 0
+            for pk, slug, company, modified_on in jobs.filter(pk__gt=last)[:CHUNK_SIZE].iterator():
+                count += 1
+                last = pk
+                yield reverse('djobberbase:job_detail', kwargs={'company': company, 'title_slug': slug, 'pk': pk}), \
+                    modified_on
+            if count < CHUNK_SIZE:
+                break
+
+    def job_shards(self):
+        ''' Returns the {shard number: [active jobs, latest modification]} of
+            the shards that have active jobs.
+        '''
+        top = Job.objects.aggregate(top=Max('pk'))['top'] or 0
+        shards = {}
+        for number in range(top // self.shard_size + 1):
+            low = number * self.shard_size
+            stats = Job.active.filter(pk__gte=low, pk__lt=low + self.shard_size).aggregate(
+                count=Count('pk'), lastmod=Max('modified_on'))
+            if stats['count']:
+                shards[number] = [stats['count'], stats['lastmod'].isoformat()]
+        return shards
+
+    def read_state(self):
+        try:
+            with open(self.path(STATE_FILE)) as f:
+                return dict((int(number), shard) for number, shard in json.load(f).items())
+        except (OSError, ValueError):
+            return {}
+
+    def write_jobs(self, full=False):
+        ''' Writes the job shards that changed since the previous run and
+            removes the ones without active jobs left. Returns the shard
+            numbers and the list of the written ones.
+        '''
+        previous = {} if full else self.read_state()
+        shards = self.job_shards()
+        written = []
+        for number, shard in sorted(shards.items()):
+            if previous.get(number) != shard or not os.path.exists(self.path(self.shard_name(JOBS, number))):
+                low = number * self.shard_size
+                self.write_file(self.shard_name(JOBS, number), self.urlset(self.job_urls(low, low + self.shard_size)))
+                written.append(number)
+        for number in set(previous) - set(shards):
+            if os.path.exists(self.path(self.shard_name(JOBS, number))):
+                os.remove(self.path(self.shard_name(JOBS, number)))
+        self.write_file(STATE_FILE, [json.dumps(shards, sort_keys=True)], compress=False)
+        return shards, written
+
+    def section_urls(self, section):
+        if section == CATEGORIES:
+            for slug, in Category.objects.order_by('pk').values_list('slug').iterator():
+                yield reverse('djobberbase:category', kwargs={'slug': slug}), None
+        elif section == PLACES:
+            places = Place.objects.filter(job_count__gt=0).order_by('pk').values_list('pk', 'slug')
+            for pk, slug in places.iterator():
+                yield reverse('djobberbase:place', kwargs={'slug': slug, 'pk': pk}), None
+        elif section == COMPANIES:
+            companies = Company.objects.filter(jobs__is_active=True).order_by('pk').values_list(
+                'admin__username').distinct()
+            for username, in companies.iterator():
+                yield reverse('djobberbase:company_jobs', kwargs={'company': username}), None
+
+    def write_section(self, section):
+        ''' Writes a small section, DJOBBERBASE_SITEMAP_SHARD_SIZE URLs per
+            file, and returns the number of files.
+        '''
+        number = 0
+        urls = []
+        for url in self.section_urls(section):
+            urls.append(url)
+            if len(urls) == self.shard_size:
+                self.write_file(self.shard_name(section, number), self.urlset(urls))
+                number, urls = number + 1, []
+        if urls or not number:
+            self.write_file(self.shard_name(section, number), self.urlset(urls))
+            number += 1
+        return number
+
+    def write(self, full=False):
+        ''' Writes the sitemaps and their index. Returns the numbers of the
+            job shards written again and the number of files in the index.
+        '''
+        os.makedirs(self.root, exist_ok=True)
+        shards, written = self.write_jobs(full)
+        files = [(self.shard_name(JOBS, number), lastmod) for number, (count, lastmod) in sorted(shards.items())]
+        for section in (CATEGORIES, PLACES, COMPANIES):
+            files.extend((self.shard_name(section, number), None) for number in range(self.write_section(section)))
+        index = ['<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{}">\n'.format(XMLNS)]
+        for name, lastmod in files:
+            index.append('<sitemap><loc>{}</loc>{}</sitemap>\n'.format(
+                escape(self.base_url + name), '<lastmod>{}</lastmod>'.format(lastmod) if lastmod else ''))
+        index.append('</sitemapindex>\n')
+        self.write_file(INDEX_FILE, index, compress=False)
+        return written, len(files)
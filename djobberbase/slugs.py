@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Length
+
+SUFFIX_LENGTH = 6
+MAX_ATTEMPTS = 5
+
+
+def slug_base(slug, max_length):
+    ''' Truncates a slug so that a "-<number>" suffix always fits. '''
+    return slug[:max_length - SUFFIX_LENGTH].strip('-') or slug[:max_length - SUFFIX_LENGTH]
+
+
+def next_free_slug(queryset, slug, max_length):
+    ''' Returns slug if no object of the queryset uses it, or else the slug with
+        the next free numeric suffix. It takes a single query on the slug index,
+        which reads the plain slug first if it is taken, then the longest and
+        greatest of the matching slugs, the one with the highest suffix.
+
+        >>> next_free_slug(Place.objects.filter(parent_path=''), 'london', 50)
+        'london-3'
+    '''
+    base = slug_base(slug, max_length)
+    taken = list(queryset.filter(slug__startswith=base, slug__regex=r'^{}(-[0-9]+)?$'.format(re.escape(base)))
+                 .annotate(plain=Case(When(slug=base, then=Value(1)), default=Value(0), output_field=IntegerField()),
+                           slug_length=Length('slug'))
+                 .order_by('-plain', '-slug_length', '-slug').values_list('slug', flat=True)[:2])
+    if not taken or taken[0] != base:
+        return base
+    suffix = taken[1][len(base) + 1:] if len(taken) > 1 else ''
+    return '{}-{}'.format(base, int(suffix) + 1 if suffix else 2)
+
+
+def save_with_unique_slug(instance, save, slug, scope):
+    ''' Allocates a free slug for instance within the scope queryset and saves
+        it with save(). The database uniqueness constraint settles concurrent
+        allocations: when another worker took the same slug in the meantime,
+        the next free one is allocated and the save retried.
+    '''
+    max_length = instance._meta.get_field('slug').max_length
+    for attempt in range(MAX_ATTEMPTS):
+        instance.slug = next_free_slug(scope, slug, max_length)
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS - 1 or not scope.filter(slug=instance.slug).exists():
+                raise
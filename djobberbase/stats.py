@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import threading
+from collections import Counter
+from time import sleep, time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from djobberbase.conf import settings as djobberbase_settings
+from djobberbase.hll import HyperLogLog
+from djobberbase.leaderboards import record_stats
+from djobberbase.models import JobStat, JobStatDaily, JobVisitors
+
+MEMORY = 'memory'
+SEQUENCE_KEY = 'djobberbase:stats:sequence'
+FLUSHED_KEY = 'djobberbase:stats:flushed'
+FLUSHED_ON_KEY = 'djobberbase:stats:flushed_on'
+LOCK_KEY = 'djobberbase:stats:lock'
+GAP_KEY = 'djobberbase:stats:gap'
+# Seconds a numbered stat missing from the shared buffer is waited for, it is
+# lost when the process numbering it died before storing it
+GAP_GRACE = 60
+# Applications are written right away, so that the application counts of the
+# jobs are exact
+WRITE_THROUGH = (JobStat.APPLICATION,)
+
+
+def event_key(number):
+    return 'djobberbase:stats:event:{}'.format(number)
+
+
+def write_stats(events):
+    ''' Inserts (job id, job title, stat type, ip, submitter id, created on)
+        events with a single bulk_create and adds them to the leaderboards.
+    '''
+    with transaction.atomic():
+        JobStat.objects.bulk_create([
+            JobStat(job_id=job_id, stat_type=stat_type, ip=ip, submitter_id=submitter_id, created_on=created_on,
+                    description=JobStat.describe(job_id, title, stat_type, ip))
+            for job_id, title, stat_type, ip, submitter_id, created_on in events])
+        record_stats((job_id, stat_type, created_on) for job_id, title, stat_type, ip, submitter_id, created_on in events)
+    return len(events)
+
+
+def write_visitors(sketches):
+    ''' Merges {(job id, day): HyperLogLog} sketches into the stored ones. '''
+    for (job_id, day), sketch in sketches.items():
+        with transaction.atomic():
+            visitors, created = JobVisitors.objects.select_for_update().get_or_create(
+                job_id=job_id, day=day, defaults={'sketch': sketch.to_bytes()})
+            if not created:
+                visitors.sketch = HyperLogLog.from_bytes(visitors.sketch).merge(sketch).to_bytes()
+                visitors.save(update_fields=['sketch'])
+
+
+def today():
+    return timezone.localtime(timezone.now()).date()
+
+
+class StatsBuffer:
+    ''' Collects the hits and spam reports of the jobs and writes them in
+        bulk instead of inserting a row on every job view.
+
+        With DJOBBERBASE_STATS_BUFFER = 'memory' each process keeps its own
+        buffer, flushed by a background thread every
+        DJOBBERBASE_STATS_FLUSH_INTERVAL seconds, as soon as it holds
+        DJOBBERBASE_STATS_BUFFER_SIZE stats and when the process exits.
+        With the name of a cache, all the processes share a buffer in that
+        cache which is flushed on the same thresholds by whichever process
+        crosses them and by the flush_job_stats command. None writes every
+        stat right away.
+
+        The clients visiting each job are also counted per day in
+        HyperLogLog sketches, kept in the memory of each process until the
+        buffer is flushed and then merged into the stored sketches.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.sketches = {}
+        self.thread = None
+        self.flushed_on = time()
+        self.flushed = 0
+        self.last_flush_size = 0
+        self.last_flush_latency = None
+
+    @property
+    def mode(self):
+        return djobberbase_settings.DJOBBERBASE_STATS_BUFFER
+
+    @property
+    def cache(self):
+        return caches[self.mode]
+
+    def record(self, job, stat_type, ip=None, submitter=None):
+        event = (job.pk, job.title, stat_type, ip or None, submitter.pk if submitter else None, timezone.now())
+        if self.mode is None or stat_type in WRITE_THROUGH:
+            write_stats([event])
+        elif self.mode == MEMORY:
+            self.push(event)
+        else:
+            self.push_shared(event)
+
+    def record_visitor(self, job, client):
+        ''' Adds a client to the unique visitors of a job today. '''
+        if self.mode is None:
+            sketch = HyperLogLog(djobberbase_settings.DJOBBERBASE_VISITORS_PRECISION)
+            sketch.add(client)
+            write_visitors({(job.pk, today()): sketch})
+            return
+        with self.lock:
+            key = (job.pk, today())
+            if key not in self.sketches:
+                self.sketches[key] = HyperLogLog(djobberbase_settings.DJOBBERBASE_VISITORS_PRECISION)
+            self.sketches[key].add(client)
+            self.start()
+
+    def push(self, event):
+        with self.lock:
+            self.events.append(event)
+            full = len(self.events) >= djobberbase_settings.DJOBBERBASE_STATS_BUFFER_SIZE
+            self.start()
+        if full:
+            self.flush()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='djobberbase-stats', daemon=True)
+            self.thread.start()
+
+    def push_shared(self, event):
+        self.cache.add(SEQUENCE_KEY, 0, None)
+        number = self.cache.incr(SEQUENCE_KEY)
+        self.cache.set(event_key(number), event, None)
+        flushed_on = self.cache.get(FLUSHED_ON_KEY) or 0
+        if (number - (self.cache.get(FLUSHED_KEY) or 0) >= djobberbase_settings.DJOBBERBASE_STATS_BUFFER_SIZE or
+                time() - flushed_on >= djobberbase_settings.DJOBBERBASE_STATS_FLUSH_INTERVAL):
+            self.flush()
+
+    def run(self):
+        while True:
+            sleep(djobberbase_settings.DJOBBERBASE_STATS_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        ''' Writes the buffered stats and returns their number. '''
+        start = time()
+        with self.lock:
+            sketches, self.sketches = self.sketches, {}
+        if sketches:
+            write_visitors(sketches)
+        if self.mode == MEMORY:
+            with self.lock:
+                events, self.events = self.events, []
+            written = write_stats(events) if events else 0
+        elif self.mode is not None:
+            written = self.flush_shared()
+        else:
+            written = 0
+        self.flushed_on = time()
+        if written:
+            self.flushed += written
+            self.last_flush_size = written
+            self.last_flush_latency = self.flushed_on - start
+        return written
+
+    def flush_shared(self):
+        # Only one process flushes the shared buffer at a time
+        if not self.cache.add(LOCK_KEY, 1, 60):
+            return 0
+        try:
+            self.cache.set(FLUSHED_ON_KEY, time(), None)
+            first, last = (self.cache.get(FLUSHED_KEY) or 0) + 1, self.cache.get(SEQUENCE_KEY) or 0
+            written = 0
+            chunk_size = djobberbase_settings.DJOBBERBASE_STATS_BUFFER_SIZE
+            for start in range(first, last + 1, chunk_size):
+                keys = [event_key(number) for number in range(start, min(start + chunk_size, last + 1))]
+                events = self.cache.get_many(keys)
+                # A process numbers its stat before storing it, the flush stops
+                # at the first one not stored yet
+                flushable = next((position for position, key in enumerate(keys)
+                                  if key not in events and not self.gap_expired(start + position)), len(keys))
+                if flushable:
+                    written += write_stats([events[key] for key in keys[:flushable] if key in events])
+                    self.cache.set(FLUSHED_KEY, start + flushable - 1, None)
+                    self.cache.delete_many(keys[:flushable])
+                if flushable < len(keys):
+                    break
+            return written
+        finally:
+            self.cache.delete(LOCK_KEY)
+
+    def gap_expired(self, number):
+        ''' Whether the stat of a number has been missing for GAP_GRACE
+            seconds already.
+        '''
+        gap = self.cache.get(GAP_KEY)
+        if gap is None or gap[0] != number:
+            self.cache.set(GAP_KEY, (number, time()), None)
+            return False
+        return time() - gap[1] >= GAP_GRACE
+
+    def depth(self):
+        ''' The number of stats waiting to be written. '''
+        if self.mode == MEMORY:
+            return len(self.events)
+        if self.mode is None:
+            return 0
+        return (self.cache.get(SEQUENCE_KEY) or 0) - (self.cache.get(FLUSHED_KEY) or 0)
+
+    def stats(self):
+        return {'depth': self.depth(), 'sketches': len(self.sketches), 'flushed': self.flushed,
+                'last_flush_size': self.last_flush_size, 'last_flush_latency': self.last_flush_latency}
+
+    def unique_visitors(self, job_id, sketches=None, since=None):
+        ''' Estimates the number of distinct clients who visited a job, since a
+            day or ever. The stored sketches can be given when they were
+            already loaded, as by prefetch_related('visitor_sketches').
+        '''
+        if sketches is None:
+            sketches = JobVisitors.objects.filter(job_id=job_id)
+            if since is not None:
+                sketches = sketches.filter(day__gte=since)
+            sketches = sketches.values_list('sketch', flat=True)
+        else:
+            sketches = [visitors.sketch for visitors in sketches if since is None or visitors.day >= since]
+        total = HyperLogLog(djobberbase_settings.DJOBBERBASE_VISITORS_PRECISION)
+        for sketch in sketches:
+            total.merge(HyperLogLog.from_bytes(sketch))
+        with self.lock:
+            pending = [sketch for (pk, day), sketch in self.sketches.items()
+                       if pk == job_id and (since is None or day >= since)]
+        for sketch in pending:
+            total.merge(sketch)
+        return total.estimate()
+
+
+def count_stats(stat_type, job_ids=None):
+    ''' Returns a Counter of the stats of a type per job id: the daily rollups
+        of the compacted stats plus the raw stats of the last days.
+    '''
+    daily = JobStatDaily.objects.filter(stat_type=stat_type)
+    raw = JobStat.objects.filter(stat_type=stat_type)
+    if job_ids is not None:
+        daily, raw = daily.filter(job_id__in=job_ids), raw.filter(job_id__in=job_ids)
+    counts = Counter(dict(daily.values_list('job_id').annotate(Sum('count')).order_by()))
+    counts.update(dict(raw.values_list('job_id').annotate(Count('pk')).order_by()))
+    return counts
+
+
+def compact_stats(before, chunk_size=5000):
+    ''' Adds the stats created before a date to their daily rollups and
+        deletes them, chunk_size stats per transaction. Returns the number of
+        stats compacted.
+    '''
+    old = JobStat.objects.filter(created_on__lt=before).order_by('pk')
+    compacted = 0
+    while True:
+        last = old.values_list('pk', flat=True)[chunk_size - 1:chunk_size].first()
+        chunk = old.filter(pk__lte=last) if last is not None else old
+        with transaction.atomic():
+            groups = (chunk.annotate(day=TruncDate('created_on')).values_list('job_id', 'stat_type', 'day')
+                      .annotate(count=Count('pk')).order_by())
+            new = []
+            for job_id, stat_type, day, count in groups:
+                if not JobStatDaily.objects.filter(job_id=job_id, stat_type=stat_type, day=day).update(
+                        count=F('count') + count):
+                    new.append(JobStatDaily(job_id=job_id, stat_type=stat_type, day=day, count=count))
+                compacted += count
+            JobStatDaily.objects.bulk_create(new)
+            chunk.delete()
+        if last is None:
+            return compacted
+
+
+stats_buffer = StatsBuffer()
+atexit.register(stats_buffer.flush)
@@ -1,100 +1,120 @@
-# -*- coding: utf-8 -*-
-
-from django import template
-from djobberbase.models import Job, Category, Type, JobStat, Company
-from django.utils.safestring import mark_safe
-from django.db.models import Count
-import re
-
-# latest jobs template tag
-def do_latest_jobs(parser, token):
-    bits = token.split_contents()
-    if len(bits) != 4:
-        raise template.TemplateSyntaxError("'get_latest_jobs' tag takes exactly four arguments")    
-    return LatestJobsNode(bits[1], bits[3])
-
-class LatestJobsNode(template.Node):
-    def __init__(self, num, varname):
-        self.num = int(num)
-        self.varname = varname
-
-    def render(self, context):
-        context[self.varname] = Job.active.all().select_related('category', 'jobtype', 'place', 'company').order_by('-created_on')[:self.num]
-        return ''
-
-# spotlight jobs template tag
-def do_spotlight_jobs(parser, token):
-    bits = token.split_contents()
-    if len(bits) != 4:
-        raise template.TemplateSyntaxError("'get_spotlight_jobs' tag takes exactly four arguments")
-    return SpotlightJobsNode(bits[1], bits[3])
-
-class SpotlightJobsNode(template.Node):
-    def __init__(self, num, varname):
-        self.num = int(num)
-        self.varname = varname
-
-    def render(self, context):
-        context[self.varname] = Job.active.filter(spotlight=True).select_related('category', 'jobtype', 'place').order_by('-created_on')[:self.num]
-        return ''
-
-#most applied jobs template tag
-def do_most_applied_jobs(parser, token):
-    bits = token.split_contents()
-    if len(bits) != 4:
-        raise template.TemplateSyntaxError("'get_most_applied_jobs' tag takes exactly four arguments")
-    return MostAppliedJobsNode(bits[1], bits[3])
-
-class MostAppliedJobsNode(template.Node):
-    def __init__(self, num, varname):
-        self.num = int(num)
-        self.varname = varname
-
-    def render(self, context):
-        applications = JobStat.objects.filter(stat_type='A').values('job').annotate(Count('job')).order_by('-job__count')[:self.num]
-        jobs = []
-        for application in applications:
-            jobs.append(Job.active.get(pk=application['job']))
-        context[self.varname] = jobs
-        return ''
-
-
-# categories template tag
-def do_categories(parser, token):
-    return CategoriesNode()
-
-class CategoriesNode(template.Node):
-    def render(self, context):
-        context['categories'] = Category.objects.all().annotate(Count('jobs', distinct=True)).order_by('category_order')
-        return ''
-
-def do_jobtypes(parser, token):
-    return JobtypesNode()
-
-class JobtypesNode(template.Node):
-    def render(self, context):
-        context['jobtypes'] = Type.objects.all()
-        return ''
-
-class CompaniesNode(template.Node):
-    def render(self, context):
-        context['companies'] = Company.objects.all().annotate(Count('jobs', distinct=True))
-        return ''
-
-NOFOLLOW_RE = re.compile(u'<a (?![^>]*rel=["\']nofollow[\'"])' \
-                         u'(?![^>]*href=["\']\.{0,2}/[^/])',
-                         re.UNICODE|re.IGNORECASE)
-def nofollow(content):
-    return mark_safe(re.sub(NOFOLLOW_RE, u'<a rel="nofollow" ', content))
-
-def do_companies(parser, toke):
-    return CompaniesNode()
-
-register = template.Library()
-register.tag('get_latest_jobs', do_latest_jobs)
-register.tag('get_spotlight_jobs', do_spotlight_jobs)
-register.tag('get_most_applied_jobs', do_most_applied_jobs)
-register.tag('get_categories', do_categories)
-register.tag('get_jobtypes', do_jobtypes)
-register.tag('get_companies', do_companies)
-register.filter(nofollow)
+# -*- coding: utf-8 -*-
+
+from django import template
+from djobberbase.models import Job, Category, Type, Company, Place
+from djobberbase.leaderboards import MOST_APPLIED, TRENDING, top_jobs
+from djobberbase.trees import trees
+from django.utils.safestring import mark_safe
+from django.db.models import Count
+import re
+
+# latest jobs template tag
+def do_latest_jobs(parser, token):
+    bits = token.split_contents()
+    if len(bits) != 4:
+        raise template.TemplateSyntaxError("'get_latest_jobs' tag takes exactly four arguments")    
+    return LatestJobsNode(bits[1], bits[3])
+
+class LatestJobsNode(template.Node):
+    def __init__(self, num, varname):
+        self.num = int(num)
+        self.varname = varname
+
+    def render(self, context):
+        context[self.varname] = Job.active.all().select_related('category', 'jobtype', 'place', 'company').order_by('-created_on')[:self.num]
+        return ''
+
+# spotlight jobs template tag
+def do_spotlight_jobs(parser, token):
+    bits = token.split_contents()
+    if len(bits) != 4:
+        raise template.TemplateSyntaxError("'get_spotlight_jobs' tag takes exactly four arguments")
+    return SpotlightJobsNode(bits[1], bits[3])
+
+class SpotlightJobsNode(template.Node):
+    def __init__(self, num, varname):
+        self.num = int(num)
+        self.varname = varname
+
+    def render(self, context):
+        context[self.varname] = Job.active.filter(spotlight=True).select_related('category', 'jobtype', 'place').order_by('-created_on')[:self.num]
+        return ''
+
+# leaderboard template tags, e.g. {% get_trending_jobs 5 as jobs for category %}
+def leaderboard_tag(board):
+    def do_leaderboard(parser, token):
+        bits = token.split_contents()
+        if len(bits) not in (4, 6) or bits[2] != 'as' or (len(bits) == 6 and bits[4] != 'for'):
+            raise template.TemplateSyntaxError("'%s' tag takes 'N as name' or 'N as name for category'" % bits[0])
+        return LeaderboardNode(board, bits[1], bits[3], bits[5] if len(bits) == 6 else None)
+    return do_leaderboard
+
+class LeaderboardNode(template.Node):
+    def __init__(self, board, num, varname, category=None):
+        self.board = board
+        self.num = int(num)
+        self.varname = varname
+        self.category = template.Variable(category) if category else None
+
+    def render(self, context):
+        category = self.category.resolve(context) if self.category else None
+        context[self.varname] = top_jobs(self.board, self.num, category)
+        return ''
+
+
+# categories template tag
+def do_categories(parser, token):
+    return CategoriesNode()
+
+class CategoriesNode(template.Node):
+    def render(self, context):
+        context['categories'] = Category.objects.order_by('category_order')
+        return ''
+
+def do_jobtypes(parser, token):
+    return JobtypesNode()
+
+class JobtypesNode(template.Node):
+    def render(self, context):
+        context['jobtypes'] = Type.objects.all()
+        return ''
+
+class CompaniesNode(template.Node):
+    def render(self, context):
+        context['companies'] = Company.objects.all().annotate(Count('jobs', distinct=True))
+        return ''
+
+NOFOLLOW_RE = re.compile(u'<a (?![^>]*rel=["\']nofollow[\'"])' \
+                         u'(?![^>]*href=["\']\.{0,2}/[^/])',
+                         re.UNICODE|re.IGNORECASE)
+def nofollow(content):
+    return mark_safe(re.sub(NOFOLLOW_RE, u'<a rel="nofollow" ', content))
+
+def do_companies(parser, toke):
+    return CompaniesNode()
+
+# tree name filters, they read the tree snapshot instead of the database
+def tree_full_name(model, node):
+    pk = getattr(node, 'pk', node)
+    tree = trees.get(model)
+    if pk not in tree:
+        return ''
+    return model.name_separator.join(tree.names_of(pk))
+
+def place_full_name(place):
+    return tree_full_name(Place, place)
+
+def category_full_name(category):
+    return tree_full_name(Category, category)
+
+register = template.Library()
+register.tag('get_latest_jobs', do_latest_jobs)
+register.tag('get_spotlight_jobs', do_spotlight_jobs)
+register.tag('get_most_applied_jobs', leaderboard_tag(MOST_APPLIED))
+register.tag('get_trending_jobs', leaderboard_tag(TRENDING))
+register.tag('get_categories', do_categories)
+register.tag('get_jobtypes', do_jobtypes)
+register.tag('get_companies', do_companies)
+register.filter(nofollow)
+register.filter(place_full_name)
+register.filter(category_full_name)
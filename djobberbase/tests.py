@@ -1,153 +1,1210 @@
-# -*- coding: utf-8 -*-
-
-import unittest
-from djobberbase.models import Job, Type, Category, Place
-from djobberbase.conf import settings
-from django.test.client import Client
-from django.core.urlresolvers import reverse
-
-class JobTestCase(unittest.TestCase):
-
-    def setUp(self):
-        ''' Set up test objects.
-        '''
-
-        # Creating a set of job categories
-        self.category_1 = Category.objects.create(name='Genetic Engineering')
-        self.category_2 = Category.objects.create(name='Eye Design', 
-                                                            var_name='eyes')
-        self.category_3 = Category.objects.create(name='Bounty Hunting', 
-                                                            category_order=4)
-        self.category_4 = Category.objects.create(name='Origami')
-
-        # Creating a set of job types
-        self.job_type_1 = Type.objects.create(name='Full time', 
-                                                        var_name='fulltime')
-        self.job_type_2 = Type.objects.create(name='Part time')
-        self.job_type_3 = Type.objects.create(name='Freelance')
-
-        # Creating a couple of cities
-        self.city_1 = Place.objects.create(name='Los Angeles',
-                                           ascii_name='la')
-        self.city_2 = Place.objects.create(name='San Francisco')
-
-        # Creating a job
-        self.job_1 = Job.objects.create(category=self.category_1, 
-                jobtype=self.job_type_1, 
-                title='Genetist needed', 
-                description='A new job', 
-                company='Tyrell Corporation', 
-                city=self.city_1, 
-                poster_email='hr@tyrellcorp.com')
-
-        # Creating a job with outside location
-        self.job_2 = Job.objects.create(category=self.category_2, 
-                jobtype=self.job_type_1, 
-                title='WANTED: Eye Designer', 
-                description='Must be able to put up with low temperatures.', 
-                company='Tyrell Corp.', 
-                city=None, 
-                outside_location='Las Vegas', 
-                poster_email='hr@tyrellcorp.com')
-
-        # Set up a Client
-        self.client = Client()
-
-    def tearDown(self):
-        ''' Tear down everything.
-        '''
-        self.category_1.delete()
-        self.category_2.delete()
-        self.category_3.delete()
-        self.category_4.delete()
-        self.job_type_1.delete()
-        self.job_type_2.delete()
-        self.job_type_3.delete()
-        self.city_1.delete()
-        self.city_2.delete()
-        self.job_1.delete()
-        self.job_2.delete()
-        del self.client
-
-    def testSlugs(self):
-        # Test category slugs
-        self.assertEqual(self.category_1.var_name, 'genetic-engineering')
-        self.assertEqual(self.category_2.var_name, 'eyes')
-        self.assertEqual(self.category_3.var_name, 'bounty-hunting')
-        self.assertEqual(self.category_4.var_name, 'origami')
-
-        # Test job type slugs
-        self.assertEqual(self.job_type_1.var_name, 'fulltime')
-        self.assertEqual(self.job_type_2.var_name, 'part-time')
-        self.assertEqual(self.job_type_3.var_name, 'freelance')
-
-        # Test place slugs
-        self.assertEqual(self.city_1.ascii_name, 'la')
-        self.assertEqual(self.city_2.ascii_name, 'san-francisco')
-
-        # Test job slugs
-        self.assertEqual(self.job_1.joburl, 
-          'genetist-needed-'+settings.DJOBBERBASE_AT_URL+'-tyrell-corporation')
-        self.assertEqual(self.job_2.joburl, 
-             'wanted-eye-designer-'+settings.DJOBBERBASE_AT_URL+'-tyrell-corp')
-
-        # Test company slugs
-        self.assertEqual(self.job_1.company_slug, 'tyrell-corporation')
-        self.assertEqual(self.job_2.company_slug, 'tyrell-corp')
-
-    def testCategoryOrder(self):
-        self.assertEqual(self.category_1.category_order, 0)
-        self.assertEqual(self.category_2.category_order, 1)
-        self.assertEqual(self.category_3.category_order, 4)
-        self.assertEqual(self.category_4.category_order, 5)
-
-    def testInitialJobStatus(self):
-        ''' Ensure that initial job status is Job.TEMPORARY.
-        '''
-        self.assertEqual(self.job_1.status, Job.TEMPORARY)
-        self.assertEqual(self.job_2.status, Job.TEMPORARY)
-
-    def testActivateJob(self):
-        ''' Test activation.
-        '''
-        self.job_1.activate()
-        self.assertEqual(self.job_1.status, Job.ACTIVE)
-        self.job_2.activate()
-        self.assertEqual(self.job_2.status, Job.ACTIVE)
-
-    def testDeactivateJob(self):
-        ''' Test deactivation.
-        '''
-        self.job_1.deactivate()
-        self.assertEqual(self.job_1.status, Job.INACTIVE)
-        self.job_2.deactivate()
-        self.assertEqual(self.job_2.status, Job.INACTIVE)
-
-    def testApprovedEmail(self):
-        ''' Activate job_1 and making sure job_2 will be automatically
-            published.
-        '''
-        self.job_1.activate()
-        self.assertEqual(self.job_2.email_published_before, True)
-
-    def testIndexView(self):
-        response = self.client.get(reverse('djobberbase_job_list'))
-        # Check that the response is 200 OK
-        self.failUnlessEqual(response.status_code, 200)
-        # Assert that number of categories is correct
-        self.assertEqual(len(response.context['categories']), 4)
-
-    def testActivateView(self):
-        response = self.client.post(self.job_1.get_activation_url())
-        # Check that the response is 200 OK
-        self.failUnlessEqual(response.status_code, 200)
-        # Assert that job status has been changed
-        self.assertEqual(response.context['page_type'], 'activate')
-
-    def testDeactivateView(self):
-        response = self.client.get(self.job_1.get_deactivation_url())
-        # Check that the response is 200 OK.
-        self.failUnlessEqual(response.status_code, 200)
-        # Assert that job status has been changed
-        self.assertEqual(response.context['page_type'], 'deactivate')
-
+# -*- coding: utf-8 -*-
+
+import unittest
+from djobberbase.models import Job, Type, Category, Place, Company
+from djobberbase.search import get_backend
+from djobberbase.conf import settings
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase
+from django.test.client import Client
+from django.core.urlresolvers import reverse
+
+class JobTestCase(unittest.TestCase):
+
+    def setUp(self):
+        ''' Set up test objects.
+        '''
+
+        # Creating a set of job categories
+        self.category_1 = Category.objects.create(name='Genetic Engineering')
+        self.category_2 = Category.objects.create(name='Eye Design', 
+                                                            var_name='eyes')
+        self.category_3 = Category.objects.create(name='Bounty Hunting', 
+                                                            category_order=4)
+        self.category_4 = Category.objects.create(name='Origami')
+
+        # Creating a set of job types
+        self.job_type_1 = Type.objects.create(name='Full time', 
+                                                        var_name='fulltime')
+        self.job_type_2 = Type.objects.create(name='Part time')
+        self.job_type_3 = Type.objects.create(name='Freelance')
+
+        # Creating a couple of cities
+        self.city_1 = Place.objects.create(name='Los Angeles',
+                                           ascii_name='la')
+        self.city_2 = Place.objects.create(name='San Francisco')
+
+        # Creating a job
+        self.job_1 = Job.objects.create(category=self.category_1, 
+                jobtype=self.job_type_1, 
+                title='Genetist needed', 
+                description='A new job', 
+                company='Tyrell Corporation', 
+                city=self.city_1, 
+                poster_email='hr@tyrellcorp.com')
+
+        # Creating a job with outside location
+        self.job_2 = Job.objects.create(category=self.category_2, 
+                jobtype=self.job_type_1, 
+                title='WANTED: Eye Designer', 
+                description='Must be able to put up with low temperatures.', 
+                company='Tyrell Corp.', 
+                city=None, 
+                outside_location='Las Vegas', 
+                poster_email='hr@tyrellcorp.com')
+
+        # Set up a Client
+        self.client = Client()
+
+    def tearDown(self):
+        ''' Tear down everything.
+        '''
+        self.category_1.delete()
+        self.category_2.delete()
+        self.category_3.delete()
+        self.category_4.delete()
+        self.job_type_1.delete()
+        self.job_type_2.delete()
+        self.job_type_3.delete()
+        self.city_1.delete()
+        self.city_2.delete()
+        self.job_1.delete()
+        self.job_2.delete()
+        del self.client
+
+    def testSlugs(self):
+        # Test category slugs
+        self.assertEqual(self.category_1.var_name, 'genetic-engineering')
+        self.assertEqual(self.category_2.var_name, 'eyes')
+        self.assertEqual(self.category_3.var_name, 'bounty-hunting')
+        self.assertEqual(self.category_4.var_name, 'origami')
+
+        # Test job type slugs
+        self.assertEqual(self.job_type_1.var_name, 'fulltime')
+        self.assertEqual(self.job_type_2.var_name, 'part-time')
+        self.assertEqual(self.job_type_3.var_name, 'freelance')
+
+        # Test place slugs
+        self.assertEqual(self.city_1.ascii_name, 'la')
+        self.assertEqual(self.city_2.ascii_name, 'san-francisco')
+
+        # Test job slugs
+        self.assertEqual(self.job_1.joburl, 
+          'genetist-needed-'+settings.DJOBBERBASE_AT_URL+'-tyrell-corporation')
+        self.assertEqual(self.job_2.joburl, 
+             'wanted-eye-designer-'+settings.DJOBBERBASE_AT_URL+'-tyrell-corp')
+
+        # Test company slugs
+        self.assertEqual(self.job_1.company_slug, 'tyrell-corporation')
+        self.assertEqual(self.job_2.company_slug, 'tyrell-corp')
+
+    def testCategoryOrder(self):
+        self.assertEqual(self.category_1.category_order, 0)
+        self.assertEqual(self.category_2.category_order, 1)
+        self.assertEqual(self.category_3.category_order, 4)
+        self.assertEqual(self.category_4.category_order, 5)
+
+    def testInitialJobStatus(self):
+        ''' Ensure that initial job status is Job.TEMPORARY.
+        '''
+        self.assertEqual(self.job_1.status, Job.TEMPORARY)
+        self.assertEqual(self.job_2.status, Job.TEMPORARY)
+
+    def testActivateJob(self):
+        ''' Test activation.
+        '''
+        self.job_1.activate()
+        self.assertEqual(self.job_1.status, Job.ACTIVE)
+        self.job_2.activate()
+        self.assertEqual(self.job_2.status, Job.ACTIVE)
+
+    def testDeactivateJob(self):
+        ''' Test deactivation.
+        '''
+        self.job_1.deactivate()
+        self.assertEqual(self.job_1.status, Job.INACTIVE)
+        self.job_2.deactivate()
+        self.assertEqual(self.job_2.status, Job.INACTIVE)
+
+    def testApprovedEmail(self):
+        ''' Activate job_1 and making sure job_2 will be automatically
+            published.
+        '''
+        self.job_1.activate()
+        self.assertEqual(self.job_2.email_published_before, True)
+
+    def testIndexView(self):
+        response = self.client.get(reverse('djobberbase_job_list'))
+        # Check that the response is 200 OK
+        self.failUnlessEqual(response.status_code, 200)
+        # Assert that number of categories is correct
+        self.assertEqual(len(response.context['categories']), 4)
+
+    def testActivateView(self):
+        response = self.client.post(self.job_1.get_activation_url())
+        # Check that the response is 200 OK
+        self.failUnlessEqual(response.status_code, 200)
+        # Assert that job status has been changed
+        self.assertEqual(response.context['page_type'], 'activate')
+
+    def testDeactivateView(self):
+        response = self.client.get(self.job_1.get_deactivation_url())
+        # Check that the response is 200 OK.
+        self.failUnlessEqual(response.status_code, 200)
+        # Assert that job status has been changed
+        self.assertEqual(response.context['page_type'], 'deactivate')
+
+
+class InvertedIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from djobberbase.search.inverted import InvertedIndex
+        from djobberbase.search.base import tokenize
+        self.index = InvertedIndex()
+        documents = {
+            1: ('Python developer', 'Django and PostgreSQL'),
+            2: ('Designer', 'Some python scripting'),
+            3: ('Java engineer', 'Spring and Hibernate'),
+        }
+        for doc_id, (title, description) in documents.items():
+            tokens = [(token, 3) for token in tokenize(title)] + [(token, 1) for token in tokenize(description)]
+            self.index.add(doc_id, tokens, place_id=doc_id % 2)
+
+    def testRanking(self):
+        # A match in the title outweighs a match in the description
+        self.assertEqual(self.index.search([['python']]), [1, 2])
+        self.assertEqual(self.index.search([['python'], ['django']]), [1])
+        self.assertEqual(self.index.search([['cobol']]), [])
+
+    def testPlaceFilter(self):
+        self.assertEqual(self.index.search([['python']], place_ids=[0]), [2])
+
+    def testDiscard(self):
+        self.index.discard(1)
+        self.assertEqual(self.index.search([['python']]), [2])
+        self.assertNotIn('django', self.index.postings)
+        self.assertEqual(len(self.index), 2)
+
+
+class DatabaseSearchTestCase(TransactionTestCase):
+    ''' Search indexes are updated once the saving transaction commits. '''
+
+    def setUp(self):
+        company = Company.objects.create(admin=User.objects.create(username='tyrell'), logo='tyrell.png')
+        self.place_1 = Place.add_root(name='Los Angeles')
+        self.place_2 = Place.add_root(name='San Francisco')
+        defaults = {'category': Category.add_root(name='Genetic Engineering'),
+                    'jobtype': Type.objects.create(name='Contract'), 'company': company}
+        self.job_1 = Job.objects.create(title='Python developer', description='Django and PostgreSQL',
+                                        place=self.place_1, **defaults)
+        self.job_2 = Job.objects.create(title='Designer', description='Some python scripting',
+                                        place=self.place_2, **defaults)
+        self.job_3 = Job.objects.create(title='Python tester', description='Inactive',
+                                        place=self.place_1, is_active=False, **defaults)
+        self.backend = get_backend()
+        self.backend.rebuild()
+
+    def testSearch(self):
+        self.assertEqual(list(self.backend.search('python')), [self.job_1, self.job_2])
+        self.assertEqual(list(self.backend.search('"python developer"')), [self.job_1])
+        self.assertEqual(list(self.backend.search('python', place=self.place_2.name)), [self.job_2])
+        self.assertEqual(list(self.backend.search(self.place_2.name)), [self.job_2])
+
+    def testIncrementalUpdates(self):
+        self.job_1.is_active = False
+        self.job_1.save()
+        self.job_3.is_active = True
+        self.job_3.save()
+        self.assertEqual(list(self.backend.search('python')), [self.job_3, self.job_2])
+        self.job_2.delete()
+        self.assertEqual(list(self.backend.search('scripting')), [])
+
+    def testRenames(self):
+        place = Place.objects.get(pk=self.place_1.pk)
+        place.name = 'Hollywood'
+        place.save()
+        self.assertEqual(list(self.backend.search('hollywood')), [self.job_1])
+        self.assertEqual(list(self.backend.search('angeles')), [])
+        jobtype = Type.objects.get(pk=self.job_2.jobtype_id)
+        jobtype.name = 'Freelance'
+        jobtype.save()
+        self.assertCountEqual(self.backend.search('freelance'), [self.job_1, self.job_2])
+        # The jobs of a moved place get the names of its new ancestors
+        Place.objects.get(pk=self.place_2.pk).move(Place.add_root(name='California'), 'last-child')
+        self.assertEqual(list(self.backend.search('california')), [self.job_2])
+
+
+class PrefixIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from djobberbase.autocomplete import PrefixIndex
+        self.index = PrefixIndex(max_items=10)
+        self.index.load([('place', 1, 'California, San Francisco', 'San Francisco', 5),
+                         ('place', 2, 'California, Los Angeles', 'Los Angeles', 8),
+                         ('category', 1, 'Genetic Engineering', None, 3),
+                         ('keyword', 'zurich', 'Zürich', None, 1)])
+
+    def values(self, prefix, **kwargs):
+        return [result['value'] for result in self.index.lookup(prefix, **kwargs)]
+
+    def testLookup(self):
+        # Heavier items come first and every word of a label is a prefix
+        self.assertEqual(self.values('ca'), ['Los Angeles', 'San Francisco'])
+        self.assertEqual(self.values('fran'), ['San Francisco'])
+        self.assertEqual(self.values('eng', kinds=('place',)), [])
+        self.assertEqual(self.values('ZUR'), ['Zürich'])
+
+    def testUpdates(self):
+        self.index.add('place', 1, 'California, San Francisco', 'San Francisco', weight=10)
+        self.assertEqual(self.values('c'), ['San Francisco', 'Los Angeles'])
+        self.index.discard('place', 1)
+        self.assertEqual(self.values('c'), ['Los Angeles'])
+        self.assertEqual(self.values('fran'), [])
+
+
+class AutocompleteTestCase(TransactionTestCase):
+
+    def testKeywords(self):
+        from unittest import mock
+        from django.core.management import call_command
+        from django.utils.six import StringIO
+        from djobberbase.autocomplete import autocomplete
+        from djobberbase.models import JobSearch
+        url = reverse('djobberbase:job_search')
+        self.client.get(url, {'keywords': 'replicant'})
+        self.assertEqual(JobSearch.objects.count(), 0)
+        autocomplete.invalidate()
+        autocomplete.lookup('repl')
+        with mock.patch.multiple(settings, DJOBBERBASE_SAVE_SEARCHES=True, DJOBBERBASE_AUTOCOMPLETE_MIN_SEARCHES=3,
+                                 DJOBBERBASE_AUTOCOMPLETE_REFRESH=0, DJOBBERBASE_RATE_LIMITS={}):
+            for keywords in ['Replicant designer'] * 3 + ['replicant DESIGNER', 'replicant hunter']:
+                self.client.get(url, {'keywords': keywords})
+            # Searches are only suggested once counted, never by the lookups
+            with self.assertNumQueries(0):
+                self.assertEqual(autocomplete.lookup('repl', kinds=('keyword',)), [])
+            JobSearch.objects.filter(keywords='replicant hunter').update(created_on='2000-01-01T00:00:00Z')
+            call_command('prune_searches', stdout=StringIO())
+            self.assertEqual(JobSearch.objects.count(), 4)
+            with self.assertNumQueries(0):
+                self.assertEqual([result['value'] for result in autocomplete.lookup('repl', kinds=('keyword',))],
+                                 ['Replicant designer'])
+
+
+class ResultCacheTestCase(TransactionTestCase):
+    ''' Cached job lists are invalidated by the changes of their jobs only. '''
+
+    def setUp(self):
+        from djobberbase.cache import result_cache
+        result_cache.cache.clear()
+        self.result_cache = result_cache
+        company = Company.objects.create(admin=User.objects.create(username='tyrell'), logo='tyrell.png')
+        self.category_1 = Category.add_root(name='Genetic Engineering')
+        self.category_2 = Category.add_root(name='Eye Design')
+        defaults = {'jobtype': Type.objects.create(name='Contract'), 'company': company,
+                    'place': Place.add_root(name='Los Angeles')}
+        self.job_1 = Job.objects.create(title='Genetist needed', description='Replicants',
+                                        category=self.category_1, **defaults)
+        self.job_2 = Job.objects.create(title='Eye designer', description='Replicants',
+                                        category=self.category_2, **defaults)
+        self.client = Client()
+
+    def jobs(self, url):
+        return list(self.client.get(url).context['object_list'])
+
+    def testInvalidation(self):
+        url = reverse('djobberbase:category', kwargs={'slug': self.category_1.slug})
+        self.assertEqual(self.jobs(url), [self.job_1])
+        self.assertEqual(self.jobs(url), [self.job_1])
+        self.assertEqual(self.result_cache.stats()['hits'], 1)
+        # Another category does not invalidate the list
+        self.job_2.title = 'Eye engineer'
+        self.job_2.save()
+        self.assertEqual(self.jobs(url), [self.job_1])
+        self.assertEqual(self.result_cache.stats()['hits'], 2)
+        # Moving a job updates both the old and the new category
+        self.job_1.category = self.category_2
+        self.job_1.save()
+        self.assertEqual(self.jobs(url), [])
+        self.assertEqual(self.result_cache.stats(), {'hits': 2, 'misses': 2, 'ratio': 0.5})
+
+
+class KeysetPaginatorTestCase(TransactionTestCase):
+
+    def setUp(self):
+        company = Company.objects.create(admin=User.objects.create(username='tyrell'), logo='tyrell.png')
+        defaults = {'category': Category.add_root(name='Genetic Engineering'), 'company': company,
+                    'jobtype': Type.objects.create(name='Contract'), 'place': Place.add_root(name='Los Angeles')}
+        self.jobs = [Job.objects.create(title='Replicant {}'.format(i), description='Nexus', **defaults)
+                     for i in range(5)]
+        # Two jobs posted at the same time are told apart by their id
+        Job.objects.filter(pk=self.jobs[1].pk).update(created_on=self.jobs[2].created_on)
+        self.jobs.reverse()
+
+    def testPages(self):
+        from djobberbase.pagination import KeysetPaginator
+        paginator = KeysetPaginator(Job.active.all(), 2)
+        first = paginator.page()
+        self.assertEqual(list(first), self.jobs[:2])
+        self.assertFalse(first.has_previous())
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(list(second), self.jobs[2:4])
+        last = paginator.page(second.next_cursor)
+        self.assertEqual(list(last), self.jobs[4:])
+        self.assertFalse(last.has_next())
+        self.assertEqual(list(paginator.page(last.previous_cursor)), self.jobs[2:4])
+        self.assertEqual(list(paginator.page(second.previous_cursor)), self.jobs[:2])
+        self.assertEqual(paginator.count, 5)
+
+    def testInvalidCursor(self):
+        from django.core.paginator import InvalidPage
+        from djobberbase.pagination import KeysetPaginator
+        self.assertRaises(InvalidPage, KeysetPaginator(Job.active.all(), 2).page, 'not-a-cursor')
+
+
+class TreeCountersTestCase(TransactionTestCase):
+    ''' Categories and places count their active jobs and the ones below. '''
+
+    def setUp(self):
+        company = Company.objects.create(admin=User.objects.create(username='tyrell'), logo='tyrell.png')
+        self.engineering = Category.add_root(name='Engineering')
+        self.genetics = self.engineering.add_child(name='Genetic Engineering')
+        self.design = Category.add_root(name='Eye Design')
+        self.california = Place.add_root(name='California')
+        self.los_angeles = self.california.add_child(name='Los Angeles')
+        self.job = Job.objects.create(title='Genetist needed', description='Replicants', category=self.genetics,
+                                      place=self.los_angeles, company=company,
+                                      jobtype=Type.objects.create(name='Contract'))
+
+    def counts(self, node):
+        node.refresh_from_db()
+        return node.job_count, node.total_job_count
+
+    def testCounters(self):
+        from djobberbase.counters import recount
+        self.assertEqual(self.counts(self.genetics), (1, 1))
+        self.assertEqual(self.counts(self.engineering), (0, 1))
+        self.assertEqual(self.counts(self.california), (0, 1))
+        self.job.category = self.design
+        self.job.save()
+        self.assertEqual(self.counts(self.engineering), (0, 0))
+        self.assertEqual(self.counts(self.design), (1, 1))
+        Job.objects.filter(pk=self.job.pk).change(is_active=False)
+        self.assertEqual(self.counts(self.design), (0, 0))
+        self.assertEqual(self.counts(self.los_angeles), (0, 0))
+        self.job.refresh_from_db()
+        self.job.switch_activate()
+        self.assertEqual(self.counts(self.california), (0, 1))
+        self.assertEqual(recount(fix=False), [])
+        self.job.delete()
+        self.assertEqual(self.counts(self.california), (0, 0))
+
+
+class TreeSnapshotTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.california = Place.add_root(name='California')
+        self.los_angeles = self.california.add_child(name='Los Angeles')
+        self.nevada = Place.add_root(name='Nevada')
+
+    def testNames(self):
+        places = list(Place.objects.order_by('path'))
+        self.assertEqual(len(places[0].tree), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual([place.full_name for place in places], ['California', 'California, Los Angeles', 'Nevada'])
+            self.assertEqual(places[1].reversed_full_name, 'Los Angeles, California')
+            self.assertEqual(places[1].full_path, 'california/los-angeles')
+
+    def testMove(self):
+        self.los_angeles.move(self.nevada, 'last-child')
+        self.assertEqual(Place.objects.get(pk=self.los_angeles.pk).full_name, 'Nevada, Los Angeles')
+
+
+class ImportPlacesTestCase(TransactionTestCase):
+
+    def importPlaces(self, *rows, **kwargs):
+        import tempfile
+        from django.core.management import call_command
+        from django.utils.six import StringIO
+        stdout = StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.tsv') as f:
+            f.write(kwargs.get('header', 'id\tname\tparent_id\tfeature_code\n'))
+            f.write(''.join('\t'.join(row) + '\n' for row in rows))
+            f.flush()
+            call_command('import_places', f.name, stdout=stdout, chunk_size=kwargs.get('chunk_size', 2000))
+        return stdout.getvalue()
+
+    def testImport(self):
+        # Children may come before their parent
+        self.importPlaces(('3', 'Springfield', '2', 'PPL'), ('2', 'Illinois', '1', 'ADM1'),
+                          ('1', 'United States', '', 'PCLI'), ('4', 'Springfield', '2', 'PPL'))
+        springfields = Place.objects.filter(name='Springfield').order_by('external_id')
+        self.assertEqual([place.slug for place in springfields], ['springfield', 'springfield-2'])
+        self.assertEqual(springfields[0].full_name, 'United States, Illinois, Springfield')
+        self.assertEqual(springfields[0].place_type, Place.CITY)
+        self.assertEqual(Place.objects.get(external_id='2').numchild, 2)
+        self.importPlaces(('4', 'Shelbyville', '2', 'PPL'), ('5', 'Capital City', '2', 'PPL'))
+        self.assertEqual(Place.objects.get(external_id='4').name, 'Shelbyville')
+        self.assertEqual(Place.objects.get(external_id='2').numchild, 3)
+        self.assertEqual(Place.objects.count(), 5)
+
+    def testRepeatedAndInvalid(self):
+        header = 'id\tname\tparent_id\tplace_type\n'
+        output = self.importPlaces(('1', 'United States', '', '2'), ('2', 'Illinois', '1', 'x'),
+                                   ('3', 'Springfield', '1', '99'), ('4', 'Shelbyville', '1', '6'),
+                                   ('4', 'Springfield', '1', '6'), header=header)
+        self.assertIn('2 invalid', output)
+        self.assertEqual(Place.objects.get(external_id='4').name, 'Springfield')
+        self.assertFalse(Place.objects.filter(external_id__in=('2', '3')).exists())
+        # Repeated after the place was written, with one UPDATE for the changed places
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            output = self.importPlaces(('5', 'Capital City', '1', '6'), ('4', 'Ogdenville', '1', '6'),
+                                       ('1', 'USA', '', '2'), ('5', 'North Haverbrook', '1', '6'), header=header)
+        self.assertIn('1 created, 3 updated', output)
+        self.assertEqual(sorted(Place.objects.filter(external_id__in=('1', '4', '5')).values_list('name', flat=True)),
+                         ['North Haverbrook', 'Ogdenville', 'USA'])
+        self.assertEqual(len([query for query in queries.captured_queries
+                              if query['sql'].startswith('UPDATE') and 'CASE' in query['sql']]), 1)
+        self.importPlaces(('6', 'Brockway', '1', '6'), ('6', 'Cypress Creek', '1', '6'), header=header, chunk_size=1)
+        self.assertEqual(Place.objects.get(external_id='6').name, 'Cypress Creek')
+
+
+class UniqueSlugTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.illinois = Place.add_root(name='Illinois')
+        self.oregon = Place.add_root(name='Oregon')
+
+    def testSiblings(self):
+        slugs = [self.illinois.add_child(name='Springfield').slug for i in range(3)]
+        self.assertEqual(slugs, ['springfield', 'springfield-2', 'springfield-3'])
+        self.assertEqual(self.oregon.add_child(name='Springfield').slug, 'springfield')
+        with self.assertNumQueries(1):
+            from djobberbase.slugs import next_free_slug
+            self.assertEqual(next_free_slug(Place.objects.filter(parent_path=self.illinois.path), 'springfield', 50),
+                             'springfield-4')
+        # The plain slug is free again
+        Place.objects.filter(parent_path=self.illinois.path, slug='springfield').delete()
+        self.assertEqual(self.illinois.add_child(name='Springfield').slug, 'springfield')
+
+    def testMove(self):
+        self.illinois.add_child(name='Springfield')
+        springfield = Place.objects.get(pk=self.oregon.add_child(name='Springfield').pk)
+        springfield.move(self.illinois, 'last-child')
+        springfield.refresh_from_db()
+        self.assertEqual((springfield.slug, springfield.parent_path), ('springfield-2', self.illinois.path))
+
+    def testRetry(self):
+        from unittest import mock
+        from django.db import IntegrityError
+        from djobberbase import slugs
+        self.illinois.add_child(name='Springfield')
+        # Another worker took the slug between the lookup and the insert
+        lookups = [lambda *args: 'springfield', slugs.next_free_slug]
+        with mock.patch('djobberbase.slugs.next_free_slug', side_effect=lambda *args: lookups.pop(0)(*args)):
+            self.assertEqual(self.illinois.add_child(name='Springfield').slug, 'springfield-2')
+        with self.assertRaises(IntegrityError):
+            self.illinois.add_child(name='Other', slug='springfield')
+
+
+class StatsBufferTestCase(TransactionTestCase):
+
+    def setUp(self):
+        from djobberbase.models import JobStat
+        company = Company.objects.create(admin=User.objects.create(username='acme'), logo='acme.png')
+        self.job = Job.objects.create(title='Coyote', description='Catch it', category=Category.add_root(name='Hunting'),
+                                      place=Place.add_root(name='Desert'), company=company,
+                                      jobtype=Type.objects.create(name='Contract'))
+        self.stats = JobStat.objects.filter(job=self.job)
+
+    def record(self, count):
+        from djobberbase.models import JobStat
+        from djobberbase.stats import StatsBuffer
+        buffer = StatsBuffer()
+        for i in range(count):
+            buffer.record(self.job, JobStat.HIT, '10.0.0.1')
+        return buffer
+
+    def testMemory(self):
+        from unittest import mock
+        with mock.patch.multiple(settings, DJOBBERBASE_STATS_BUFFER='memory', DJOBBERBASE_STATS_BUFFER_SIZE=3):
+            buffer = self.record(4)
+            self.assertEqual((self.stats.count(), buffer.depth()), (3, 1))
+            self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer.stats()['flushed'], 4)
+        self.assertEqual(self.stats.first().description, 'Visit for [{}]Coyote from IP: 10.0.0.1'.format(self.job.pk))
+
+    def testSharedCache(self):
+        from unittest import mock
+        with mock.patch.multiple(settings, DJOBBERBASE_STATS_BUFFER='default', DJOBBERBASE_STATS_BUFFER_SIZE=100,
+                                 DJOBBERBASE_STATS_FLUSH_INTERVAL=3600):
+            self.record(1).flush()
+            buffer = self.record(5)
+            self.assertEqual((self.stats.count(), buffer.depth()), (1, 5))
+            self.assertEqual(self.record(0).flush(), 5)
+            self.assertEqual(buffer.depth(), 0)
+        self.assertEqual(self.stats.count(), 6)
+
+    def testSharedCacheGaps(self):
+        from time import time
+        from unittest import mock
+        from django.utils import timezone
+        from djobberbase.models import JobStat
+        from djobberbase.stats import FLUSHED_ON_KEY, GAP_GRACE, SEQUENCE_KEY, StatsBuffer, event_key
+        buffer = StatsBuffer()
+        with mock.patch.multiple(settings, DJOBBERBASE_STATS_BUFFER='default', DJOBBERBASE_STATS_BUFFER_SIZE=100,
+                                 DJOBBERBASE_STATS_FLUSH_INTERVAL=3600):
+            buffer.cache.clear()
+            buffer.cache.set(FLUSHED_ON_KEY, time(), None)
+            self.record(2)
+            # Another process numbered its stat but did not store it yet
+            number = buffer.cache.incr(SEQUENCE_KEY)
+            self.record(1)
+            self.assertEqual(buffer.flush(), 2)
+            self.assertEqual(buffer.depth(), 2)
+            buffer.cache.set(event_key(number), (self.job.pk, self.job.title, JobStat.HIT, None, None, timezone.now()), None)
+            self.assertEqual(buffer.flush(), 2)
+            # A stat never stored is given up after a while
+            buffer.cache.incr(SEQUENCE_KEY)
+            self.record(1)
+            self.assertEqual(buffer.flush(), 0)
+            with mock.patch('djobberbase.stats.time', return_value=time() + GAP_GRACE):
+                self.assertEqual(buffer.flush(), 1)
+            self.assertEqual(buffer.depth(), 0)
+        self.assertEqual(self.stats.count(), 5)
+
+    def testCompaction(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from djobberbase.models import JobStat, JobStatDaily
+        from djobberbase.stats import compact_stats
+        now = timezone.now()
+        for days in (40, 40, 39, 1):
+            JobStat.objects.create(job=self.job, stat_type=JobStat.APPLICATION, created_on=now - timedelta(days=days))
+        self.assertEqual(compact_stats(now - timedelta(days=30), chunk_size=2), 3)
+        self.assertEqual(sorted(JobStatDaily.objects.values_list('count', flat=True)), [1, 2])
+        self.assertEqual(self.stats.count(), 1)
+        self.assertEqual(Job.objects.get(pk=self.job.pk).application_count, 4)
+
+    def testLeaderboards(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from djobberbase.leaderboards import MOST_APPLIED, TRENDING, rebuild, top_jobs
+        from djobberbase.models import JobStat
+        from djobberbase.stats import write_stats
+        other = Job.objects.create(title='Roadrunner', description='Beep', category=self.job.category,
+                                   place=self.job.place, company=self.job.company, jobtype=self.job.jobtype)
+        now = timezone.now()
+        # Old applications count for the most applied, recent hits for the trending
+        write_stats([(self.job.pk, 'Coyote', JobStat.APPLICATION, None, None, now - timedelta(days=20))] * 2 +
+                    [(other.pk, 'Roadrunner', JobStat.HIT, None, None, now)] * 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(top_jobs(MOST_APPLIED, 5), [self.job])
+        self.assertEqual(top_jobs(TRENDING, 5, self.job.category), [other, self.job])
+        other.switch_activate()
+        self.assertEqual(top_jobs(TRENDING, 5), [self.job])
+        self.assertEqual(rebuild(), 2)
+        self.assertEqual(top_jobs(MOST_APPLIED, 5), [self.job])
+        self.assertEqual(Job.objects.get(pk=self.job.pk).score.applications, 2)
+
+    def testUniqueVisitors(self):
+        from unittest import mock
+        with mock.patch.multiple(settings, DJOBBERBASE_STATS_BUFFER='memory'):
+            buffers = [self.record(0), self.record(0)]
+            for i in range(30):
+                buffers[i % 2].record_visitor(self.job, '10.0.0.{}'.format(i % 20))
+            self.assertEqual(buffers[0].unique_visitors(self.job.pk), 10)
+            for buffer in buffers:
+                buffer.flush()
+        self.assertAlmostEqual(buffers[0].unique_visitors(self.job.pk), 20, delta=1)
+
+
+class RateLimiterTestCase(TransactionTestCase):
+
+    def setUp(self):
+        from djobberbase.ratelimit import rate_limiter
+        rate_limiter.cache.clear()
+        self.rate_limiter = rate_limiter
+
+    def testSlidingWindow(self):
+        from unittest import mock
+        with mock.patch.dict(settings.DJOBBERBASE_RATE_LIMITS, {'test': (2, 60)}), \
+                mock.patch('djobberbase.ratelimit.time', return_value=6000.0 + 50):
+            with self.assertNumQueries(0):
+                self.assertEqual([self.rate_limiter.hit('test', '10.0.0.1') for i in range(3)], [0, 0, 40])
+                self.assertEqual(self.rate_limiter.hit('test', '10.0.0.2'), 0)
+        # Half of the previous window still counts
+        with mock.patch.dict(settings.DJOBBERBASE_RATE_LIMITS, {'test': (2, 60)}), \
+                mock.patch('djobberbase.ratelimit.time', return_value=6060.0 + 30):
+            self.assertEqual([self.rate_limiter.hit('test', '10.0.0.1') for i in range(2)], [0, 30])
+
+    def testBlocked(self):
+        from unittest import mock
+        with mock.patch.dict(settings.DJOBBERBASE_RATE_LIMITS, {'test': (0, 60)}), \
+                mock.patch('djobberbase.ratelimit.time', return_value=6000.0 + 10):
+            self.assertEqual(self.rate_limiter.hit('test', '10.0.0.1'), 50)
+            self.assertEqual(self.rate_limiter.check('test', '10.0.0.1'), 50)
+
+    def testApplication(self):
+        from unittest import mock
+        from djobberbase.forms import ApplicationForm
+        data = {'apply_name': 'Roy', 'apply_email': 'roy@nexus.com', 'apply_msg': 'Hire me'}
+        form = lambda data: ApplicationForm(data, applicant_data={'ip': '10.0.0.1'})
+        with mock.patch.dict(settings.DJOBBERBASE_RATE_LIMITS, {'apply': (1, 60)}):
+            # Invalid applications are not counted, valid ones are as soon as they are validated
+            self.assertFalse(form(dict(data, apply_email='roy')).is_valid())
+            self.assertTrue(form(data).is_valid())
+            self.assertFalse(form(data).is_valid())
+
+    def testSearch(self):
+        from unittest import mock
+        with mock.patch.dict(settings.DJOBBERBASE_RATE_LIMITS, {'search': (1, 60)}):
+            self.assertEqual(self.client.get(reverse('djobberbase:job_search')).status_code, 200)
+            response = self.client.get(reverse('djobberbase:job_search'))
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response['Retry-After']) > 0)
+
+
+class HyperLogLogTestCase(unittest.TestCase):
+
+    def testEstimate(self):
+        from djobberbase.hll import HyperLogLog
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(20000):
+            first.add('10.0.{}.{}'.format(i // 256, i % 256))
+            second.add('10.1.{}.{}'.format(i // 256, i % 256))
+        self.assertAlmostEqual(first.estimate(), 20000, delta=20000 * 0.07)
+        merged = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+        self.assertAlmostEqual(merged.estimate(), 40000, delta=40000 * 0.07)
+        self.assertFalse(first.add('10.0.0.1'))
+        self.assertEqual(len(first.to_bytes()), 2048)
+
+
+class OutboxTestCase(TransactionTestCase):
+
+    def testSend(self):
+        from unittest import mock
+        from django.core import mail
+        from djobberbase.models import OutboxMessage
+        from djobberbase.outbox import enqueue, send_outbox
+        for i in range(5):
+            enqueue('Application {}'.format(i), 'Hello', ['deckard@example.com'], html_body='<p>Hello</p>')
+        connection = mail.get_connection()
+        send = connection.send_messages
+
+        def send_or_fail(messages):
+            if messages[0].subject == 'Application 3':
+                raise OSError('Connection refused')
+            return send(messages)
+
+        with mock.patch.object(connection, 'send_messages', side_effect=send_or_fail):
+            sent, failed, elapsed = send_outbox(batch_size=2, connection=connection)
+        self.assertEqual((sent, failed), (4, 1))
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(mail.outbox[0].alternatives, [('<p>Hello</p>', 'text/html')])
+        failed = OutboxMessage.objects.get(subject='Application 3')
+        self.assertEqual((failed.status, failed.attempts), (OutboxMessage.PENDING, 1))
+        # Retried after a delay only
+        self.assertEqual(send_outbox()[:2], (0, 0))
+        OutboxMessage.objects.filter(pk=failed.pk).update(send_after=failed.created_on)
+        self.assertEqual(send_outbox()[:2], (1, 0))
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.SENT).count(), 5)
+
+    def testMailBatch(self):
+        from djobberbase.models import OutboxMessage
+        from djobberbase.postman import mail_batch
+        company = Company.objects.create(admin=User.objects.create(username='tyrell', email='eldon@tyrell.com'),
+                                         logo='tyrell.png')
+        defaults = {'category': Category.add_root(name='Engineering'), 'place': Place.add_root(name='Los Angeles'),
+                    'jobtype': Type.objects.create(name='Contract'), 'company': company}
+        jobs = [Job.objects.create(title=title, description='Replicants', **defaults)
+                for title in ('Genetist needed', 'Eye designer')]
+        self.assertEqual(mail_batch(Job.objects.select_related('company__admin').order_by('pk'), 'publish_to_user',
+                                    '%(job_title)s on %(site_name)s'), 2)
+        messages = list(OutboxMessage.objects.order_by('pk'))
+        self.assertEqual([message.to for message in messages], ['eldon@tyrell.com'] * 2)
+        self.assertEqual(messages[1].subject, 'Eye designer on {}'.format(settings.DJOBBERBASE_SITE_NAME))
+        self.assertIn(jobs[1].get_absolute_url(), messages[1].html_body)
+
+    def testAttachment(self):
+        import os
+        import tempfile
+        from unittest import mock
+        from django.core import mail
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import RequestFactory
+        from djobberbase.models import OutboxMessage
+        from djobberbase.outbox import send_outbox
+        from djobberbase.postman import mail_apply_online
+        from djobberbase.uploads import CVUploadHandler
+        company = Company.objects.create(admin=User.objects.create(username='tyrell', email='eldon@tyrell.com'),
+                                         logo='tyrell.png')
+        job = Job.objects.create(title='Genetist needed', description='Replicants', company=company,
+                                 category=Category.add_root(name='Engineering'), place=Place.add_root(name='Los Angeles'),
+                                 jobtype=Type.objects.create(name='Contract'))
+
+        def upload(name, size):
+            request = RequestFactory().post('/', {'apply_msg': 'Hire me', 'apply_email': 'roy@nexus.com',
+                                                  'apply_cv': SimpleUploadedFile(name, b'%' * size)})
+            request.upload_handlers.insert(0, CVUploadHandler(request))
+            return request, request.FILES.get('apply_cv')
+
+        with tempfile.TemporaryDirectory() as uploads, \
+                mock.patch.multiple(settings, DJOBBERBASE_FILE_UPLOADS=uploads, DJOBBERBASE_CV_MEMORY_SIZE=1024,
+                                    DJOBBERBASE_MAX_UPLOAD_SIZE=4096):
+            request, cv = upload('roy.exe', 10)
+            self.assertIsNone(cv)
+            self.assertIn('extension', request.cv_error)
+            request, cv = upload('roy.pdf', 5000)
+            self.assertIsNone(cv)
+            self.assertIn('size limit', request.cv_error)
+            self.assertEqual(os.listdir(uploads), [])
+            # Small CVs stay in memory and are stored with the message
+            request, cv = upload('roy.pdf', 1000)
+            self.assertTrue(cv.in_memory())
+            small = mail_apply_online(job, request)
+            self.assertEqual((bytes(small.attachment_data), small.attachment), (b'%' * 1000, ''))
+            # Large ones are written once and queued by reference
+            request, cv = upload('batty.pdf', 3000)
+            self.assertEqual(os.listdir(uploads), [os.path.basename(cv.path)])
+            large = mail_apply_online(job, request)
+            self.assertEqual((large.attachment_data, large.attachment), (None, cv.path))
+            self.assertEqual(send_outbox()[:2], (2, 0))
+            self.assertEqual(os.listdir(uploads), [])
+        self.assertEqual([email.attachments[0][:2] for email in mail.outbox],
+                         [('roy.pdf', b'%' * 1000), ('batty.pdf', b'%' * 3000)])
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.SENT).count(), 2)
+
+    def testModerationDigest(self):
+        from unittest import mock
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from djobberbase.models import ModerationEvent, OutboxMessage
+        from djobberbase.postman import mail_moderation_digest, mail_publish_to_admin
+        company = Company.objects.create(admin=User.objects.create(username='tyrell', email='eldon@tyrell.com'),
+                                         logo='tyrell.png')
+        defaults = {'category': Category.add_root(name='Engineering'), 'place': Place.add_root(name='Los Angeles'),
+                    'jobtype': Type.objects.create(name='Contract'), 'company': company, 'description': 'Replicants'}
+        jobs = [Job.objects.create(title='Job {}'.format(i), is_active=i % 3 != 0, **defaults) for i in range(30)]
+        with mock.patch.multiple(settings, DJOBBERBASE_ADMIN_DIGEST=True, DJOBBERBASE_ADMIN_DIGEST_MAX_JOBS=25,
+                                 DJOBBERBASE_ADMIN_DIGEST_RECIPIENTS=['deckard@lapd.gov', 'gaff@lapd.gov']):
+            mail_publish_to_admin(jobs[0])
+            ModerationEvent.objects.bulk_create(ModerationEvent(job=jobs[i % 30]) for i in range(5000))
+            self.assertEqual(OutboxMessage.objects.count(), 0)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(mail_moderation_digest(), 30)
+            # However many events and jobs there are
+            self.assertLess(len(queries), 10)
+            self.assertEqual(len([query for query in queries.captured_queries
+                                  if query['sql'].startswith('DELETE')]), 1)
+            self.assertEqual(mail_moderation_digest(), 0)
+        self.assertEqual(ModerationEvent.objects.count(), 0)
+        digests = list(OutboxMessage.objects.order_by('to'))
+        self.assertEqual([digest.to for digest in digests], ['deckard@lapd.gov', 'gaff@lapd.gov'])
+        self.assertIn('30 jobs posted or edited, 10 to activate', digests[0].subject)
+        body = digests[0].body
+        self.assertIn('And 5 more jobs.', body)
+        # The jobs to activate come first, each with its link in the admin
+        self.assertLess(body.index('[To activate] Job 0 '), body.index('Job 1 '))
+        self.assertEqual(body.count('Activate or edit: '), 25)
+        # The jobs have the same description
+        self.assertIn('Near duplicate of: Job ', body)
+        self.assertIn('(168 times, last on ', body)
+
+
+class MarkupTestCase(TransactionTestCase):
+
+    def testRerender(self):
+        from unittest import mock
+        from djobberbase import markup
+        defaults = {'category': Category.add_root(name='Engineering'), 'place': Place.add_root(name='Los Angeles'),
+                    'jobtype': Type.objects.create(name='Contract'),
+                    'company': Company.objects.create(admin=User.objects.create(username='tyrell'), logo='tyrell.png')}
+        with mock.patch.multiple(settings, DJOBBERBASE_MARKUP_LANGUAGE='markdown'):
+            jobs = [Job.objects.create(title='Job {}'.format(i), description='*More human* than human {}'.format(i),
+                                       **defaults) for i in range(5)]
+            self.assertEqual(jobs[0].description_html, '<p><em>More human</em> than human 0</p>')
+            # Saving an unchanged description does not render it again
+            with mock.patch.object(markup, 'render_markup', wraps=markup.render_markup) as render_markup:
+                jobs[0].title = 'Eye designer'
+                jobs[0].save()
+                self.assertEqual(render_markup.call_count, 0)
+                jobs[0].description = '*Retired*'
+                jobs[0].save()
+                self.assertEqual(render_markup.call_count, 1)
+            self.assertEqual(markup.rerender_jobs(workers=1), (0, mock.ANY))
+        # Switching the language renders every job again, once
+        self.assertEqual(markup.rerender_jobs(workers=1, chunk_size=2)[0], 5)
+        self.assertEqual(markup.rerender_jobs(workers=1)[0], 0)
+        self.assertEqual(Job.objects.get(pk=jobs[1].pk).description_html, '<p>*More human* than human 1</p>')
+        with mock.patch.multiple(settings, DJOBBERBASE_MARKUP_LANGUAGE='markdown'):
+            self.assertEqual(markup.rerender_jobs(workers=2, chunk_size=2)[0], 5)
+        self.assertEqual(list(Job.objects.order_by('pk').values_list('description_html', flat=True)),
+                         ['<p><em>Retired</em></p>'] + ['<p><em>More human</em> than human {}</p>'.format(i)
+                                                         for i in range(1, 5)])
+
+    def testPipeline(self):
+        from unittest import mock
+        from djobberbase import markup
+        html = markup.render_html('<script>alert(1)</script>*Apply* at [Tyrell](www.tyrell.com), [us](/jobs/) '
+                                  'or [here](javascript:alert(1)) <img src=x onerror=alert(1)>\n\n<div onclick="x">'
+                                  '<em>Now', 'markdown')
+        self.assertEqual(html, '<p><em>Apply</em> at <a href="http://www.tyrell.com" rel="nofollow noopener" '
+                               'target="_blank">Tyrell</a>, <a href="/jobs/">us</a> or <a>here</a> </p>\n'
+                               '<div><em>Now</em></div>')
+        self.assertEqual(markup.render_html('<b>Fish & chips</b>', None), '<p>&lt;b&gt;Fish &amp; chips&lt;/b&gt;</p>')
+        job = Job.objects.create(title='Eye designer', description='Eyes', category=Category.add_root(name='Eye Design'),
+                                 place=Place.add_root(name='Los Angeles'), jobtype=Type.objects.create(name='Contract'),
+                                 company=Company.objects.create(admin=User.objects.create(username='chew'), logo='chew.png'))
+        # A new pipeline version renders the stored descriptions again as the jobs are displayed
+        with mock.patch.object(markup, 'PIPELINE_VERSION', markup.PIPELINE_VERSION + 1):
+            job = Job.objects.get(pk=job.pk)
+            self.assertNotEqual(job.description_hash, markup.markup_hash(job.description, None))
+            markup.refresh_job(job)
+            self.assertEqual(Job.objects.get(pk=job.pk).description_hash, markup.markup_hash(job.description, None))
+
+
+class FeedTestCase(TransactionTestCase):
+
+    def testConditional(self):
+        import os
+        import tempfile
+        from unittest import mock
+        category = Category.add_root(name='Replicant Design')
+        defaults = {'category': category, 'place': Place.add_root(name='Los Angeles'),
+                    'jobtype': Type.objects.create(name='Contract'), 'description': 'Replicants',
+                    'company': Company.objects.create(admin=User.objects.create(username='tyrell'), logo='tyrell.png')}
+        for title in ('Genetist needed', 'Eye designer'):
+            Job.objects.create(title=title, **defaults)
+        url = reverse('djobberbase:feed', kwargs={'var_name': category.slug})
+        with tempfile.TemporaryDirectory() as feeds, mock.patch.multiple(settings, DJOBBERBASE_FEED_ROOT=feeds):
+            response = self.client.get(url)
+            content = response.content.decode('utf-8')
+            # Newest first
+            self.assertLess(content.index('Eye designer'), content.index('Genetist needed'))
+            with open(os.path.join(feeds, category.slug + '.xml'), 'rb') as f:
+                self.assertEqual(f.read(), response.content)
+            etag, last_modified = response['ETag'], response['Last-Modified']
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+                self.assertEqual(self.client.get(url).content, response.content)
+            self.client.get(reverse('djobberbase:feed', kwargs={'var_name': 'all'}))
+            self.assertEqual(sorted(os.listdir(feeds)), ['all.xml', category.slug + '.xml'])
+            # A new job in the category changes its feed
+            Job.objects.create(title='Blade runner', **defaults)
+            self.assertEqual(os.listdir(feeds), [])
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            self.assertIn('Blade runner', response.content.decode('utf-8'))
+        self.assertEqual(self.client.get(reverse('djobberbase:feed', kwargs={'var_name': 'origami'})).status_code, 404)
+
+
+class SitemapTestCase(TransactionTestCase):
+
+    def testShards(self):
+        import gzip
+        import os
+        import tempfile
+        from djobberbase.sitemaps import SitemapWriter
+        place = Place.add_root(name='Los Angeles')
+        defaults = {'category': Category.add_root(name='Replicant Design'), 'place': place,
+                    'jobtype': Type.objects.create(name='Contract'), 'description': 'Replicants',
+                    'company': Company.objects.create(admin=User.objects.create(username='tyrell'), logo='tyrell.png')}
+        jobs = [Job.objects.create(title='Job {}'.format(i), **defaults) for i in range(7)]
+        shard_of = lambda job: job.pk // 3
+
+        def read(name):
+            with gzip.open(os.path.join(root, name), 'rt', encoding='utf-8') as f:
+                return f.read()
+
+        with tempfile.TemporaryDirectory() as root:
+            writer = SitemapWriter(root, shard_size=3)
+            written, files = writer.write()
+            shards = sorted(set(shard_of(job) for job in jobs))
+            self.assertEqual(written, shards)
+            self.assertEqual(files, len(shards) + 3)
+            self.assertEqual(sum(read(writer.shard_name('jobs', n)).count('<url>') for n in shards), 7)
+            self.assertIn('http://example.com{}'.format(jobs[0].get_absolute_url()),
+                          read(writer.shard_name('jobs', shard_of(jobs[0]))))
+            self.assertIn('http://example.com{}'.format(place.get_absolute_url()), read('sitemap-places-0.xml.gz'))
+            self.assertIn('http://example.com/jobs/employer/tyrell/', read('sitemap-companies-0.xml.gz'))
+            with open(os.path.join(root, 'sitemap.xml')) as f:
+                self.assertIn('<loc>http://example.com/sitemaps/sitemap-categories-0.xml.gz</loc>', f.read())
+            # Only the shards whose jobs changed are written again
+            self.assertEqual(writer.write()[0], [])
+            jobs[4].title = 'Eye designer'
+            jobs[4].save()
+            # The shard of jobs[3] has jobs[2] or jobs[4] too, whatever the ids are
+            Job.objects.filter(pk=jobs[3].pk).change(is_active=False)
+            self.assertEqual(writer.write()[0], sorted({shard_of(jobs[3]), shard_of(jobs[4])}))
+            self.assertNotIn(jobs[3].get_absolute_url(), read(writer.shard_name('jobs', shard_of(jobs[3]))))
+            # Deleting a job writes its shard again, or removes it with its last job
+            deleted_shard = shard_of(jobs[6])
+            jobs[6].delete()
+            if deleted_shard == shard_of(jobs[5]):
+                self.assertEqual(writer.write()[0], [deleted_shard])
+            else:
+                self.assertEqual(writer.write()[0], [])
+                self.assertFalse(os.path.exists(os.path.join(root, writer.shard_name('jobs', deleted_shard))))
+            self.assertEqual(writer.write(full=True)[0], sorted(set(shard_of(job) for job in jobs[:6])))
+
+
+class ExportTestCase(TransactionTestCase):
+
+    def testStream(self):
+        import csv
+        import io
+        import json
+        from unittest import mock
+        from django.core.management import CommandError, call_command
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.utils.dateparse import parse_datetime
+        from django.utils.six import StringIO
+        from djobberbase.export import job_rows
+        engineering = Category.add_root(name='Engineering')
+        california = Place.add_root(name='California')
+        defaults = {'category': engineering.add_child(name='Genetic Engineering'),
+                    'place': california.add_child(name='Los Angeles'),
+                    'jobtype': Type.objects.create(name='Contract'), 'description': 'Replicants & co',
+                    'company': Company.objects.create(admin=User.objects.create(username='tyrell'), logo='tyrell.png')}
+        jobs = [Job.objects.create(title='Job {}'.format(i), **defaults) for i in range(5)]
+        url = reverse('djobberbase:export')
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([row['id'] for row in rows], [job.pk for job in jobs])
+        self.assertEqual(rows[0]['category'], 'Engineering > Genetic Engineering')
+        self.assertEqual(rows[0]['place'], 'California, Los Angeles')
+        self.assertEqual((rows[0]['jobtype'], rows[0]['company']), ('Contract', 'tyrell'))
+        self.assertEqual(rows[0]['url'], jobs[0].get_absolute_url())
+        # The names are resolved once, the jobs are read in chunks
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(list(job_rows(chunk_size=2))), 5)
+        self.assertLessEqual(len(queries), 5)
+        content = b''.join(self.client.get(url, {'format': 'csv'}).streaming_content).decode('utf-8')
+        self.assertEqual(len(list(csv.reader(io.StringIO(content)))), 6)
+        content = b''.join(self.client.get(url, {'format': 'xml'}).streaming_content).decode('utf-8')
+        self.assertEqual(content.count('<job>'), 5)
+        self.assertIn('Replicants &amp; co', content)
+        # Incremental exports overlap, the jobs just exported are exported again
+        response = self.client.get(url, {'since': response['X-Export-Until']})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 5)
+        # An incremental export has the jobs modified since, deactivated ones included
+        with mock.patch.multiple(settings, DJOBBERBASE_EXPORT_OVERLAP=0):
+            until = self.client.get(url)['X-Export-Until']
+            Job.objects.filter(pk=jobs[1].pk).change(is_active=False)
+            response = self.client.get(url, {'since': until})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([(row['id'], row['is_active']) for row in rows], [(jobs[1].pk, False)])
+        self.assertGreater(parse_datetime(response['X-Export-Until']), parse_datetime(until))
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'since': '2020-13-01T00:00'}).status_code, 400)
+        with self.assertRaises(CommandError):
+            call_command('export_jobs', since='2020-13-01T00:00', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(self.client.get(url, {'format': 'yaml'}).status_code, 404)
+
+    def testNaiveDates(self):
+        import json
+        with self.settings(USE_TZ=False):
+            job = Job.objects.create(
+                title='Blade runner', description='Retires replicants', category=Category.add_root(name='Police'),
+                place=Place.add_root(name='Los Angeles'), jobtype=Type.objects.create(name='Contract'),
+                company=Company.objects.create(admin=User.objects.create(username='lapd'), logo='lapd.png'))
+            for since in ('2019-11-01T00:00', '2019-11-01T00:00+02:00'):
+                response = self.client.get(reverse('djobberbase:export'), {'since': since})
+                rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+                self.assertEqual([row['id'] for row in rows], [job.pk])
+
+
+class ImportJobsTestCase(TransactionTestCase):
+
+    def testImport(self):
+        import json
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from djobberbase.ingest import JobImporter
+        from djobberbase.models import JobScore
+        engineering = Category.add_root(name='Engineering')
+        genetics = engineering.add_child(name='Genetics')
+        california = Place.add_root(name='California')
+        santa_monica = california.add_child(name='Santa Monica')
+        Place.objects.filter(pk=santa_monica.pk).update(external_id='5368361')
+        contract = Type.objects.create(name='Contract')
+        company = Company.objects.create(admin=User.objects.create(username='tyrell'), logo='tyrell.png')
+        defaults = {'category': genetics, 'place': santa_monica, 'jobtype': contract, 'company': company}
+        original = Job.objects.create(title='Eye designer', description='Eyes', **defaults)
+        Job.objects.create(title='Genetist', description='Old', is_active=False, **defaults)
+        get_backend().rebuild()
+        posting = {'title': 'Genetist', 'description': 'Designs *replicants*', 'category': 'Engineering > Genetics',
+                   'jobtype': 'Contract', 'place': 'California, Santa Monica', 'company': 'tyrell'}
+        rows = [
+            posting,
+            dict(posting, title='Android maker', place='Santa Monica', jobtype=contract.slug, salary_range_min=3000),
+            dict(posting, title='Eye designer', description='Better eyes', place='5368361'),
+            dict(posting, title='Origami folder', category='Origami'),
+            dict(posting, title='Blade runner', valid_until='2019-11-01T00:00:00'),
+            dict(posting, description=''),
+            posting,
+        ]
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'jobs.jsonl')
+            with open(path, 'w') as f:
+                f.write('\n'.join(json.dumps(row) for row in rows) + '\n{"title"\n')
+            call_command('import_jobs', path, update=True, batch_size=3, stdout=open(os.devnull, 'w'),
+                         stderr=open(os.devnull, 'w'))
+        # The inactive job keeps its slug, the new one gets the next free one
+        genetist = Job.active.get(title='Genetist')
+        self.assertEqual(genetist.slug, 'genetist-2')
+        self.assertIn('Designs *replicants*', genetist.description_html)
+        self.assertEqual((Job.active.get(title='Android maker').place, Job.active.get(title='Android maker').salary_range_max),
+                         (santa_monica, 3000))
+        original.refresh_from_db()
+        self.assertEqual(original.description, 'Better eyes')
+        self.assertEqual(Job.objects.count(), 4)
+        self.assertEqual(JobScore.objects.count(), 4)
+        genetics.refresh_from_db()
+        self.assertEqual((genetics.job_count, genetics.total_job_count), (3, 3))
+        self.assertEqual(list(get_backend().search('android')), [Job.active.get(title='Android maker')])
+        # Every posting of a batch is validated and checked for duplicates with a few queries
+        importer = JobImporter(batch_size=50)
+        postings = [dict(posting, title='Replicant {}'.format(i), description='Nexus {} model'.format(i)) for i in range(50)]
+        with CaptureQueriesContext(connection) as queries:
+            stats = importer.import_rows(enumerate(postings + [posting], 1))
+        self.assertEqual((stats['created'], stats['duplicates']), (50, 1))
+        self.assertLess(len(queries), 25)
+        # Importing the same postings again changes nothing
+        importer = JobImporter(update=True)
+        stats = importer.import_rows(enumerate(rows, 1))
+        self.assertEqual((stats['created'], stats['updated'], stats['unchanged'], stats['repeated'], stats['invalid']),
+                         (0, 0, 3, 1, 3))
+        self.assertEqual(sorted(line for line, message in importer.errors), [4, 5, 6])
+        self.assertIn('category', dict(importer.errors)[4])
+
+    def testManyPlaces(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from djobberbase.ingest import JobImporter
+        california = Place.add_root(name='California')
+        cities = [california.add_child(name='City {}'.format(i)) for i in range(20)]
+        company = Company.objects.create(admin=User.objects.create(username='tyrell'), logo='tyrell.png')
+        defaults = {'category': Category.add_root(name='Engineering'), 'jobtype': Type.objects.create(name='Contract'),
+                    'company': company, 'description': 'Eyes'}
+        Job.objects.create(title='Eye designer', place=cities[0], **defaults)
+        Job.objects.create(title='Eye designer', place=cities[1], **defaults)
+        posting = {'title': 'Eye designer', 'category': 'Engineering', 'jobtype': 'Contract', 'company': 'tyrell'}
+        postings = [dict(posting, place='California, City {}'.format(i), description='Eyes for city {}'.format(i))
+                    for i in range(1, 20)]
+        # The duplicates with a numbered slug and the free slugs are looked up with one query for all the postings
+        with CaptureQueriesContext(connection) as queries:
+            stats = JobImporter().import_rows(enumerate(postings, 1))
+        self.assertEqual((stats['created'], stats['duplicates']), (18, 1))
+        self.assertLess(len(queries), 25)
+        self.assertTrue(Job.objects.filter(slug='eye-designer-20').exists())
+        self.assertEqual(Job.objects.filter(title='Eye designer').values('slug').distinct().count(), 20)
+        with self.settings(USE_TZ=False):
+            from datetime import datetime, timedelta
+            valid_until = (datetime.now() + timedelta(days=30)).isoformat()
+            stats = JobImporter().import_rows(enumerate([dict(
+                posting, title='Blade runner', place='California, City 1', description='Retires replicants',
+                valid_until=valid_until)], 1))
+            self.assertEqual((stats['created'], stats['invalid']), (1, 0))
+
+
+class FingerprintTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.description = ('We are looking for a replicant designer to join our team in the tower. You will design '
+                            'eyes, skin and memories for the Nexus 6 generation, working with genetic engineers and '
+                            'with our chief designer. Experience with off-world colonies is a plus. ') * 3
+        self.defaults = {'category': Category.add_root(name='Replicant Design'),
+                         'place': Place.add_root(name='Tyrell Tower'), 'jobtype': Type.objects.create(name='Contract'),
+                         'company': Company.objects.create(admin=User.objects.create(username='tyrell'),
+                                                           logo='tyrell.png')}
+        self.original = Job.objects.create(title='Replicant designer', description=self.description, **self.defaults)
+
+    def testNearDuplicates(self):
+        from unittest import mock
+        from django.core.exceptions import ValidationError
+        from django.contrib import admin
+        from djobberbase.admin import JobAdmin
+        from djobberbase.fingerprints import distance, fingerprint_jobs, near_duplicates, normalize_title, simhash
+        self.assertEqual(normalize_title('URGENT: Designer, Replicant (néw)!'), 'designer replicant')
+        self.assertLessEqual(distance(simhash(self.description), simhash(self.description + ' Apply now.')), 3)
+        self.assertGreater(distance(simhash(self.description), simhash('Folding origami unicorns all day long')), 3)
+        # A repost with another title and a slightly edited description
+        repost = Job(title='Senior replicant eye designer', description=self.description.replace('a plus', 'nice', 1),
+                     **self.defaults)
+        with self.assertRaises(ValidationError):
+            repost.clean()
+        with mock.patch.multiple(settings, DJOBBERBASE_REJECT_NEAR_DUPLICATES=False):
+            repost.clean()
+        repost.save()
+        self.assertEqual(repost.duplicate_of, self.original)
+        # Reposting at another place is allowed but still reported
+        other_place = Job.objects.create(title='Urgent: replicant designer', description='Elsewhere',
+                                         **dict(self.defaults, place=Place.add_root(name='Off-world')))
+        self.assertEqual(other_place.duplicate_of, self.original)
+        unrelated = Job.objects.create(title='Blade runner', description='Retire replicants.', **self.defaults)
+        self.assertIsNone(unrelated.duplicate_of)
+        # Other companies of the place post jobs with the same title
+        other_company = dict(self.defaults, company=Company.objects.create(
+            admin=User.objects.create(username='wallace'), logo='wallace.png'))
+        same_title = Job.objects.create(title='Designer (replicant)', description='Memories of childhood.',
+                                        **other_company)
+        self.assertIsNone(same_title.duplicate_of)
+        self.assertEqual(near_duplicates(same_title), [])
+        copied = Job.objects.create(title='Android designer', description=self.description, **other_company)
+        self.assertEqual(copied.duplicate_of, repost)
+        # Candidates are read through the fingerprint indexes
+        with self.assertNumQueries(1):
+            self.assertEqual(near_duplicates(repost), [self.original])
+        links = JobAdmin(Job, admin.site).near_duplicate_links(self.original)
+        self.assertIn(reverse('admin:djobberbase_job_change', args=[repost.pk]), links)
+        self.original.is_active = False
+        self.original.save()
+        Job.objects.filter(pk=repost.pk).change(is_active=False)
+        Job(title='Replicant designer', description=self.description, **self.defaults).clean()
+        # Jobs posted before the fingerprints are fingerprinted by the command
+        Job.objects.update(title_hash='', simhash=None, simhash_band_0=None, simhash_band_1=None,
+                           simhash_band_2=None, simhash_band_3=None, duplicate_of=None)
+        self.assertEqual(fingerprint_jobs(chunk_size=2)[0], 6)
+        self.assertEqual(list(Job.objects.order_by('pk').values_list('duplicate_of', flat=True)),
+                         [None, self.original.pk, self.original.pk, None, None, repost.pk])
+
+    def testAdminActions(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        repost = Job.objects.create(title='Replicant designer', description=self.description, **self.defaults)
+        self.assertEqual(repost.duplicate_of, self.original)
+        User.objects.create_superuser('eldon', 'eldon@tyrell.com', 'owl')
+        client = Client()
+        client.login(username='eldon', password='owl')
+        url = reverse('admin:djobberbase_job_changelist') + '?near_duplicate=1'
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(url, {'action': 'deactivate_jobs', '_selected_action': [repost.pk]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(Job.objects.filter(is_active=False)), [repost])
+        # The jobs are locked by pk, without the outer join to the jobs they duplicate
+        locks = [query['sql'] for query in queries
+                 if query['sql'].startswith('SELECT') and ' IN (SELECT U0."id" FROM ' in query['sql']]
+        self.assertEqual(len(locks), 1)
+        self.assertNotIn('JOIN', locks[0])
+
+    def testImport(self):
+        from djobberbase.ingest import JobImporter
+        posting = {'title': 'Eye designer wanted', 'description': self.description + ' Apply now.',
+                   'category': 'Replicant Design', 'jobtype': 'Contract', 'place': 'Tyrell Tower', 'company': 'tyrell'}
+        stats = JobImporter().import_rows([(1, posting)])
+        self.assertEqual((stats['created'], stats['duplicates']), (0, 1))
+        stats = JobImporter(update=True).import_rows([(1, posting)])
+        self.assertEqual(stats['updated'], 1)
+        self.original.refresh_from_db()
+        self.assertEqual(self.original.title, 'Eye designer wanted')
+        self.assertEqual(Job.objects.count(), 1)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from time import time
+
+from django.core.cache import caches
+
+from djobberbase.conf import settings as djobberbase_settings
+
+
+class TreeSnapshot:
+    ''' A read-only copy of a materialized path tree: tuples of the ids, paths,
+        names and slugs of all its nodes. Ancestors are found by looking up
+        the prefixes of a path, without any database access.
+    '''
+
+    def __init__(self, rows, steplen):
+        self.steplen = steplen
+        columns = tuple(zip(*rows)) or ((), (), (), ())
+        self.pks, self.paths, self.names, self.slugs = columns
+        self.positions = dict((pk, position) for position, pk in enumerate(self.pks))
+        self.path_positions = dict((path, position) for position, path in enumerate(self.paths))
+
+    def __len__(self):
+        return len(self.pks)
+
+    def __contains__(self, pk):
+        return pk in self.positions
+
+    def ancestors_and_self(self, pk):
+        ''' Returns the positions of the node and of its ancestors, root first. '''
+        path = self.paths[self.positions[pk]]
+        prefixes = (path[:end] for end in range(self.steplen, len(path) + 1, self.steplen))
+        return [self.path_positions[prefix] for prefix in prefixes if prefix in self.path_positions]
+
+    def names_of(self, pk):
+        return [self.names[position] for position in self.ancestors_and_self(pk)]
+
+    def slugs_of(self, pk):
+        return [self.slugs[position] for position in self.ancestors_and_self(pk)]
+
+
+class Trees:
+    ''' Keeps one TreeSnapshot per tree model in every process. Saving, moving
+        or deleting a node bumps the version of its tree in the
+        DJOBBERBASE_TREE_CACHE cache. Processes compare their version at most
+        every DJOBBERBASE_TREE_CHECK_INTERVAL seconds and reload the whole
+        tree in one query when it changed.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshots = {}
+
+    @property
+    def cache(self):
+        return caches[djobberbase_settings.DJOBBERBASE_TREE_CACHE]
+
+    def version_key(self, model):
+        return 'djobberbase:trees:{}:version'.format(model._meta.label_lower)
+
+    def get(self, model, reload=False):
+        ''' Returns the snapshot of a tree, reloading it when its version
+            changed or when reload is set.
+        '''
+        snapshot, version, checked_on = self.snapshots.get(model, (None, None, 0))
+        if reload:
+            snapshot = None
+        elif snapshot is not None and time() - checked_on < djobberbase_settings.DJOBBERBASE_TREE_CHECK_INTERVAL:
+            return snapshot
+        key = self.version_key(model)
+        self.cache.add(key, int(time() * 1000000), None)
+        current = self.cache.get(key)
+        with self.lock:
+            if snapshot is None or current != version:
+                rows = model.objects.order_by('path').values_list('pk', 'path', 'name', 'slug')
+                snapshot = TreeSnapshot(list(rows), model.steplen)
+            self.snapshots[model] = (snapshot, current, time())
+        return snapshot
+
+    def invalidate(self, model):
+        key = self.version_key(model)
+        self.cache.add(key, int(time() * 1000000), None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            pass
+        self.snapshots.pop(model, None)
+
+
+trees = Trees()
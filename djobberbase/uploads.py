@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+from uuid import uuid4
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+from django.utils.translation import ugettext_lazy as _
+
+from djobberbase.conf import settings as djobberbase_settings
+
+CV_FIELD = 'apply_cv'
+
+
+class CVFile(UploadedFile):
+    ''' An uploaded CV kept in memory until it grows over
+        DJOBBERBASE_CV_MEMORY_SIZE, then written straight to a file of
+        DJOBBERBASE_FILE_UPLOADS. That file is handed to the outbox as it is,
+        so a CV is written to disk once at most.
+    '''
+
+    def __init__(self, name, content_type=None, charset=None, content_type_extra=None):
+        super().__init__(io.BytesIO(), name, content_type, 0, charset, content_type_extra)
+        self.path = None
+
+    def write(self, data):
+        if self.path is None and self.size + len(data) > djobberbase_settings.DJOBBERBASE_CV_MEMORY_SIZE:
+            self.path = os.path.join(djobberbase_settings.DJOBBERBASE_FILE_UPLOADS,
+                                     '{}_{}'.format(uuid4().hex, os.path.basename(self.name)))
+            spooled = open(self.path, 'w+b')
+            spooled.write(self.file.getvalue())
+            self.file = spooled
+        self.file.write(data)
+        self.size += len(data)
+
+    def in_memory(self):
+        return self.path is None
+
+    def getvalue(self):
+        return self.file.getvalue()
+
+    def discard(self):
+        ''' Deletes the spooled file of a CV that will not be sent. '''
+        self.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CVUploadHandler(FileUploadHandler):
+    ''' Streams the CV of an application into a CVFile, checking its
+        extension before the first byte and its size on every chunk. An
+        invalid CV is skipped as soon as it is detected, the rest of it is
+        read but never stored, and the reason is kept in request.cv_error.
+        Other files go on to the next handlers.
+    '''
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.cv = None
+        if field_name != CV_FIELD:
+            return
+        extension = file_name.lower().split('.')[-1]
+        if extension not in djobberbase_settings.DJOBBERBASE_CV_EXTENSIONS:
+            self.reject(_('Your resume/CV has an invalid extension.'))
+        if self.content_length and self.content_length > djobberbase_settings.DJOBBERBASE_MAX_UPLOAD_SIZE:
+            self.reject(too_large())
+        self.cv = CVFile(file_name, self.content_type, self.charset, self.content_type_extra)
+        raise StopFutureHandlers()
+
+    def reject(self, error):
+        self.request.cv_error = error
+        if self.cv is not None:
+            self.cv.discard()
+            self.cv = None
+        raise SkipFile()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.cv is None:
+            return raw_data
+        if self.cv.size + len(raw_data) > djobberbase_settings.DJOBBERBASE_MAX_UPLOAD_SIZE:
+            self.reject(too_large())
+        self.cv.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.cv is None:
+            return None
+        self.cv.seek(0)
+        return self.cv
+
+    def upload_interrupted(self):
+        if getattr(self, 'cv', None) is not None:
+            self.cv.discard()
+
+
+def too_large():
+    permitted_size = djobberbase_settings.DJOBBERBASE_MAX_UPLOAD_SIZE
+    return _('Your resume/CV must not exceed the file size limit. (%(size)sMB)') % {'size': (permitted_size/1024)/1024}
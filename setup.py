@@ -6,6 +6,7 @@ setup(
     packages = [
             "djobberbase",
             "djobberbase.conf",
+            "djobberbase.search",
             "djobberbase.templatetags",
     ],
     package_data = {       